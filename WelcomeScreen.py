@@ -21,26 +21,96 @@ this program; if not, write to the Free Software Foundation, Inc., 59 Temple
 Place, Suite 330, Boston, MA 02111-1307 USA
 """
 
+from __future__ import annotations
+
 import os
 import subprocess
 import abc
+import argparse
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
+import contextlib
+import errno
+import functools
+import json
 import re
+import signal
+import stat
+import struct
 import sys
+import tempfile
+import threading
+import time
 
+from xml.etree import ElementTree
 from typing import (
     Iterable,
     List,
     Dict,
     Callable,
+    Mapping,
+    Union,
 )
 
-try:
-    import gi
+"""
+GObject introspection modules, imported on demand by `import_gi`.
+"""
+gi = None
+Gtk = None
+Gdk = None
+GdkPixbuf = None
+Gio = None
+GLib = None
+cairo = None
+Rsvg = None
+
+
+def import_gi(gtk: bool = True):
+    """
+    @brief      Import the GObject introspection modules.
+
+    @details    The import is deferred until it is needed so that importing
+    this module costs nothing but loading its bytecode. Without `gtk` only
+    GLib and Gio are imported, which is enough to run commands.
+
+    @param      gtk    Also import Gtk, Gdk, GdkPixbuf, cairo and, if
+    available, Rsvg
 
-    gi.require_version("Gtk", "3.0")
-    from gi.repository import Gtk, Gdk, GdkPixbuf, cairo
-except Exception as ex:
-    raise ex
+    @return     None
+    """
+    global gi, Gtk, Gdk, GdkPixbuf, Gio, GLib, cairo, Rsvg
+    if gi is None:
+        import gi as _gi
+
+        gi = _gi
+        from gi.repository import Gio as _Gio, GLib as _GLib
+
+        Gio = _Gio
+        GLib = _GLib
+    if gtk and Gtk is None:
+        gi.require_version("Gtk", "3.0")
+        from gi.repository import (
+            Gtk as _Gtk,
+            Gdk as _Gdk,
+            GdkPixbuf as _GdkPixbuf,
+        )
+        import cairo as _cairo
+
+        Gtk = _Gtk
+        Gdk = _Gdk
+        GdkPixbuf = _GdkPixbuf
+        cairo = _cairo
+
+        # librsvg is optional, the prerendered images are used without it
+        try:
+            gi.require_version("Rsvg", "2.0")
+            from gi.repository import Rsvg as _Rsvg
+
+            Rsvg = _Rsvg
+        except (ValueError, ImportError):
+            pass
 
 
 """
@@ -57,6 +127,9 @@ HEADERBAR: str = "headerbar"
 LEFT_NAV_BTN: str = "left_nav_btn"
 RIGHT_NAV_BTN: str = "right_nav_btn"
 WINDOW_ICON_NAME: str = "images/icon.png"
+HEADERBAR_SPINNER: str = "headerbar_spinner"
+BUSY_SPINNER: Gtk.Spinner = None
+BUSY_COUNT: int = 0
 
 LAYOUT_BH_BTN: str = "layout_bh_btn"
 LAYOUT_TH_BTN: str = "layout_th_btn"
@@ -68,6 +141,12 @@ LAYOUT_IMAGE_NAMES: Dict[str, str] = {
     LAYOUT_LV_BTN: "images/layout-lv.png",
     LAYOUT_RV_BTN: "images/layout-rv.png",
 }
+LAYOUT_SVG_NAMES: Dict[str, str] = {
+    LAYOUT_BH_BTN: "image_src/layout-bh.svg",
+    LAYOUT_TH_BTN: "image_src/layout-th.svg",
+    LAYOUT_LV_BTN: "image_src/layout-lv.svg",
+    LAYOUT_RV_BTN: "image_src/layout-rv.svg",
+}
 LAYOUT_PIXBUFS: Dict[str, GdkPixbuf.Pixbuf] = {
     LAYOUT_BH_BTN: None,
     LAYOUT_TH_BTN: None,
@@ -76,9 +155,27 @@ LAYOUT_PIXBUFS: Dict[str, GdkPixbuf.Pixbuf] = {
 }
 
 THEME_DARK_CHECKBOX: str = "prefer_dark_theme_check"
+THEME_CHOICES_BOX: str = "theme_choices_box"
+THEME_CHOICES: Dict[str, Gtk.RadioButton] = {}
+SELECTED_THEME: str = None
+THEME_DIRS: List[str] = [
+    "~/.themes",
+    "~/.local/share/themes",
+    "/usr/share/themes",
+]
+ICON_DIRS: List[str] = [
+    "~/.icons",
+    "~/.local/share/icons",
+    "/usr/share/icons",
+]
+THUMBNAIL_CACHE_DIR: str = "~/.cache/easyarch-welcome"
+THEME_INDEX_PATH: str = "~/.cache/easyarch-welcome/theme-index.json"
+THUMBNAIL_WIDTH: int = 96
 
 ARCHLINUX_LOGO_IMG: str = "archlinux_logo_img"
 ARCHLINUX_LOGO_IMG_NAME: str = "images/archlinux-logo.png"
+ARCHLINUX_LOGO_SVG_NAME: str = "image_src/archlinux-vert-dark-grad1.svg"
+ARCHLINUX_LOGO_WIDTH: int = 180
 WELCOME_LABEL: str = "welcome_label"
 WELCOME_LABEL_TEXT: str = "Welcome to Archlinux"
 WELCOME_SUBLABEL: str = "welcome_sublabel"
@@ -88,642 +185,4880 @@ vast collection of up-to-date software.
 """
 
 
-class BaseCommand(abc.ABC):
-    """Represents a single command.
+class CommandRecord:
+    """One external call made by a command.
 
-    Command can be shell command or python function to be executed depending on
-    the implementation. Either way the `execute` method will actually run the
-    command.
+    Every process run and every xfconf bus call creates a record, which is
+    handed to the registered `CommandObserver` objects once the call
+    finished. Times are `time.perf_counter` values.
     """
 
-    def __init__(self, check: bool = True):
+    def __init__(self, argv: List[str], backend: str):
         """
-        @brief      Create a command representitive.
+        @brief      Start recording a call.
 
-        @param      check  Whether or not to check the return value
+        @param      argv      Program and arguments, or the bus method and
+        its string parameters
+
+        @param      backend   `subprocess`, `gio`, `helper` or `dbus`
 
         @return     None
         """
-        self.__check = check
+        self.argv: List[str] = [str(arg) for arg in argv]
+        self.backend = backend
+        self.start: float = time.perf_counter()
+        self.end: float = None
+        self.status: int = None
+        self.output_size: int = 0
+
+    def finish(self, status: int, output_size: int = 0):
+        """
+        @brief      Stop recording and report the call to the observers.
 
-    @abc.abstractmethod
-    def execute(self) -> str:
+        @param      status        Exit status, `None` if the process could
+        not be run or the bus call failed
+
+        @param      output_size   Size of the output in bytes
+
+        @return     None
         """
-        @brief      Child classes must implement this method.
+        self.end = time.perf_counter()
+        self.status = status
+        self.output_size = output_size
+        for observer in list(COMMAND_OBSERVERS):
+            observer.command_finished(self)
+
+    @property
+    def duration(self) -> float:
+        """Seconds the call took."""
+        return self.end - self.start
+
+    @property
+    def failed(self) -> bool:
+        """Whether the call did not succeed."""
+        return self.status != 0
+
+    @property
+    def name(self) -> str:
+        """Short name grouping similar calls.
+
+        That is the program name or the bus method, followed by the xfconf
+        channel if there is one.
+        """
+        if self.backend == "dbus":
+            return " ".join(self.argv[:2])
+        name = os.path.basename(self.argv[0]) if self.argv else ""
+        if name == "xfconf-query" and "-c" in self.argv[1:-1]:
+            name += " " + self.argv[self.argv.index("-c") + 1]
+        return name
+
+    def __str__(self) -> str:
+        return (
+            f"{self.backend}: {' '.join(self.argv)} -> {self.status}, "
+            + f"{self.output_size} bytes in {self.duration * 1000:.1f} ms"
+        )
 
-        @details    It is up to the child implementation to modify the
-        arguments as it needs. Thats why this method exists. After
-        creating the list of args child can call _run method to
-        actually execute the command and return the result.
 
-        @param      None
+class CommandObserver(abc.ABC):
+    """Gets told about every external call the commands make.
 
-        @return     List of strings. Output of the command execution.
+    Observers are registered with `add_command_observer`. They may be called
+    from any thread.
+    """
+
+    @abc.abstractmethod
+    def command_finished(self, record: CommandRecord):
         """
-        pass
+        @brief      Called once a call finished.
 
-    def _run(self, args: List[str]) -> List[str]:
+        @param      record   CommandRecord of the call
+
+        @return     None
         """
-        @brief      Execute the command represented by args.
+        pass
 
-        @details    Upon execution return value will be checke. Finally the
-        outputs will be parsed and a list of strings will be constructed with
-        them. Empty lines will be omitted and all the lines will be
-        stripped. This may raise exception if the command is not found.
 
-        @param      args List[str]
+COMMAND_OBSERVERS: List[CommandObserver] = []
 
-        @return     List of strings
-        """
-        res: subprocess.CompletedProcess = subprocess.run(
-            args,
-            check=self.__check,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-        if res.returncode != 0:
-            return []
 
-        res_str: str = res.stdout.decode("utf8")
-        res_str_list: List[str] = res_str.split("\n")
-        ret_str_list = list()
-        for rs in res_str_list:
-            rs = rs.strip()
-            if rs:
-                ret_str_list.append(rs)
-        return ret_str_list
+def add_command_observer(observer: CommandObserver):
+    """
+    @brief      Register an observer of the external calls.
 
+    @param      observer   CommandObserver
 
-class XfceCommand(BaseCommand):
-    """Represents a single `xfconf-query` command."""
+    @return     None
+    """
+    COMMAND_OBSERVERS.append(observer)
 
-    def __init__(
-        self,
-        *args: Iterable[str],
-        exe: str = "xfconf-query",
-        **kw,
-    ):
-        """
-        @brief      Initialize command object.
 
-        @param      args   List of strings to be send to the command
-        @param      exe    Executable path
+def remove_command_observer(observer: CommandObserver):
+    """
+    @brief      Unregister an observer added by `add_command_observer`.
+
+    @param      observer   CommandObserver
+
+    @return     None
+    """
+    COMMAND_OBSERVERS.remove(observer)
+
+
+class Tracer(CommandObserver):
+    """Records timed spans in the Chrome trace-event format.
+
+    The resulting JSON file can be opened with `chrome://tracing`, Perfetto
+    or any other viewer understanding that format. Timestamps are relative to
+    the creation of the tracer.
+    """
+
+    def __init__(self, path: str):
         """
-        super().__init__(**kw)
-        self.__exe = exe
-        self.__args = args
+        @brief      Create a tracer writing to the given file.
 
-    def execute(self) -> List[str]:
+        @param      path   Output file path
+
+        @return     None
         """
-        @brief      Run the command and return its output.
+        self.__path = path
+        self.__start = time.perf_counter()
+        self.__pid = os.getpid()
+        self.__events: List[Dict] = []
+        self.__seen: set = set()
 
-        @details    This can raise `CalledProcessError` in case the command
-        return value was non zero. Output of both stdout and stderr will be
-        captured and formatted into utf8 string list. Every string in the
-        output will be stripped off of whitespaces from both ends.
+    def now(self) -> float:
+        """
+        @brief      Current timestamp usable for `complete`.
 
         @param      None
 
-        @return     List of string
+        @return     float
         """
-        args = [
-            self.__exe,
-        ]
-        args.extend(self.__args)
-        ret_str_list = self._run(args)
-        return ret_str_list
+        return time.perf_counter()
 
+    def complete(self, name: str, start: float, end: float = None, **args):
+        """
+        @brief      Record a span that already finished.
 
-class ShellCommand(BaseCommand):
-    """Represents a shell command."""
+        @param      name    Span name
 
-    def __init__(self, *args, **kw):
+        @param      start   Start timestamp as returned by `now`
+
+        @param      end     End timestamp, defaults to now
+
+        @param      args    Extra arguments shown by the viewer
+
+        @return     None
         """
-        @brief      Construct a generic shell command.
+        if end is None:
+            end = time.perf_counter()
+        self.__events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.__start) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self.__pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
 
-        @details    Allows user to run a shell command using an instance of
-        this class.
+    def instant(self, name: str, once: bool = False, **args):
+        """
+        @brief      Record a point in time.
 
-        @param      args     List of arguments as string.
+        @param      name    Event name
 
-        @param      kw       Keyword arguments passed to the parent.
+        @param      once    Ignore the event if it was already recorded
+
+        @param      args    Extra arguments shown by the viewer
 
         @return     None
         """
-        super().__init__(**kw)
-        self.__args = args
+        if once:
+            if name in self.__seen:
+                return
+            self.__seen.add(name)
+        self.__events.append(
+            {
+                "name": name,
+                "ph": "i",
+                "s": "p",
+                "ts": (time.perf_counter() - self.__start) * 1e6,
+                "pid": self.__pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
 
-    def execute(self) -> List[str]:
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
         """
-        @brief      Run the command.
+        @brief      Context manager recording the time spent in its body.
+
+        @param      name    Span name
+
+        @param      args    Extra arguments shown by the viewer
+
+        @return     Context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, **args)
+
+    def command_finished(self, record: CommandRecord):
+        self.complete(
+            f"{record.backend} {record.name}",
+            record.start,
+            record.end,
+            argv=record.argv,
+            status=record.status,
+            output_size=record.output_size,
+        )
+
+    def save(self):
+        """
+        @brief      Write the recorded events.
 
         @param      None
 
-        @return     List of strings
+        @return     None
         """
-        return self._run(self.__args)
+        with open(self.__path, "w") as f:
+            json.dump(
+                {"traceEvents": self.__events, "displayTimeUnit": "ms"},
+                f,
+            )
+        print(f"trace written to {self.__path}")
 
 
-class Qt5IconChangeCommand(BaseCommand):
-    """Represents an operation to replace the icon theme in qt5ct conf."""
+TRACER: Tracer = None
+NULL_SPAN = contextlib.nullcontext()
 
-    def __init__(self, theme: str):
-        self.__theme = theme
 
-    def execute(self):
-        conf_path: str = os.path.expanduser("~/.config/qt5ct/qt5ct.conf")
-        with open(conf_path, "r") as f:
-            data = f.read()
+def trace_span(name: str, **args):
+    """
+    @brief      Trace the body of a `with` statement if tracing is enabled.
 
-        new_data = re.sub(
-            "icon_theme=(.*)",
-            f"icon_theme={self.__theme}",
-            data,
-        )
+    @details    When tracing is off this returns a shared no-op context
+    manager, so it costs a global lookup only.
 
-        with open(conf_path, "w") as f:
-            f.write(new_data)
+    @param      name    Span name
 
+    @param      args    Extra arguments shown by the viewer
 
-def get_cur_theme() -> str:
+    @return     Context manager
     """
-    @brief      Get the current theme name
+    if TRACER is None:
+        return NULL_SPAN
+    return TRACER.span(name, **args)
 
-    @details    This can throw exception in case of failure.
 
-    @param      None
+class CommandStats(CommandObserver):
+    """Counts and latency histograms of the external calls.
 
-    @return     str
+    Calls are grouped by backend and `CommandRecord.name`, so that for
+    instance every xfconf channel gets its own line.
     """
-    cur_theme_cmd = XfceCommand(
-        "-c",
-        "xsettings",
-        "-p",
-        "/Net/ThemeName",
-    )
-    res = cur_theme_cmd.execute()
-    if not res:
-        raise RuntimeError("Could not determine current theme.")
 
-    return res[0]
+    # upper bounds of the histogram buckets in milliseconds, a last bucket
+    # takes everything slower
+    BUCKETS_MS: tuple = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
 
+    def __init__(self):
+        """
+        @brief      Create an empty aggregator.
 
-def get_panel_number() -> int:
-    """
-    @brief      Get the panel id.
+        @param      None
 
-    @param      None
+        @return     None
+        """
+        self.__lock = threading.Lock()
+        self.__entries: Dict[tuple, Dict] = {}
+
+    def command_finished(self, record: CommandRecord):
+        duration_ms = record.duration * 1000
+        bucket = bisect.bisect_left(self.BUCKETS_MS, duration_ms)
+        with self.__lock:
+            entry = self.__entries.get((record.backend, record.name))
+            if entry is None:
+                entry = self.__entries[(record.backend, record.name)] = {
+                    "calls": 0,
+                    "failed": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "output_bytes": 0,
+                    "histogram": [0] * (len(self.BUCKETS_MS) + 1),
+                }
+            entry["calls"] += 1
+            entry["failed"] += record.failed
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["output_bytes"] += record.output_size
+            entry["histogram"][bucket] += 1
+
+    def snapshot(self) -> Dict[tuple, Dict]:
+        """
+        @brief      Copy of the collected numbers.
 
-    @return     int
-    """
-    command = XfceCommand("-c", "xfce4-panel", "-p", "/panels")
-    res = command.execute()
-    panel_id = 0
-    try:
-        tmp = int(res[-1])
-        panel_id = tmp
-    except Exception:
-        pass
-    return panel_id
+        @param      None
 
+        @return     Dictionary keyed by (backend, name)
+        """
+        with self.__lock:
+            return {
+                key: dict(entry, histogram=list(entry["histogram"]))
+                for key, entry in self.__entries.items()
+            }
+
+    def _bucket_label(self, idx: int) -> str:
+        if idx < len(self.BUCKETS_MS):
+            return f"<={self.BUCKETS_MS[idx]}ms"
+        return f">{self.BUCKETS_MS[-1]}ms"
+
+    def dump(self, *args):
+        """
+        @brief      Print the collected numbers, slowest commands first.
 
-def resolve_path(fileName: str) -> str:
-    """
-    @brief      Resolve a file path
+        @details    Accepts and ignores any arguments so that it can be used
+        as signal handler.
 
-    @details This tries to find the file under some specific folders. These
-    folders include the script folder, `/usr/share/easyarch-welcome/`,
-    `/etc/easyarch-welcome` in the same sequence. First existing path will be
-    returned. If no path could be resolved then `None` is returned.
+        @param      args   place holder list
 
-    @param      fileName   string file name(i.e layout-bh.png)
+        @return     None
+        """
+        entries = sorted(
+            self.snapshot().items(),
+            key=lambda item: item[1]["total_ms"],
+            reverse=True,
+        )
+        if not entries:
+            print("no commands were run")
+            return
+        print(
+            f"{'command':<32} {'backend':<10} {'calls':>5} {'failed':>6} "
+            + f"{'total ms':>9} {'mean ms':>8} {'max ms':>8} {'bytes':>8}"
+        )
+        for (backend, name), entry in entries:
+            print(
+                f"{name:<32} {backend:<10} {entry['calls']:5} {entry['failed']:6} "
+                + f"{entry['total_ms']:9.1f} "
+                + f"{entry['total_ms'] / entry['calls']:8.1f} "
+                + f"{entry['max_ms']:8.1f} {entry['output_bytes']:8}"
+            )
+            print(
+                "    "
+                + "  ".join(
+                    f"{self._bucket_label(idx)}: {count}"
+                    for idx, count in enumerate(entry["histogram"])
+                    if count
+                )
+            )
+        sys.stdout.flush()
 
-    @return     str or None
-    """
-    cur_dir = os.path.abspath(os.path.dirname(__file__))
-    path_list = [
-        cur_dir,
-        "/usr/share/easyarch-welcome",
-        "/etc/easyarch-welcome",
-    ]
-    for path in path_list:
-        full_path = os.path.join(path, fileName)
-        if os.path.exists(full_path):
-            return full_path
-    return None
 
+COMMAND_STATS: CommandStats = CommandStats()
+add_command_observer(COMMAND_STATS)
 
-def check_virtual_machine() -> bool:
+
+class CommandHelper:
+    """A small process running the programs for the application.
+
+    Starting a program forks the calling process first, which costs more the
+    more memory it has mapped, and a running Gtk application maps a lot. The
+    helper is forked at startup before Gtk is imported, while the process is
+    still small, and runs the programs sent to it over a pipe, several at a
+    time. A request is a header with an id and the size of the NUL separated
+    arguments following it. A reply is a header with the id, the exit
+    status, an errno if the program could not be run and the size of the
+    output following it. Replies are matched to the requests by id and
+    handed to the callbacks from a reader thread.
     """
-    @brief      Check whether we are running a VM or not.
 
-    @details    Uses systemd to detect virtualization.
+    REQUEST: struct.Struct = struct.Struct("!II")
+    REPLY: struct.Struct = struct.Struct("!IiiI")
 
-    @param      None
+    def __init__(self, pid: int, requests: int, replies: int):
+        """
+        @brief      Wrap a started helper process.
 
-    @return     bool
-    """
-    prog = subprocess.run(
-        [
-            "systemd-detect-virt",
-        ],
-        capture_output=True,
-        universal_newlines=True,
-    )
-    if prog.returncode != 0 or prog.stdout == "none":
-        return False
-    return True
+        @param      pid        Process id of the helper
 
+        @param      requests   File descriptor the requests are written to
 
-def get_xresolution():
-    """
-    @brief      Return supported display resolutions.
+        @param      replies    File descriptor the replies are read from
 
-    @details    This runs the xrandr program to collect and return the
-    supported display resolutions.
+        @return     None
+        """
+        self.__pid = pid
+        self.__requests = os.fdopen(requests, "wb")
+        self.__replies = os.fdopen(replies, "rb")
+        self.__lock = threading.Lock()
+        self.__last_id = 0
+        self.__pending: Dict[int, Callable] = {}
+        self.__alive = True
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    @classmethod
+    def start(cls) -> "CommandHelper":
+        """
+        @brief      Fork the helper process.
 
-    @param      None
+        @param      None
 
-    @return     List of strings
-    """
-    data = ""
-    prog = subprocess.run(
-        [
-            "xrandr",
-        ],
-        capture_output=True,
-        universal_newlines=True,
-    )
-    if prog.returncode != 0:
-        exit(-1)
-    data = prog.stdout
-    data = data.split("\n")
-    expr = re.compile(r"\s+(\d+x\d+)\s+")
-    rv = list()
-    for line in data:
-        resMatch = re.search(expr, line)
-        if resMatch:
-            rv.append(resMatch[0].strip())
-    return rv
+        @return     CommandHelper or None if it could not be started
+        """
+        requests_r, requests_w = os.pipe()
+        replies_r, replies_w = os.pipe()
+        try:
+            pid = os.fork()
+        except OSError as ex:
+            print(f"Could not start the command helper: {ex}")
+            for fd in (requests_r, requests_w, replies_r, replies_w):
+                os.close(fd)
+            return None
+        if pid == 0:
+            status = 0
+            try:
+                os.close(requests_w)
+                os.close(replies_r)
+                cls._serve(requests_r, replies_w)
+            except BaseException:
+                status = 1
+            finally:
+                # never go back into the code of the application
+                os._exit(status)
+        os.close(requests_r)
+        os.close(replies_w)
+        return cls(pid, requests_w, replies_r)
+
+    @classmethod
+    def _serve(cls, requests: int, replies: int):
+        """
+        @brief      Main loop of the helper process.
 
+        @details    Every request is run by its own thread, the loop ends
+        when the application closes the pipe.
 
-def apply_resolution(widget: Gtk.ComboBoxText):
-    """
-    @brief      Apply selected resolution from the combobox.
+        @param      requests   File descriptor to read the requests from
 
-    @param      widget     Gtk.ComboBoxText
+        @param      replies    File descriptor to write the replies to
 
-    @return     None
-    """
-    # apply resolution for all displays in the xfce settings
-    res_str = widget.get_active_text()
-    cmd = XfceCommand("-c", "displays", "-p", "/ActiveProfile")
-    cmd_res = cmd.execute()
-
-    print("Walking through active display profiles")
-    for cr in cmd_res:
-        print(f"Profile: {cr}")
-        cmd_2 = XfceCommand("-c", "displays", "-p", f"/{cr}", "-l")
-        cmd_res_2 = cmd_2.execute()
-
-        print("Walking through profile keys")
-        for cr2 in cmd_res_2:
-            if "Resolution" in cr2:
-                print(f"Found resolution in {cr2}")
-                cmd_3 = XfceCommand(
-                    "-c",
-                    "displays",
-                    "-p",
-                    cr2,
-                    "-s",
-                    res_str,
+        @return     None
+        """
+        # the application handles these, the helper just goes on until the
+        # request pipe is closed
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        lock = threading.Lock()
+        reply_stream = os.fdopen(replies, "wb")
+
+        def run(req_id: int, argv: List[str]):
+            status, error, output = 0, 0, b""
+            try:
+                res = subprocess.run(
+                    argv,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+                status, output = res.returncode, res.stdout
+            except OSError as ex:
+                status, error = -1, ex.errno or errno.EIO
+            with lock:
+                reply_stream.write(
+                    cls.REPLY.pack(req_id, status, error, len(output)) + output
                 )
-                cmd_3.execute()
+                reply_stream.flush()
+
+        with os.fdopen(requests, "rb") as request_stream:
+            while True:
+                header = request_stream.read(cls.REQUEST.size)
+                if len(header) < cls.REQUEST.size:
+                    return
+                req_id, size = cls.REQUEST.unpack(header)
+                argv = request_stream.read(size).decode("utf8").split("\0")
+                threading.Thread(target=run, args=(req_id, argv), daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        """Whether the helper still accepts requests."""
+        return self.__alive
+
+    def submit(self, argv: List[str], callback: Callable) -> bool:
+        """
+        @brief      Send a program to run.
 
-    # also use xrandr to change current resolution
-    xrandr_cmd = ShellCommand("xrandr", "-s", res_str)
-    xrandr_cmd.execute()
+        @details    `callback(status, output, error)` is called from the
+        reader thread with the exit status, the output as bytes and an errno
+        which is non zero if the program could not be run.
 
+        @param      argv       Program and arguments
 
-def init_res_app() -> Gtk.ApplicationWindow:
-    """
-    @brief      Initialize the resolution settings app.
+        @param      callback   Completion callback
 
-    @details    Initialize and return the xrandr resolution settings
-    application.
+        @return     False if the helper is gone, the callback is not called
+        then
+        """
+        payload = "\0".join(argv).encode("utf8")
+        with self.__lock:
+            if not self.__alive:
+                return False
+            self.__last_id += 1
+            req_id = self.__last_id
+            self.__pending[req_id] = callback
+            try:
+                self.__requests.write(self.REQUEST.pack(req_id, len(payload)) + payload)
+                self.__requests.flush()
+            except (OSError, ValueError):
+                del self.__pending[req_id]
+                self.__alive = False
+                return False
+        return True
+
+    def run(self, argv: List[str]) -> tuple:
+        """
+        @brief      Run a program and wait for it.
 
-    @param      None
+        @details    Raises `OSError` if the program could not be run.
 
-    @return     Gtk.ApplicationWindow
-    """
-    window: Gtk.ApplicationWindow = Gtk.ApplicationWindow()
+        @param      argv   Program and arguments
 
-    vbox: Gtk.VBox = Gtk.VBox()
-    vbox.props.border_width = 10
-    vbox.props.spacing = 20
+        @return     Tuple of exit status and output as bytes, `None` if the
+        helper is gone, also when it went away while running the program
+        """
+        done = threading.Event()
+        reply: List = []
+
+        def on_reply(*args):
+            reply.extend(args)
+            done.set()
+
+        if not self.submit(argv, on_reply):
+            return None
+        done.wait()
+        status, output, error = reply
+        if error == errno.EPIPE:
+            return None
+        if error:
+            raise OSError(error, os.strerror(error), argv[0])
+        return status, output
+
+    def _read_replies(self):
+        while True:
+            header = self.__replies.read(self.REPLY.size)
+            if len(header) < self.REPLY.size:
+                break
+            req_id, status, error, size = self.REPLY.unpack(header)
+            output = self.__replies.read(size)
+            with self.__lock:
+                callback = self.__pending.pop(req_id, None)
+            if callback:
+                callback(status, output, error)
+        with self.__lock:
+            self.__alive = False
+            pending = self.__pending
+            self.__pending = {}
+        for callback in pending.values():
+            callback(-1, b"", errno.EPIPE)
+
+    def stop(self):
+        """
+        @brief      Let the helper exit and wait for it.
 
-    label: Gtk.Label = Gtk.Label()
-    label.set_markup(
-        "<big>Seems like you are running a virtual machine."
-        + "Would you like to switch display resolution ?</big>"
-    )
-    label.set_justify(Gtk.Justification.CENTER)
-    label.props.wrap = True
-    # vbox.add(label)
-    vbox.pack_start(label, False, False, 0)
+        @details    Programs still running are not waited for.
 
-    hbox: Gtk.HBox = Gtk.HBox()
-    hbox.props.spacing = 20
-    # vbox.add(hbox)
-    vbox.pack_start(hbox, False, False, 0)
+        @param      None
 
-    label2: Gtk.Label = Gtk.Label()
-    label2.set_markup("<big>Select Resolution</big>")
-    label2.set_justify(Gtk.Justification.RIGHT)
-    hbox.pack_start(label2, False, False, 0)
+        @return     None
+        """
+        with self.__lock:
+            self.__alive = False
+            try:
+                self.__requests.close()
+            except OSError:
+                pass
+        os.waitpid(self.__pid, 0)
 
-    resolutions = get_xresolution()
-    combobox: Gtk.ComboBoxText = Gtk.ComboBoxText()
-    for res in resolutions:
-        combobox.append_text(res)
-    combobox.set_entry_text_column(0)
-    if len(resolutions) > 0:
-        combobox.set_active(0)
-    # combobox.connect(
-    #     "changed",
-    #     lambda w: print(w.get_active_text()),
-    # )
-    hbox.add(combobox)
 
-    hbox2: Gtk.HBox = Gtk.HBox()
-    hbox2.props.spacing = 10
-    # vbox.add(hbox2)
-    vbox.pack_end(hbox2, False, False, 0)
+COMMAND_HELPER: CommandHelper = None
 
-    apply_btn: Gtk.Button = Gtk.Button(label="Apply")
-    apply_icon: Gtk.Image = Gtk.Image.new_from_icon_name(
-        "dialog-ok",
-        Gtk.IconSize.BUTTON,
-    )
-    apply_btn.set_image(apply_icon)
-    apply_btn.connect(
-        "clicked",
-        lambda w: apply_resolution(combobox),
-    )
-    hbox2.add(apply_btn)
 
-    exit_btn: Gtk.Button = Gtk.Button(label="Exit")
-    exit_icon: Gtk.Image = Gtk.Image.new_from_icon_name(
-        "window-close",
-        Gtk.IconSize.BUTTON,
-    )
-    exit_btn.set_image(exit_icon)
-    exit_btn.connect(
-        "clicked",
-        lambda w: window.close(),
-    )
-    hbox2.add(exit_btn)
+def start_command_helper():
+    """
+    @brief      Start the helper process running the programs.
 
-    headerbar: Gtk.HeaderBar = Gtk.HeaderBar()
-    headerbar.props.show_close_button = True
-    headerbar.set_title("Set Resolution")
-    window.set_titlebar(headerbar)
+    @details    Must be called before Gtk is imported, that is the point of
+    it. Setting the `WELCOME_SCREEN_NO_HELPER` environment variable disables
+    the helper, programs are then started by the application itself, which
+    is also the case if the helper is not running.
 
-    window_icon: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new_from_file(
-        resolve_path("images/icon.png"),
-    )
+    @param      None
 
-    window.add(vbox)
-    window.props.default_width = 400
-    window.set_title("Set Resolution")
-    window.set_icon(window_icon)
+    @return     None
+    """
+    global COMMAND_HELPER
+    if COMMAND_HELPER is None and not os.environ.get("WELCOME_SCREEN_NO_HELPER"):
+        COMMAND_HELPER = CommandHelper.start()
 
-    return window
 
+def stop_command_helper():
+    """
+    @brief      Stop the helper process, if started.
 
-def load_pixbufs():
+    @param      None
+
+    @return     None
     """
-    @brief      Preload some pixel buffers into memory.
+    global COMMAND_HELPER
+    if COMMAND_HELPER:
+        COMMAND_HELPER.stop()
+        COMMAND_HELPER = None
 
-    @details    Some images are needed to pre-load before the app starts. This
-    is where that operation takes place. For example the layout button images
-    are loaded in this function. As consequence this function should be called
-    before setting up the app or the ui itself.
+
+def get_command_helper() -> CommandHelper:
+    """
+    @brief      The helper process, if it is running.
 
     @param      None
 
-    @return     None
+    @return     CommandHelper or None
     """
-    global LAYOUT_PIXBUFS
-    for layout in LAYOUT_IMAGE_NAMES:
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file(
-            resolve_path(LAYOUT_IMAGE_NAMES[layout])
-        )
-        LAYOUT_PIXBUFS[layout] = pixbuf
+    if COMMAND_HELPER and COMMAND_HELPER.alive:
+        return COMMAND_HELPER
+    return None
 
 
-"""
-Layout configurations along with setup commands.
-"""
-PANEL_ID = get_panel_number()
-LAYOUT_COMMANDS: Dict[str, List[BaseCommand]] = {
-    "bottom_horizontal": [
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/position",
-            "-s",
-            "p=8;x=0;y=0",
-        ),
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/mode",
-            "-s",
-            "0",
-        ),
-    ],
-    "top_horizontal": [
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/position",
-            "-s",
-            "p=6;x=0;y=0",
-        ),
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/mode",
-            "-s",
-            "0",
-        ),
-    ],
-    "left_vertical": [
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/position",
-            "-s",
-            "p=6;x=0;y=0",
-        ),
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/mode",
-            "-s",
-            "1",
-        ),
-    ],
-    "right_vertical": [
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/position",
-            "-s",
-            "p=2;x=0;y=0",
-        ),
-        XfceCommand(
-            "-c",
-            "xfce4-panel",
-            "-p",
-            f"/panels/panel-{PANEL_ID}/mode",
-            "-s",
-            "1",
-        ),
-    ],
-}
+class BaseCommand(abc.ABC):
+    """Represents a single command.
 
+    Command can be shell command or python function to be executed depending on
+    the implementation. Either way the `execute` method will actually run the
+    command.
+    """
 
-"""
-Theme configurations along with variants and setup commands.
-"""
-THEME_COLLECTION: Dict[str, Dict[str, BaseCommand]] = {
-    "default_theme": {
-        "light": [
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Materia-compact"
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Adwaita++"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Materia-compact"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Adwaita++"),
-        ],
-        "dark": [
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Materia-dark-compact"
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Adwaita++-Dark"
-            ),
-            XfceCommand(
-                "-c", "xfwm4", "-p", "/general/theme", "-s", "Materia-dark-compact"
-            ),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Adwaita++-Dark"),
-        ],
-    },
-    "win10_theme": {
-        "light": [
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Windows-10-3.2"
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Windows-10-1.0"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Win10-Light"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Windows-10-1.0"),
-        ],
-        "dark": [
-            XfceCommand(
-                "-c",
-                "xsettings",
-                "-p",
-                "/Net/ThemeName",
-                "-s",
-                "Windows-10-Dark-3.2-dark",
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Windows-10-1.0"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Win10-Dark"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Windows-10-1.0"),
-        ],
-    },
-    "win7_theme": {
-        "default": [
-            XfceCommand("-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Windows-7"),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Windows-7"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "X-Aero GTK3"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Windows-7"),
-        ],
-    },
-    "winxp_theme": {
-        "default": [
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Windows XP Luna"
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Windows-XP"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Windows XP Luna"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("Windows-XP"),
-        ],
-    },
-    "win95_theme": {
-        "default": [
-            XfceCommand("-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Chicago95"),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "Chicago95"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Chicago95"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "44"),
-            Qt5IconChangeCommand("Chicago95"),
-        ],
-    },
-    "mac_theme": {
-        "light": [
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Sierra-light"
-            ),
-            XfceCommand(
-                "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", "McMojave-circle"
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Sierra-light"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("McMojave-circle"),
-        ],
-        "dark": [
-            XfceCommand("-c", "xsettings", "-p", "/Net/ThemeName", "-s", "Sierra-dark"),
-            XfceCommand(
-                "-c",
-                "xsettings",
-                "-p",
-                "/Net/IconThemeName",
-                "-s",
-                "McMojave-circle-dark",
-            ),
-            XfceCommand("-c", "xfwm4", "-p", "/general/theme", "-s", "Sierra-dark"),
-            XfceCommand("-c", "xfce4-panel", "-p", "/panels/panel-1/size", "-s", "36"),
-            Qt5IconChangeCommand("McMojave-circle-dark"),
-        ],
-    },
-}
+    def __init__(self, check: bool = True):
+        """
+        @brief      Create a command representitive.
+
+        @param      check  Whether or not to check the return value
+
+        @return     None
+        """
+        self.__check = check
+
+    @property
+    def check(self) -> bool:
+        """Whether a non zero return value should raise an exception."""
+        return self.__check
+
+    @abc.abstractmethod
+    def execute(self) -> str:
+        """
+        @brief      Child classes must implement this method.
+
+        @details    It is up to the child implementation to modify the
+        arguments as it needs. Thats why this method exists. After
+        creating the list of args child can call _run method to
+        actually execute the command and return the result.
+
+        @param      None
+
+        @return     List of strings. Output of the command execution.
+        """
+        pass
+
+    def target(self) -> tuple:
+        """
+        @brief      The setting this command changes and the value it sets.
+
+        @details    Commands that set a single value return a tuple of a
+        hashable key identifying the setting and the new value as string, so
+        that `StatePlanner` can skip them if the value is already set. Other
+        commands return `None` and are always run.
+
+        @param      None
+
+        @return     Tuple of key and value or None
+        """
+        return None
+
+    def targets(self) -> List[tuple]:
+        """
+        @brief      All the settings this command changes.
+
+        @details    Commands changing several settings at once override
+        this, the default is the single `target`, if any.
+
+        @param      None
+
+        @return     List of (key, value) tuples as returned by `target`
+        """
+        target = self.target()
+        return [target] if target else []
+
+    def execute_async(self, callback: Callable[[List[str]], None] = None):
+        """
+        @brief      Run the command without blocking the main loop.
+
+        @details    Child classes that wait on other processes override this.
+        The default implementation runs `execute` from an idle callback,
+        which is fine for commands that return immediately. Either way
+        `callback` is invoked from the main loop with the output of the
+        command, errors are reported and result in an empty output.
+
+        @param      callback   Completion callback
+
+        @return     None
+        """
+
+        def run():
+            try:
+                res = self.execute()
+            except Exception as ex:
+                print(f"Command failed: {ex}")
+                res = []
+            if callback:
+                callback(res or [])
+            return False
+
+        GLib.idle_add(run)
+
+    @staticmethod
+    def _parse_output(output: str) -> List[str]:
+        """
+        @brief      Split command output into stripped, non empty lines.
+
+        @param      output   str
+
+        @return     List of strings
+        """
+        ret_str_list = list()
+        for rs in output.split("\n"):
+            rs = rs.strip()
+            if rs:
+                ret_str_list.append(rs)
+        return ret_str_list
+
+    def _run(self, args: List[str]) -> List[str]:
+        """
+        @brief      Execute the command represented by args.
+
+        @details    Upon execution return value will be checke. Finally the
+        outputs will be parsed and a list of strings will be constructed with
+        them. Empty lines will be omitted and all the lines will be
+        stripped. This may raise exception if the command is not found.
+        The run is reported to the command observers. The command helper
+        runs the program if it is running.
+
+        @param      args List[str]
+
+        @return     List of strings
+        """
+        helper = get_command_helper()
+        record = CommandRecord(args, "helper" if helper else "subprocess")
+        try:
+            res = helper.run(args) if helper else None
+            if res is None:
+                record.backend = "subprocess"
+                proc: subprocess.CompletedProcess = subprocess.run(
+                    args,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+                res = proc.returncode, proc.stdout
+        except OSError:
+            record.finish(None)
+            raise
+        return self._finish(args, record, res)
+
+    def _finish(self, args: List[str], record: CommandRecord, res: tuple) -> List[str]:
+        """
+        @brief      Check and parse the result of a program.
+
+        @param      args     List[str]
+
+        @param      record   CommandRecord of the run
+
+        @param      res      Tuple of exit status and output as bytes
+
+        @return     List of strings
+        """
+        returncode, stdout = res
+        record.finish(returncode, len(stdout))
+        if returncode != 0:
+            if self.__check:
+                raise subprocess.CalledProcessError(returncode, args, output=stdout)
+            print(f"{args[0]} returned {returncode}")
+            return []
+
+        return self._parse_output(stdout.decode("utf8"))
+
+    def _run_many(self, commands: List[List[str]]) -> List[List[str]]:
+        """
+        @brief      Execute several commands side by side and wait for all.
+
+        @details    All the programs are started before the first one is
+        waited for, so they take about as long as the slowest one. Errors
+        are handled like by `_run`, the first one is raised once all the
+        programs finished.
+
+        @param      commands   List of argument lists
+
+        @return     List of the parsed outputs, in the order of `commands`
+        """
+        helper = get_command_helper()
+        started: List[tuple] = []
+        for args in commands:
+            record = CommandRecord(args, "helper" if helper else "subprocess")
+            started.append((args, record, self._start(helper, args, record)))
+        outputs: List[List[str]] = []
+        error: Exception = None
+        for args, record, wait in started:
+            try:
+                res = wait()
+            except OSError as ex:
+                record.finish(None)
+                error = error or ex
+                outputs.append([])
+                continue
+            try:
+                outputs.append(self._finish(args, record, res))
+            except subprocess.CalledProcessError as ex:
+                error = error or ex
+                outputs.append([])
+        if error:
+            raise error
+        return outputs
+
+    @staticmethod
+    def _start(
+        helper: CommandHelper, args: List[str], record: CommandRecord
+    ) -> Callable[[], tuple]:
+        """
+        @brief      Start a program without waiting for it.
+
+        @details    The command helper runs it if given and still alive,
+        otherwise it is spawned directly and `record` says so.
+
+        @param      helper   CommandHelper or None
+
+        @param      args     List[str]
+
+        @param      record   CommandRecord of the run
+
+        @return     Function waiting for the program, it returns a tuple of
+        exit status and output as bytes or raises `OSError` if the program
+        could not be run
+        """
+        if helper:
+            done = threading.Event()
+            reply: List = []
+
+            def on_reply(*res):
+                reply.extend(res)
+                done.set()
+
+            if helper.submit(args, on_reply):
+
+                def wait_reply() -> tuple:
+                    done.wait()
+                    status, output, error = reply
+                    if error == errno.EPIPE:
+                        # the helper went away, run the program directly
+                        record.backend = "subprocess"
+                        proc = subprocess.run(
+                            args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                        )
+                        return proc.returncode, proc.stdout
+                    if error:
+                        raise OSError(error, os.strerror(error), args[0])
+                    return status, output
+
+                return wait_reply
+        record.backend = "subprocess"
+        try:
+            proc = subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+            )
+        except OSError as ex:
+            error = ex
+
+            def raise_error() -> tuple:
+                raise error
+
+            return raise_error
+
+        def wait_proc() -> tuple:
+            stdout, _ = proc.communicate()
+            return proc.returncode, stdout
+
+        return wait_proc
+
+    def _run_async(self, args: List[str], callback: Callable[[List[str]], None]):
+        """
+        @brief      Execute the command represented by args asynchronously.
+
+        @details    The program is run by the command helper, or spawned
+        with `Gio.Subprocess` if the helper is not running or went away
+        meanwhile. Either way the caller returns right away and `callback`
+        is invoked from the main loop with the parsed output, or an empty
+        list if the command could not be run or returned non zero.
+
+        @param      args       List[str]
+
+        @param      callback   Completion callback
+
+        @return     None
+        """
+        helper = get_command_helper()
+        if helper:
+            record = CommandRecord(args, "helper")
+
+            def on_reply(status: int, output: bytes, error: int):
+                if error == errno.EPIPE:
+                    # the helper went away, spawn the program instead
+                    GLib.idle_add(self._run_async, args, callback)
+                    return
+                if error:
+                    record.finish(None)
+                    print(f"Could not run {args[0]}: {os.strerror(error)}")
+                    GLib.idle_add(callback, [])
+                    return
+                record.finish(status, len(output))
+                if status != 0:
+                    print(f"{args[0]} returned {status}")
+                    GLib.idle_add(callback, [])
+                    return
+                GLib.idle_add(callback, self._parse_output(output.decode("utf8")))
+
+            if helper.submit(args, on_reply):
+                return
+
+        record = CommandRecord(args, "gio")
+
+        def on_done(proc: Gio.Subprocess, task: Gio.AsyncResult):
+            try:
+                _, stdout, _ = proc.communicate_utf8_finish(task)
+            except GLib.Error as ex:
+                record.finish(None)
+                print(f"{args[0]} failed: {ex.message}")
+                callback([])
+                return
+            if proc.get_if_exited():
+                status = proc.get_exit_status()
+            else:
+                status = -proc.get_term_sig()
+            record.finish(status, len((stdout or "").encode("utf8")))
+            if not proc.get_successful():
+                print(f"{args[0]} returned {proc.get_status()}")
+                callback([])
+                return
+            callback(self._parse_output(stdout or ""))
+
+        try:
+            proc = Gio.Subprocess.new(
+                list(args),
+                Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_MERGE,
+            )
+        except GLib.Error as ex:
+            record.finish(None)
+            print(f"Could not run {args[0]}: {ex.message}")
+            GLib.idle_add(callback, [])
+            return
+        proc.communicate_utf8_async(None, None, on_done)
+
+
+class XfconfQuery:
+    """Parsed form of an `xfconf-query` argument list.
+
+    Only the options understood by the bus backend are recognized, that is
+    channel, property, set, list, verbose, reset and recursive. Anything else
+    makes `parse` return `None` so that the command keeps using the
+    `xfconf-query` executable.
+    """
+
+    def __init__(self):
+        self.channel: str = None
+        self.prop: str = None
+        self.values: List[str] = []
+        self.list: bool = False
+        self.verbose: bool = False
+        self.reset: bool = False
+        self.recursive: bool = False
+
+    @classmethod
+    def parse(cls, args: Iterable[str]) -> "XfconfQuery":
+        """
+        @brief      Parse `xfconf-query` arguments.
+
+        @param      args   List of strings as passed to `xfconf-query`
+
+        @return     XfconfQuery or None
+        """
+        query = cls()
+        args = list(args)
+        idx = 0
+        while idx < len(args):
+            arg = args[idx]
+            if arg in ("-c", "--channel", "-p", "--property", "-s", "--set"):
+                if idx + 1 >= len(args):
+                    return None
+                value = args[idx + 1]
+                if arg in ("-c", "--channel"):
+                    query.channel = value
+                elif arg in ("-p", "--property"):
+                    query.prop = value
+                else:
+                    query.values.append(value)
+                idx += 2
+                continue
+            if arg in ("-l", "--list"):
+                query.list = True
+            elif arg in ("-v", "--verbose"):
+                query.verbose = True
+            elif arg in ("-r", "--reset"):
+                query.reset = True
+            elif arg in ("-R", "--recursive"):
+                query.recursive = True
+            else:
+                return None
+            idx += 1
+
+        if not query.channel:
+            return None
+        if query.list:
+            if query.values or query.reset:
+                return None
+        elif not query.prop:
+            return None
+        if query.reset and query.values:
+            return None
+        # arrays have to be created with explicit types, leave that to
+        # xfconf-query itself
+        if len(query.values) > 1:
+            return None
+        return query
+
+
+class XfconfBus:
+    """Connection to the xfconf daemon over the D-Bus session bus.
+
+    A single connection is shared by all the `XfceCommand` objects, so that
+    reading or writing a property costs one bus round trip instead of a new
+    `xfconf-query` process. The bus address is taken from the usual
+    `DBUS_SESSION_BUS_ADDRESS` environment variable, which also allows to run
+    against a private `dbus-daemon` providing a stand-in xfconf service.
+    """
+
+    BUS_NAME: str = "org.xfce.Xfconf"
+    OBJECT_PATH: str = "/org/xfce/Xfconf"
+    INTERFACE: str = "org.xfce.Xfconf"
+    TIMEOUT_MS: int = 5000
+
+    def __init__(self, connection: Gio.DBusConnection):
+        """
+        @brief      Wrap an already opened bus connection.
+
+        @param      connection   Gio.DBusConnection
+
+        @return     None
+        """
+        self.__connection = connection
+        # property types learned from the daemon, keyed by (channel, property)
+        self.__types: Dict[tuple, str] = {}
+
+    @classmethod
+    def connect(cls) -> "XfconfBus":
+        """
+        @brief      Connect to the session bus.
+
+        @details    Returns `None` if there is no session bus or nobody
+        provides (or can be activated to provide) the xfconf service.
+
+        @param      None
+
+        @return     XfconfBus or None
+        """
+        try:
+            connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+            owned = connection.call_sync(
+                "org.freedesktop.DBus",
+                "/org/freedesktop/DBus",
+                "org.freedesktop.DBus",
+                "NameHasOwner",
+                GLib.Variant("(s)", (cls.BUS_NAME,)),
+                GLib.VariantType("(b)"),
+                Gio.DBusCallFlags.NONE,
+                cls.TIMEOUT_MS,
+                None,
+            ).unpack()[0]
+            if not owned:
+                names = connection.call_sync(
+                    "org.freedesktop.DBus",
+                    "/org/freedesktop/DBus",
+                    "org.freedesktop.DBus",
+                    "ListActivatableNames",
+                    None,
+                    GLib.VariantType("(as)"),
+                    Gio.DBusCallFlags.NONE,
+                    cls.TIMEOUT_MS,
+                    None,
+                ).unpack()[0]
+                if cls.BUS_NAME not in names:
+                    return None
+        except GLib.Error as ex:
+            print(f"xfconf bus is not available: {ex.message}")
+            return None
+        return cls(connection)
+
+    def _call(
+        self,
+        method: str,
+        params: GLib.Variant,
+        reply: str,
+        callback: Callable = None,
+    ):
+        """
+        @brief      Call a method of the xfconf interface.
+
+        @details    Without a callback the call is blocking and raises
+        `GLib.Error` on failure. With a callback the call is made
+        asynchronously and `callback(result, error)` is invoked from the main
+        loop, exactly one of the two arguments being `None`. Every call is
+        reported to the command observers.
+
+        @param      method     Method name
+
+        @param      params     GLib.Variant tuple of parameters
+
+        @param      reply      Reply signature
+
+        @param      callback   Optional completion callback
+
+        @return     GLib.Variant or None
+        """
+        record = CommandRecord(
+            [method] + [p for p in params.unpack() if isinstance(p, str)], "dbus"
+        )
+        if callback is None:
+            try:
+                res = self.__connection.call_sync(
+                    self.BUS_NAME,
+                    self.OBJECT_PATH,
+                    self.INTERFACE,
+                    method,
+                    params,
+                    GLib.VariantType(reply),
+                    Gio.DBusCallFlags.NONE,
+                    self.TIMEOUT_MS,
+                    None,
+                )
+            except GLib.Error:
+                record.finish(None)
+                raise
+            record.finish(0, res.get_size())
+            return res
+
+        def on_done(connection: Gio.DBusConnection, task: Gio.AsyncResult):
+            try:
+                res = connection.call_finish(task)
+            except GLib.Error as ex:
+                record.finish(None)
+                callback(None, ex)
+                return
+            record.finish(0, res.get_size())
+            callback(res, None)
+
+        self.__connection.call(
+            self.BUS_NAME,
+            self.OBJECT_PATH,
+            self.INTERFACE,
+            method,
+            params,
+            GLib.VariantType(reply),
+            Gio.DBusCallFlags.NONE,
+            self.TIMEOUT_MS,
+            None,
+            on_done,
+        )
+        return None
+
+    def _unpack_all(self, channel: str, res: GLib.Variant) -> Dict[str, GLib.Variant]:
+        """
+        @brief      Unpack a `GetAllProperties` reply.
+
+        @param      channel  Channel name
+
+        @param      res      Reply variant
+
+        @return     Dictionary of property path and GLib.Variant value
+        """
+        props: GLib.Variant = res.get_child_value(0)
+        values: Dict[str, GLib.Variant] = {}
+        for idx in range(props.n_children()):
+            entry = props.get_child_value(idx)
+            prop = entry.get_child_value(0).get_string()
+            value = entry.get_child_value(1).get_variant()
+            self.__types[(channel, prop)] = value.get_type_string()
+            values[prop] = value
+        return values
+
+    def _unpack_one(self, channel: str, prop: str, res: GLib.Variant) -> GLib.Variant:
+        """
+        @brief      Unpack a `GetProperty` reply.
+
+        @param      channel  Channel name
+
+        @param      prop     Property path
+
+        @param      res      Reply variant
+
+        @return     GLib.Variant holding the value
+        """
+        value: GLib.Variant = res.get_child_value(0).get_variant()
+        self.__types[(channel, prop)] = value.get_type_string()
+        return value
+
+    def _set_params(self, channel: str, prop: str, value: str) -> GLib.Variant:
+        """
+        @brief      Build the `SetProperty` parameters.
+
+        @details    The string value is converted to the type the property
+        already has, just like `xfconf-query -s` does. Returns `None` if that
+        type is not known yet.
+
+        @param      channel  Channel name
+
+        @param      prop     Property path
+
+        @param      value    New value as string
+
+        @return     GLib.Variant or None
+        """
+        type_str = self.__types.get((channel, prop))
+        if type_str is None:
+            return None
+        variant = GLib.Variant(type_str, _xfconf_from_string(type_str, value))
+        return GLib.Variant("(ssv)", (channel, prop, variant))
+
+    def _forget(self, channel: str, prop: str):
+        """
+        @brief      Drop remembered types of a property and its children.
+
+        @param      channel  Channel name
+
+        @param      prop     Property path
+
+        @return     None
+        """
+        self.__types = {
+            key: type_str
+            for key, type_str in self.__types.items()
+            if key[0] != channel
+            or not (key[1] == prop or key[1].startswith(prop + "/"))
+        }
+
+    def get(self, channel: str, prop: str) -> GLib.Variant:
+        """
+        @brief      Read a single property.
+
+        @details    Raises `GLib.Error` if the property does not exist.
+
+        @param      channel  Channel name
+
+        @param      prop     Property path
+
+        @return     GLib.Variant holding the value
+        """
+        res = self._call("GetProperty", GLib.Variant("(ss)", (channel, prop)), "(v)")
+        return self._unpack_one(channel, prop, res)
+
+    def get_all(self, channel: str, base: str = "/") -> Dict[str, GLib.Variant]:
+        """
+        @brief      Read every property under a base path.
+
+        @param      channel  Channel name
+
+        @param      base     Property base path
+
+        @return     Dictionary of property path and GLib.Variant value
+        """
+        res = self._call(
+            "GetAllProperties",
+            GLib.Variant("(ss)", (channel, base)),
+            "(a{sv})",
+        )
+        return self._unpack_all(channel, res)
+
+    def set(self, channel: str, prop: str, value: str):
+        """
+        @brief      Write a single property.
+
+        @details    Raises `KeyError` if the property does not exist yet, as
+        its type can not be guessed.
+
+        @param      channel  Channel name
+
+        @param      prop     Property path
+
+        @param      value    New value as string
+
+        @return     None
+        """
+        params = self._set_params(channel, prop, value)
+        if params is None:
+            try:
+                self.get(channel, prop)
+            except GLib.Error:
+                raise KeyError(f"{channel}:{prop}")
+            params = self._set_params(channel, prop, value)
+        self._call("SetProperty", params, "()")
+
+    def set_many(self, channel: str, values: Dict[str, str], callback: Callable):
+        """
+        @brief      Write several properties of a channel at once.
+
+        @details    All the calls are sent before waiting for any reply, so
+        the whole batch costs a single round trip to the daemon, two for
+        properties whose type is not known yet and is read first.
+        `callback(failed)` is invoked from the main loop with the list of
+        properties that could not be set.
+
+        @param      channel    Channel name
+
+        @param      values     Dictionary of property path and value string
+
+        @param      callback   Completion callback
+
+        @return     None
+        """
+        failed: List[str] = []
+        pending: set = set(values)
+
+        def finish(prop: str, ok: bool):
+            pending.discard(prop)
+            if not ok:
+                failed.append(prop)
+            if not pending:
+                GLib.idle_add(callback, failed)
+
+        def on_set(prop: str, res: GLib.Variant, error: Exception):
+            if error is not None:
+                print(f"xfconf bus call failed: {error.message}")
+            finish(prop, error is None)
+
+        def send(prop: str):
+            try:
+                params = self._set_params(channel, prop, values[prop])
+            except (KeyError, ValueError):
+                params = None
+            if params is None:
+                finish(prop, False)
+                return
+            self._call(
+                "SetProperty",
+                params,
+                "()",
+                callback=functools.partial(on_set, prop),
+            )
+
+        def on_type(prop: str, res: GLib.Variant, error: Exception):
+            if error is not None:
+                # does not exist, xfconf-query will create it
+                finish(prop, False)
+                return
+            self._unpack_one(channel, prop, res)
+            send(prop)
+
+        if not values:
+            GLib.idle_add(callback, failed)
+            return
+        for prop in list(values):
+            if (channel, prop) in self.__types:
+                send(prop)
+            else:
+                self._call(
+                    "GetProperty",
+                    GLib.Variant("(ss)", (channel, prop)),
+                    "(v)",
+                    callback=functools.partial(on_type, prop),
+                )
+
+    def reset(self, channel: str, prop: str, recursive: bool = False):
+        """
+        @brief      Reset (remove) a property.
+
+        @param      channel     Channel name
+
+        @param      prop        Property path
+
+        @param      recursive   Also reset the sub properties
+
+        @return     None
+        """
+        self._call(
+            "ResetProperty",
+            GLib.Variant("(ssb)", (channel, prop, recursive)),
+            "()",
+        )
+        self._forget(channel, prop)
+
+    def _format(self, query: XfconfQuery, res: GLib.Variant) -> List[str]:
+        """
+        @brief      Format the reply of a query like `xfconf-query` does.
+
+        @param      query    XfconfQuery
+
+        @param      res      Reply variant
+
+        @return     List of strings
+        """
+        if query.list:
+            props = self._unpack_all(query.channel, res)
+            names = sorted(props)
+            if not query.verbose:
+                return names
+            width = max((len(name) for name in names), default=0)
+            return [
+                f"{name:<{width}}  {_xfconf_to_string(props[name])}".strip()
+                for name in names
+            ]
+        if query.reset:
+            self._forget(query.channel, query.prop)
+            return []
+        if query.values:
+            return []
+
+        value = self._unpack_one(query.channel, query.prop, res)
+        if value.get_type_string().startswith("a"):
+            items = [
+                _xfconf_to_string(value.get_child_value(idx))
+                for idx in range(value.n_children())
+            ]
+            return [f"Value is an array with {len(items)} items:"] + items
+        return [_xfconf_to_string(value)]
+
+    def _request(self, query: XfconfQuery) -> tuple:
+        """
+        @brief      Map a query to a bus call.
+
+        @details    Returns `None` for a write whose property type is not
+        known yet.
+
+        @param      query    XfconfQuery
+
+        @return     Tuple of method, parameters and reply signature or None
+        """
+        if query.list:
+            params = GLib.Variant("(ss)", (query.channel, query.prop or "/"))
+            return ("GetAllProperties", params, "(a{sv})")
+        if query.reset:
+            params = GLib.Variant(
+                "(ssb)",
+                (query.channel, query.prop, query.recursive),
+            )
+            return ("ResetProperty", params, "()")
+        if query.values:
+            params = self._set_params(query.channel, query.prop, query.values[0])
+            if params is None:
+                return None
+            return ("SetProperty", params, "()")
+        params = GLib.Variant("(ss)", (query.channel, query.prop))
+        return ("GetProperty", params, "(v)")
+
+    def execute(self, query: XfconfQuery) -> List[str]:
+        """
+        @brief      Run a parsed query and format the result.
+
+        @details    The output follows `xfconf-query` so that callers do not
+        need to know which backend served them. Raises `GLib.Error` or
+        `KeyError` on failure.
+
+        @param      query    XfconfQuery
+
+        @return     List of strings
+        """
+        request = self._request(query)
+        if request is None:
+            self.set(query.channel, query.prop, query.values[0])
+            return []
+        return self._format(query, self._call(*request))
+
+    def execute_async(self, query: XfconfQuery, callback: Callable):
+        """
+        @brief      Run a parsed query without blocking the main loop.
+
+        @details    `callback(lines, error)` is invoked from the main loop
+        once the reply arrived. On failure `lines` is `None` and `error` is
+        the `GLib.Error`, `KeyError` or `ValueError` that occurred.
+
+        @param      query      XfconfQuery
+
+        @param      callback   Completion callback
+
+        @return     None
+        """
+
+        def on_reply(res: GLib.Variant, error: Exception):
+            if error is not None:
+                callback(None, error)
+                return
+            callback(self._format(query, res), None)
+
+        def on_type(res: GLib.Variant, error: Exception):
+            if error is not None:
+                callback(None, KeyError(f"{query.channel}:{query.prop}"))
+                return
+            self._unpack_one(query.channel, query.prop, res)
+            try:
+                request = self._request(query)
+            except (KeyError, ValueError) as ex:
+                callback(None, ex)
+                return
+            run(request)
+
+        def run(request: tuple):
+            self._call(*request, callback=on_reply)
+
+        try:
+            request = self._request(query)
+        except (KeyError, ValueError) as ex:
+            GLib.idle_add(callback, None, ex)
+            return
+        if request is None:
+            params = GLib.Variant("(ss)", (query.channel, query.prop))
+            self._call("GetProperty", params, "(v)", callback=on_type)
+            return
+        run(request)
+
+
+def _xfconf_to_string(value: GLib.Variant) -> str:
+    """
+    @brief      Format a property value the way `xfconf-query` prints it.
+
+    @param      value    GLib.Variant
+
+    @return     str
+    """
+    if value.get_type_string() == "v":
+        value = value.get_variant()
+    data = value.unpack()
+    if isinstance(data, bool):
+        return "true" if data else "false"
+    if isinstance(data, float):
+        return f"{data:f}"
+    return str(data)
+
+
+def _xfconf_from_string(type_str: str, value: str):
+    """
+    @brief      Convert a string to the python value of a GVariant type.
+
+    @param      type_str   GVariant type string (i.e `s`, `u`, `b`)
+
+    @param      value      Value as string
+
+    @return     Python value suitable for `GLib.Variant`
+    """
+    if type_str == "b":
+        return value.strip().lower() in ("true", "1", "yes")
+    if type_str in ("y", "n", "q", "i", "u", "x", "t", "h"):
+        return int(value)
+    if type_str == "d":
+        return float(value)
+    if type_str in ("s", "o", "g"):
+        return value
+    raise KeyError(f"unsupported property type {type_str}")
+
+
+XFCONF_BUS: XfconfBus = None
+XFCONF_BUS_PROBED: bool = False
+
+
+def get_xfconf_bus() -> XfconfBus:
+    """
+    @brief      Get the shared xfconf bus connection.
+
+    @details    The session bus is probed only once. If it is not reachable
+    `None` is returned and callers should spawn `xfconf-query` instead.
+    Setting the `WELCOME_SCREEN_NO_DBUS` environment variable disables the
+    bus backend altogether.
+
+    @param      None
+
+    @return     XfconfBus or None
+    """
+    global XFCONF_BUS, XFCONF_BUS_PROBED
+    if not XFCONF_BUS_PROBED:
+        XFCONF_BUS_PROBED = True
+        if not os.environ.get("WELCOME_SCREEN_NO_DBUS"):
+            import_gi(gtk=False)
+            XFCONF_BUS = XfconfBus.connect()
+    return XFCONF_BUS
+
+
+class XfceCommand(BaseCommand):
+    """Represents a single `xfconf-query` command.
+
+    When the xfconf daemon is reachable over the session bus the command is
+    served through `XfconfBus`, otherwise `xfconf-query` is spawned.
+    """
+
+    def __init__(
+        self,
+        *args: Iterable[str],
+        exe: str = "xfconf-query",
+        **kw,
+    ):
+        """
+        @brief      Initialize command object.
+
+        @param      args   List of strings to be send to the command
+        @param      exe    Executable path
+        """
+        super().__init__(**kw)
+        self.__exe = exe
+        self.__args = args
+        self.__query: XfconfQuery = None
+        if exe == "xfconf-query":
+            self.__query = XfconfQuery.parse(args)
+
+    @property
+    def query(self) -> XfconfQuery:
+        """Parsed arguments, `None` if the bus backend can't serve them."""
+        return self.__query
+
+    def __str__(self) -> str:
+        return " ".join([self.__exe, *self.__args])
+
+    def target(self) -> tuple:
+        """
+        @brief      The property this command sets, if any.
+
+        @param      None
+
+        @return     Tuple of (`xfconf`, channel, property) and value or None
+        """
+        query = self.__query
+        if not query or query.list or query.reset or not query.values:
+            return None
+        return ("xfconf", query.channel, query.prop), query.values[0]
+
+    def execute(self) -> List[str]:
+        """
+        @brief      Run the command and return its output.
+
+        @details    This can raise `CalledProcessError` in case the command
+        return value was non zero. Output of both stdout and stderr will be
+        captured and formatted into utf8 string list. Every string in the
+        output will be stripped off of whitespaces from both ends.
+
+        @param      None
+
+        @return     List of string
+        """
+        args = [
+            self.__exe,
+        ]
+        args.extend(self.__args)
+
+        bus = get_xfconf_bus() if self.__query else None
+        if bus:
+            try:
+                return bus.execute(self.__query)
+            except (KeyError, ValueError):
+                # unknown property or type, let xfconf-query deal with it
+                pass
+            except GLib.Error as ex:
+                if self.__query.list or self.__query.values:
+                    print(f"xfconf bus call failed: {ex.message}")
+                elif self.check:
+                    raise subprocess.CalledProcessError(1, args, ex.message)
+                else:
+                    return []
+
+        ret_str_list = self._run(args)
+        return ret_str_list
+
+    def execute_async(self, callback: Callable[[List[str]], None] = None):
+        """
+        @brief      Run the command without blocking the main loop.
+
+        @param      callback   Completion callback receiving the output
+
+        @return     None
+        """
+        args = [
+            self.__exe,
+        ]
+        args.extend(self.__args)
+        if callback is None:
+            callback = lambda res: None  # noqa: E731
+
+        bus = get_xfconf_bus() if self.__query else None
+        if not bus:
+            self._run_async(args, callback)
+            return
+
+        def on_done(lines: List[str], error: Exception):
+            if error is None:
+                callback(lines)
+                return
+            if isinstance(error, GLib.Error):
+                if not (self.__query.list or self.__query.values):
+                    print(f"xfconf query failed: {error.message}")
+                    callback([])
+                    return
+                print(f"xfconf bus call failed: {error.message}")
+            self._run_async(args, callback)
+
+        bus.execute_async(self.__query, on_done)
+
+
+class XfconfBatchCommand(BaseCommand):
+    """Sets several properties of one xfconf channel at once.
+
+    With the bus backend all the writes are pipelined on the connection.
+    Properties the bus could not set, or all of them without the bus, are
+    set by `xfconf-query` processes running side by side.
+    """
+
+    def __init__(self, channel: str, values: Dict[str, str], **kw):
+        super().__init__(**kw)
+        self.__channel = channel
+        self.__values = dict(values)
+
+    def __str__(self) -> str:
+        return "; ".join(" ".join(self._args(prop)) for prop in self.__values)
+
+    def targets(self) -> List[tuple]:
+        return [
+            (("xfconf", self.__channel, prop), value)
+            for prop, value in self.__values.items()
+        ]
+
+    def _args(self, prop: str) -> List[str]:
+        """
+        @brief      The `xfconf-query` arguments setting a single property.
+
+        @param      prop     Property path
+
+        @return     List of strings
+        """
+        value = self.__values[prop]
+        return ["xfconf-query", "-c", self.__channel, "-p", prop, "-s", value]
+
+    def execute(self) -> List[str]:
+        """
+        @brief      Set the properties and wait for them.
+
+        @details    The bus writes go one after another, the `xfconf-query`
+        processes for the rest are all started before they are waited for.
+
+        @param      None
+
+        @return     Empty list
+        """
+        bus = get_xfconf_bus()
+        props: List[str] = []
+        for prop, value in self.__values.items():
+            if bus:
+                try:
+                    bus.set(self.__channel, prop, value)
+                    continue
+                except (KeyError, ValueError):
+                    pass
+                except GLib.Error as ex:
+                    print(f"xfconf bus call failed: {ex.message}")
+            props.append(prop)
+        self._run_many([self._args(prop) for prop in props])
+        return []
+
+    def execute_async(self, callback: Callable[[List[str]], None] = None):
+        """
+        @brief      Set the properties without blocking the main loop.
+
+        @param      callback   Completion callback receiving an empty list
+
+        @return     None
+        """
+        if callback is None:
+            callback = lambda res: None  # noqa: E731
+        bus = get_xfconf_bus()
+        if not bus:
+            self._run_all(list(self.__values), callback)
+            return
+        bus.set_many(
+            self.__channel,
+            self.__values,
+            lambda failed: self._run_all(failed, callback),
+        )
+
+    def _run_all(self, props: List[str], callback: Callable):
+        """
+        @brief      Set properties with concurrent `xfconf-query` processes.
+
+        @param      props      Property paths
+
+        @param      callback   Called with an empty list once all finished
+
+        @return     None
+        """
+        if not props:
+            callback([])
+            return
+        pending: List[str] = list(props)
+
+        def on_done(lines: List[str]):
+            pending.pop()
+            if not pending:
+                callback([])
+
+        for prop in props:
+            self._run_async(self._args(prop), on_done)
+
+
+class ShellCommand(BaseCommand):
+    """Represents a shell command."""
+
+    def __init__(self, *args, **kw):
+        """
+        @brief      Construct a generic shell command.
+
+        @details    Allows user to run a shell command using an instance of
+        this class.
+
+        @param      args     List of arguments as string.
+
+        @param      kw       Keyword arguments passed to the parent.
+
+        @return     None
+        """
+        super().__init__(**kw)
+        self.__args = args
+
+    def __str__(self) -> str:
+        return " ".join(self.__args)
+
+    def execute(self) -> List[str]:
+        """
+        @brief      Run the command.
+
+        @param      None
+
+        @return     List of strings
+        """
+        return self._run(self.__args)
+
+    def execute_async(self, callback: Callable[[List[str]], None] = None):
+        """
+        @brief      Run the command without blocking the main loop.
+
+        @param      callback   Completion callback receiving the output
+
+        @return     None
+        """
+        self._run_async(self.__args, callback or (lambda res: None))
+
+
+def write_file_atomic(path: str, data: Union[str, bytes]):
+    """
+    @brief      Replace a file without readers ever seeing it half written.
+
+    @details    The data is written to a temporary file in the same folder,
+    which then takes the place of the file. The permissions of an existing
+    file are kept, new files get the usual permissions after the umask. A
+    symlink is followed, the file it points to is replaced. Missing folders
+    are created.
+
+    @param      path     File path
+
+    @param      data     New content, written as binary if given as bytes
+
+    @return     None
+    """
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        # the umask can only be read by setting it
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ConfFile:
+    """An INI style config file, parsed once and kept in memory.
+
+    The lines are read again only when the modification time or the size of
+    the file changed. Edits that would not change any value leave the file
+    alone, others are written to a temporary file which then replaces the
+    original, so readers never see a half written file.
+    """
+
+    def __init__(self, path: str):
+        """
+        @brief      Create a not yet loaded config file.
+
+        @param      path     File path, `~` is expanded
+
+        @return     None
+        """
+        self.path = os.path.expanduser(path)
+        self.__stamp: tuple = None
+        self.__loaded: bool = False
+        self.__lines: List[str] = []
+
+    def _stamp(self) -> tuple:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def lines(self) -> List[str]:
+        """
+        @brief      Lines of the file, reloaded if it changed on disk.
+
+        @details    A missing or unreadable file has no lines.
+
+        @param      None
+
+        @return     List of strings without line endings
+        """
+        stamp = self._stamp()
+        if not self.__loaded or stamp != self.__stamp:
+            try:
+                with open(self.path, "r") as f:
+                    self.__lines = f.read().splitlines()
+            except OSError:
+                self.__lines = []
+            self.__stamp = stamp
+            self.__loaded = True
+        return self.__lines
+
+    @staticmethod
+    def _parse(line: str) -> tuple:
+        """
+        @brief      Split a `key=value` line.
+
+        @param      line     Line of the file
+
+        @return     (key, value) with quotes removed, or None
+        """
+        line = line.strip()
+        if not line or line[0] in "#;[":
+            return None
+        key, sep, value = line.partition("=")
+        if not sep:
+            return None
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        return key.strip(), value
+
+    def values(self) -> Dict[str, str]:
+        """
+        @brief      The `key=value` pairs of the file.
+
+        @details    Keys are not qualified by their section, the first
+        occurrence of a key wins.
+
+        @param      None
+
+        @return     Dictionary of key and value
+        """
+        values: Dict[str, str] = {}
+        for line in self.lines():
+            entry = self._parse(line)
+            if entry:
+                values.setdefault(*entry)
+        return values
+
+    def _find(self, lines: List[str], section: str, key: str) -> tuple:
+        """
+        @brief      Locate a key, or where to add it.
+
+        @param      lines     Lines to search
+
+        @param      section   Section name, `None` for the whole file
+
+        @param      key       Key name
+
+        @return     (index of the key or None, index of the section header
+        or None)
+        """
+        current = None
+        header = None
+        for idx, line in enumerate(lines):
+            stripped = line.strip()
+            if stripped.startswith("["):
+                current = stripped.strip("[]")
+                if current == section:
+                    header = idx
+                continue
+            if section is not None and current != section:
+                continue
+            entry = self._parse(line)
+            if entry and entry[0] == key:
+                return idx, header
+        return None, header
+
+    def apply(self, edits: Iterable[tuple], quote: bool = False) -> bool:
+        """
+        @brief      Set several keys with at most one write.
+
+        @param      edits    (section, key, value) tuples, `section` being
+        `None` for files without sections
+
+        @param      quote    Write the values as quoted strings
+
+        @return     True if the file was written
+        """
+        lines = list(self.lines())
+        changed = False
+        for section, key, value in edits:
+            new_line = f'{key}="{value}"' if quote else f"{key}={value}"
+            idx, header = self._find(lines, section, key)
+            if idx is not None:
+                if self._parse(lines[idx])[1] != value:
+                    lines[idx] = new_line
+                    changed = True
+                continue
+            changed = True
+            if section is None:
+                lines.append(new_line)
+            elif header is None:
+                if lines and lines[-1].strip():
+                    lines.append("")
+                lines.extend([f"[{section}]", new_line])
+            else:
+                # after the last entry of the section
+                end = header + 1
+                for pos in range(header + 1, len(lines)):
+                    if lines[pos].strip().startswith("["):
+                        break
+                    if lines[pos].strip():
+                        end = pos + 1
+                lines.insert(end, new_line)
+
+        if not changed:
+            return False
+        self._write(lines)
+        return True
+
+    def _write(self, lines: List[str]):
+        """
+        @brief      Replace the file atomically.
+
+        @param      lines    New lines of the file
+
+        @return     None
+        """
+        write_file_atomic(self.path, "\n".join(lines) + "\n")
+        self.__lines = lines
+        self.__stamp = self._stamp()
+
+
+CONF_FILES: Dict[str, ConfFile] = {}
+
+
+def get_conf_file(path: str) -> ConfFile:
+    """
+    @brief      Get the shared, cached ConfFile of a path.
+
+    @param      path     File path, `~` is expanded
+
+    @return     ConfFile
+    """
+    path = os.path.expanduser(path)
+    if path not in CONF_FILES:
+        CONF_FILES[path] = ConfFile(path)
+    return CONF_FILES[path]
+
+
+class ConfFileCommand(BaseCommand):
+    """Sets keys of an INI style config file.
+
+    Commands editing the same file are merged by `merge` so that the file is
+    written only once.
+    """
+
+    def __init__(self, path: str, edits: Iterable[tuple], quote: bool = False):
+        """
+        @brief      Create the command.
+
+        @param      path     File path as used in the setting keys
+
+        @param      edits    (section, key, value) tuples
+
+        @param      quote    Write the values as quoted strings
+
+        @return     None
+        """
+        super().__init__()
+        self.path = path
+        self.edits: List[tuple] = list(edits)
+        self.quote = quote
+
+    def __str__(self) -> str:
+        values = ", ".join(f"{key}={value}" for _, key, value in self.edits)
+        return f"set {values} in {self.path}"
+
+    def target(self) -> tuple:
+        """
+        @brief      The setting this command changes, if it is a single one.
+
+        @param      None
+
+        @return     Tuple of (`file`, path, key) and value or None
+        """
+        if len(self.edits) != 1:
+            return None
+        _, key, value = self.edits[0]
+        return ("file", self.path, key), value
+
+    def targets(self) -> List[tuple]:
+        return [(("file", self.path, key), value) for _, key, value in self.edits]
+
+    def execute(self) -> List[str]:
+        if get_conf_file(self.path).apply(self.edits, self.quote):
+            print(f"Updated {self.path}")
+        return []
+
+    @staticmethod
+    def merge(commands: List[BaseCommand]) -> List[BaseCommand]:
+        """
+        @brief      Merge the edits of the same file into one command.
+
+        @details    The merged command takes the place of the first command
+        editing that file. The given commands are left untouched.
+
+        @param      commands   List of BaseCommand
+
+        @return     List of BaseCommand
+        """
+        merged: List[BaseCommand] = []
+        by_path: Dict[str, int] = {}
+        for cmd in commands:
+            if not isinstance(cmd, ConfFileCommand):
+                merged.append(cmd)
+                continue
+            idx = by_path.get(cmd.path)
+            if idx is None:
+                by_path[cmd.path] = len(merged)
+                merged.append(cmd)
+                continue
+            first = merged[idx]
+            merged[idx] = ConfFileCommand(
+                first.path, first.edits + cmd.edits, first.quote
+            )
+        return merged
+
+
+class Qt5IconChangeCommand(ConfFileCommand):
+    """Represents an operation to replace the icon theme in qt5ct conf."""
+
+    CONF_PATH: str = "~/.config/qt5ct/qt5ct.conf"
+
+    def __init__(self, theme: str):
+        super().__init__(self.CONF_PATH, [("Appearance", "icon_theme", theme)])
+
+
+GTK3_SETTINGS_PATH: str = "~/.config/gtk-3.0/settings.ini"
+GTK2_RC_PATH: str = "~/.gtkrc-2.0"
+
+
+def gtk_settings_commands(theme: str, icon_theme: str) -> List[BaseCommand]:
+    """
+    @brief      Commands setting the theme for apps not following xsettings.
+
+    @details    These write the GTK 3 `settings.ini` and the GTK 2 rc file.
+
+    @param      theme        GTK theme name
+
+    @param      icon_theme   Icon theme name
+
+    @return     List of BaseCommand
+    """
+    return [
+        ConfFileCommand(GTK3_SETTINGS_PATH, [("Settings", "gtk-theme-name", theme)]),
+        ConfFileCommand(
+            GTK3_SETTINGS_PATH, [("Settings", "gtk-icon-theme-name", icon_theme)]
+        ),
+        ConfFileCommand(GTK2_RC_PATH, [(None, "gtk-theme-name", theme)], True),
+        ConfFileCommand(
+            GTK2_RC_PATH, [(None, "gtk-icon-theme-name", icon_theme)], True
+        ),
+    ]
+
+
+def set_busy(busy: bool):
+    """
+    @brief      Show or hide the busy indicator.
+
+    @details    Calls are counted, so the spinner of the current window keeps
+    spinning until every `set_busy(True)` is matched by a `set_busy(False)`.
+
+    @param      busy   bool
+
+    @return     None
+    """
+    global BUSY_COUNT
+    BUSY_COUNT = max(0, BUSY_COUNT + (1 if busy else -1))
+    update_busy_indicator()
+
+
+def update_busy_indicator():
+    """
+    @brief      Sync the spinner of the current window with the busy state.
+
+    @param      None
+
+    @return     None
+    """
+    if BUSY_SPINNER is None:
+        return
+    if BUSY_COUNT:
+        BUSY_SPINNER.show()
+        BUSY_SPINNER.start()
+    else:
+        BUSY_SPINNER.stop()
+        BUSY_SPINNER.hide()
+
+
+def run_commands_async(commands: List[BaseCommand], callback: Callable = None):
+    """
+    @brief      Run a list of commands one after another in the background.
+
+    @details    Every command is started only after the previous one
+    finished, but the main loop keeps running in between. Commands that would
+    not change anything are left out by the `STATE_PLANNER`. The busy
+    indicator is shown while the commands run and `callback` is called at
+    the end.
+
+    @param      commands   List of BaseCommand
+
+    @param      callback   Optional callable without arguments
+
+    @return     None
+    """
+    pending: List[BaseCommand] = []
+    current: List[BaseCommand] = []
+    set_busy(True)
+
+    def run_next(*args):
+        if current:
+            STATE_PLANNER.update(current.pop())
+        if not pending:
+            set_busy(False)
+            if callback:
+                callback()
+            return
+        current.append(pending.pop(0))
+        current[0].execute_async(run_next)
+
+    def on_plan(planned: List[BaseCommand]):
+        if not STATE_PLANNER.dry_run:
+            pending.extend(planned)
+        run_next()
+
+    STATE_PLANNER.plan_async(commands, on_plan)
+
+
+def get_cur_theme() -> str:
+    """
+    @brief      Get the current theme name
+
+    @details    This can throw exception in case of failure.
+
+    @param      None
+
+    @return     str
+    """
+    cur_theme_cmd = XfceCommand(
+        "-c",
+        "xsettings",
+        "-p",
+        "/Net/ThemeName",
+    )
+    res = cur_theme_cmd.execute()
+    if not res:
+        raise RuntimeError("Could not determine current theme.")
+
+    return res[0]
+
+
+def parse_panel_number(lines: List[str]) -> int:
+    """
+    @brief      Get the panel id from the `/panels` property output.
+
+    @param      lines   Output lines of the `/panels` query
+
+    @return     int
+    """
+    panel_id = 0
+    try:
+        tmp = int(lines[-1])
+        panel_id = tmp
+    except Exception:
+        pass
+    return panel_id
+
+
+def get_panel_number() -> int:
+    """
+    @brief      Get the panel id.
+
+    @param      None
+
+    @return     int
+    """
+    command = XfceCommand("-c", "xfce4-panel", "-p", "/panels")
+    with trace_span("get_panel_number"):
+        res = command.execute()
+    return parse_panel_number(res)
+
+
+PANEL_ID: int = None
+
+
+def get_panel_id() -> int:
+    """
+    @brief      Get the panel id, querying it on first use only.
+
+    @param      None
+
+    @return     int
+    """
+    global PANEL_ID
+    if PANEL_ID is None:
+        res = ENVIRONMENT.result("panels") if ENVIRONMENT else None
+        if res is not None:
+            PANEL_ID = parse_panel_number(res)
+        else:
+            PANEL_ID = get_panel_number()
+    return PANEL_ID
+
+
+def resolve_path(fileName: str) -> str:
+    """
+    @brief      Resolve a file path
+
+    @details This tries to find the file under some specific folders. These
+    folders include the script folder, `/usr/share/easyarch-welcome/`,
+    `/etc/easyarch-welcome` in the same sequence. First existing path will be
+    returned. If no path could be resolved then `None` is returned.
+
+    @param      fileName   string file name(i.e layout-bh.png)
+
+    @return     str or None
+    """
+    cur_dir = os.path.abspath(os.path.dirname(__file__))
+    path_list = [
+        cur_dir,
+        "/usr/share/easyarch-welcome",
+        "/etc/easyarch-welcome",
+    ]
+    for path in path_list:
+        full_path = os.path.join(path, fileName)
+        if os.path.exists(full_path):
+            return full_path
+    return None
+
+
+RESOURCE_BUNDLE_NAME: str = "welcome-screen.gresource"
+RESOURCE_PREFIX: str = "/org/easyarch/welcome"
+RESOURCES: Gio.Resource = None
+
+
+def load_resources() -> bool:
+    """
+    @brief      Register the compiled resource bundle.
+
+    @details    The bundle is memory mapped and holds the ui files and
+    images, so they don't need to be looked up and read one by one. Setting
+    the `WELCOME_SCREEN_USE_FILES` environment variable, or not having the
+    bundle built, makes the application use the loose files instead, which
+    is handy during development.
+
+    @param      None
+
+    @return     bool  Whether the bundle is used
+    """
+    global RESOURCES
+    if RESOURCES is not None:
+        return True
+    if os.environ.get("WELCOME_SCREEN_USE_FILES"):
+        return False
+    path = resolve_path(RESOURCE_BUNDLE_NAME)
+    if not path:
+        return False
+    try:
+        RESOURCES = Gio.Resource.load(path)
+    except GLib.Error as ex:
+        print(f"Could not load {path}: {ex.message}")
+        return False
+    Gio.resources_register(RESOURCES)
+    return True
+
+
+def resource_path(name: str) -> str:
+    """
+    @brief      Get the resource path of an asset.
+
+    @param      name   Asset name relative to the data folder (i.e
+    `ui/WelcomeApp.glade`)
+
+    @return     str or None if the asset is not in the registered bundle
+    """
+    if RESOURCES is None:
+        return None
+    path = f"{RESOURCE_PREFIX}/{name}"
+    try:
+        RESOURCES.get_info(path, Gio.ResourceLookupFlags.NONE)
+    except GLib.Error:
+        return None
+    return path
+
+
+def builder_add_asset(builder: Gtk.Builder, name: str):
+    """
+    @brief      Add the objects of a ui file to a builder.
+
+    @param      builder   Gtk.Builder
+
+    @param      name      Ui file name (i.e `ui/WelcomeApp.glade`)
+
+    @return     None
+    """
+    path = resource_path(name)
+    if path:
+        builder.add_from_resource(path)
+    else:
+        builder.add_from_file(resolve_path(name))
+
+
+def load_pixbuf_asset(name: str, width: int = -1, height: int = -1):
+    """
+    @brief      Decode an image asset.
+
+    @details    If a width or height is given the image is decoded at that
+    size keeping the aspect ratio.
+
+    @param      name     Image file name (i.e `images/icon.png`)
+
+    @param      width    Width or -1
+
+    @param      height   Height or -1
+
+    @return     GdkPixbuf.Pixbuf
+    """
+    path = resource_path(name)
+    if path:
+        if width < 0 and height < 0:
+            return GdkPixbuf.Pixbuf.new_from_resource(path)
+        return GdkPixbuf.Pixbuf.new_from_resource_at_scale(path, width, height, True)
+    if width < 0 and height < 0:
+        return GdkPixbuf.Pixbuf.new_from_file(resolve_path(name))
+    return GdkPixbuf.Pixbuf.new_from_file_at_scale(
+        resolve_path(name),
+        width,
+        height,
+        True,
+    )
+
+
+def asset_file(name: str) -> Gio.File:
+    """
+    @brief      Get a Gio.File for an asset.
+
+    @param      name   Asset file name
+
+    @return     Gio.File or None if the asset does not exist
+    """
+    path = resource_path(name)
+    if path:
+        return Gio.File.new_for_uri(f"resource://{path}")
+    path = resolve_path(name)
+    if path:
+        return Gio.File.new_for_path(path)
+    return None
+
+
+def parse_virtual_machine(lines: List[str]) -> bool:
+    """
+    @brief      Interpret the output of `systemd-detect-virt`.
+
+    @param      lines   Output lines, empty if the program failed
+
+    @return     bool
+    """
+    if not lines or lines[0] == "none":
+        return False
+    return True
+
+
+def check_virtual_machine() -> bool:
+    """
+    @brief      Check whether we are running a VM or not.
+
+    @details    Uses systemd to detect virtualization.
+
+    @param      None
+
+    @return     bool
+    """
+    cmd = ShellCommand("systemd-detect-virt", check=False)
+    try:
+        return parse_virtual_machine(cmd.execute())
+    except OSError:
+        return False
+
+
+class DisplayMode:
+    """A display mode of an output.
+
+    `refresh` is the refresh rate in Hz, or `None` when the source does not
+    provide it (sysfs only lists the sizes).
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        refresh: float = None,
+        preferred: bool = False,
+        current: bool = False,
+    ):
+        self.width = width
+        self.height = height
+        self.refresh = refresh
+        self.preferred = preferred
+        self.current = current
+
+    @property
+    def size(self) -> str:
+        """Size of the mode as `WxH`, as understood by xrandr."""
+        return f"{self.width}x{self.height}"
+
+    def __repr__(self) -> str:
+        flags = ("*" if self.current else "") + ("+" if self.preferred else "")
+        if self.refresh is None:
+            return f"{self.size}{flags}"
+        return f"{self.size}@{self.refresh:.2f}{flags}"
+
+
+class DisplayOutput:
+    """A connected output with its display modes.
+
+    `x_name` tells whether `name` is the output name of the X server, which
+    is only the case for outputs listed by xrandr. Kernel connector names
+    differ from those, i.e. `HDMI-A-1` is `HDMI-1` or `HDMI-A-0` in X
+    depending on the driver.
+    """
+
+    def __init__(
+        self, name: str, modes: Iterable[DisplayMode] = (), x_name: bool = True
+    ):
+        self.name = name
+        self.x_name = x_name
+        self.modes: List[DisplayMode] = []
+        # (width, height, refresh) -> mode, to merge identical modes
+        self.__index: Dict[tuple, DisplayMode] = {}
+        for mode in modes:
+            self.add(mode)
+        self.sort()
+
+    def add(self, mode: DisplayMode):
+        """
+        @brief      Add a mode, merging it with an identical one.
+
+        @details    The mode is appended, call `sort` once all modes are
+        added.
+
+        @param      mode   DisplayMode
+
+        @return     None
+        """
+        key = (mode.width, mode.height, mode.refresh)
+        other = self.__index.get(key)
+        if other is not None:
+            other.preferred |= mode.preferred
+            other.current |= mode.current
+            return
+        self.__index[key] = mode
+        self.modes.append(mode)
+
+    def sort(self):
+        """
+        @brief      Sort the modes by size and refresh rate, largest first.
+
+        @param      None
+
+        @return     None
+        """
+        self.modes.sort(
+            key=lambda m: (m.width * m.height, m.width, m.refresh or 0),
+            reverse=True,
+        )
+
+    @property
+    def current(self) -> DisplayMode:
+        """The current mode, `None` if unknown."""
+        return next((m for m in self.modes if m.current), None)
+
+    @property
+    def preferred(self) -> DisplayMode:
+        """The preferred mode, `None` if unknown."""
+        return next((m for m in self.modes if m.preferred), None)
+
+    def __repr__(self) -> str:
+        return f"{self.name}: {self.modes}"
+
+
+DRM_SYSFS_PATH: str = "/sys/class/drm"
+
+
+def read_drm_outputs(root: str = None) -> List[DisplayOutput]:
+    """
+    @brief      Read the connected outputs and their modes from sysfs.
+
+    @details    Every connector of the kernel mode setting drivers has a
+    `status` and a `modes` file in `/sys/class/drm/card<N>-<output>`, the
+    first mode being the preferred one. There are no refresh rates and the
+    connector names are not those of the X server, so these outputs can
+    tell which sizes exist but cannot be passed to xrandr.
+
+    @param      root   Path of the drm class directory, `DRM_SYSFS_PATH`
+    if not given
+
+    @return     List of DisplayOutput, empty if not available
+    """
+    root = root or DRM_SYSFS_PATH
+    expr = re.compile(r"(\d+)x(\d+)")
+    outputs: List[DisplayOutput] = []
+    try:
+        entries = sorted(os.listdir(root))
+    except OSError:
+        return outputs
+    for entry in entries:
+        if not entry.startswith("card") or "-" not in entry:
+            continue
+        try:
+            with open(os.path.join(root, entry, "status")) as f:
+                if f.read().strip() != "connected":
+                    continue
+            with open(os.path.join(root, entry, "modes")) as f:
+                lines = f.read().split()
+        except OSError:
+            continue
+        output = DisplayOutput(entry.split("-", 1)[1], x_name=False)
+        for i, line in enumerate(lines):
+            match = re.match(expr, line)
+            if match:
+                width, height = int(match[1]), int(match[2])
+                output.add(DisplayMode(width, height, preferred=i == 0))
+        if output.modes:
+            output.sort()
+            outputs.append(output)
+    return outputs
+
+
+def parse_xrandr_outputs(lines: List[str]) -> List[DisplayOutput]:
+    """
+    @brief      Parse the output of `xrandr --query`.
+
+    @details    Only connected outputs are returned. In the mode lines a
+    `*` marks the current and a `+` the preferred refresh rate.
+
+    @param      lines   Stripped output lines of `xrandr --query`
+
+    @return     List of DisplayOutput
+    """
+    output_expr = re.compile(r"(\S+) connected")
+    mode_expr = re.compile(r"(\d+)x(\d+)i?(\s|$)")
+    rate_expr = re.compile(r"(\d+\.\d+)(\*)?\s?(\+)?")
+    outputs: List[DisplayOutput] = []
+    output: DisplayOutput = None
+    for line in lines:
+        # mode lines are the most, try them first
+        match = mode_expr.match(line)
+        if match:
+            if output is None:
+                continue
+            width, height = int(match[1]), int(match[2])
+            rates = rate_expr.findall(line, match.end())
+            if not rates:
+                output.add(DisplayMode(width, height))
+            for rate, current, preferred in rates:
+                output.add(
+                    DisplayMode(
+                        width,
+                        height,
+                        round(float(rate), 2),
+                        preferred=bool(preferred),
+                        current=bool(current),
+                    )
+                )
+            continue
+        match = output_expr.match(line)
+        if match:
+            output = DisplayOutput(match[1])
+            outputs.append(output)
+        elif " disconnected" in line or line.startswith("Screen "):
+            output = None
+    for output in outputs:
+        output.sort()
+    return outputs
+
+
+def get_display_outputs(xrandr_lines: List[str] = None) -> List[DisplayOutput]:
+    """
+    @brief      Return the connected outputs and their display modes.
+
+    @details    `xrandr --query` is parsed, its output can be passed in when
+    it was already collected. It is always needed in a running X session,
+    since only xrandr knows the refresh rates and the X output names, so
+    the connectors in sysfs are a fallback for when xrandr lists no
+    outputs, i.e. without an X server, to still list the sizes.
+
+    @param      xrandr_lines   Output of `xrandr --query`, run if needed
+
+    @return     List of DisplayOutput
+    """
+    if xrandr_lines is None:
+        cmd = ShellCommand("xrandr", "--query", check=False)
+        try:
+            xrandr_lines = cmd.execute()
+        except OSError:
+            xrandr_lines = []
+    return parse_xrandr_outputs(xrandr_lines) or read_drm_outputs()
+
+
+def list_resolutions(outputs: List[DisplayOutput]) -> tuple:
+    """
+    @brief      Collect the distinct resolutions of all outputs.
+
+    @param      outputs   List of DisplayOutput
+
+    @return     (sizes, active) where sizes is a list of `WxH` strings,
+    largest first, and active the current or else preferred size of the
+    first output, or `None`
+    """
+    modes: Dict[str, DisplayMode] = {}
+    for output in outputs:
+        for mode in output.modes:
+            modes.setdefault(mode.size, mode)
+    sizes = sorted(
+        modes,
+        key=lambda size: (modes[size].width * modes[size].height, size),
+        reverse=True,
+    )
+    active = None
+    if outputs:
+        mode = outputs[0].current or outputs[0].preferred
+        active = mode.size if mode else None
+    return sizes, active
+
+
+class XrandrApplyCommand(BaseCommand):
+    """Switches every output to a resolution with a single xrandr call.
+
+    Each output listed by xrandr offering the size gets an `--output --mode
+    --rate` clause, so the server does all of them in one mode set. The
+    call also asks for `--query`, and the printed state is parsed back into
+    the display model to check the outputs actually switched. Without any
+    suitable output, i.e. with outputs known from sysfs only, the legacy
+    `xrandr -s` is used.
+    """
+
+    def __init__(self, outputs: List[DisplayOutput], size: str, **kw):
+        super().__init__(**kw)
+        self.__size = size
+        self.__modes: List[tuple] = []
+        for output in outputs:
+            if not output.x_name:
+                continue
+            modes = [mode for mode in output.modes if mode.size == size]
+            if modes:
+                mode = max(
+                    modes,
+                    key=lambda m: (m.preferred, m.current, m.refresh or 0),
+                )
+                self.__modes.append((output.name, mode))
+        self.verified: bool = None
+
+    def _args(self) -> List[str]:
+        """
+        @brief      The xrandr arguments.
+
+        @param      None
+
+        @return     List of strings
+        """
+        if not self.__modes:
+            return ["xrandr", "-s", self.__size]
+        args = ["xrandr"]
+        for name, mode in self.__modes:
+            args.extend(["--output", name, "--mode", mode.size])
+            if mode.refresh is not None:
+                args.extend(["--rate", f"{mode.refresh:.2f}"])
+        args.append("--query")
+        return args
+
+    def __str__(self) -> str:
+        return " ".join(self._args())
+
+    def _verify(self, lines: List[str]) -> bool:
+        """
+        @brief      Check the state printed by xrandr against the request.
+
+        @param      lines   Output of the xrandr call
+
+        @return     bool or None if there is nothing to check against
+        """
+        if not self.__modes:
+            return None
+        current = {
+            output.name: output.current for output in parse_xrandr_outputs(lines)
+        }
+        for name, mode in self.__modes:
+            mode_now = current.get(name)
+            if mode_now is None or mode_now.size != mode.size:
+                print(f"Output {name} did not switch to {mode.size}")
+                return False
+        print(f"All outputs switched to {self.__size}")
+        return True
+
+    def execute(self) -> List[str]:
+        """
+        @brief      Run xrandr and verify the result.
+
+        @param      None
+
+        @return     List of string
+        """
+        lines = self._run(self._args())
+        self.verified = self._verify(lines)
+        return lines
+
+    def execute_async(self, callback: Callable[[List[str]], None] = None):
+        """
+        @brief      Run xrandr without blocking the main loop.
+
+        @param      callback   Completion callback receiving the output
+
+        @return     None
+        """
+
+        def on_done(lines: List[str]):
+            self.verified = self._verify(lines)
+            if callback:
+                callback(lines)
+
+        self._run_async(self._args(), on_done)
+
+
+def get_xresolution() -> List[str]:
+    """
+    @brief      Return supported display resolutions.
+
+    @param      None
+
+    @return     List of strings
+    """
+    sizes, _ = list_resolutions(get_display_outputs())
+    return sizes
+
+
+class Environment:
+    """Environment probes, run concurrently at startup.
+
+    Every probe is a command started in the background. Its output becomes
+    available through `result` as soon as it finished, so parts of the
+    application can go on as soon as the probes they depend on are done.
+    A probe which does not finish in time gets `None` as result.
+    """
+
+    TIMEOUT_MS: int = 5000
+
+    def __init__(self):
+        """
+        @brief      Create an environment without probes.
+
+        @param      None
+
+        @return     None
+        """
+        self.__probes: Dict[str, tuple] = {}
+        self.__results: Dict[str, List[str]] = {}
+        self.__waiters: List[tuple] = []
+
+    def add(self, name: str, command: BaseCommand, timeout: int = TIMEOUT_MS):
+        """
+        @brief      Register a probe.
+
+        @param      name      Probe name
+
+        @param      command   BaseCommand to run
+
+        @param      timeout   Milliseconds to wait for the result
+
+        @return     None
+        """
+        self.__probes[name] = (command, timeout)
+
+    def start(self):
+        """
+        @brief      Start all the probes at once.
+
+        @param      None
+
+        @return     None
+        """
+        for name, (command, timeout) in self.__probes.items():
+            start = TRACER.now() if TRACER else 0
+            command.execute_async(functools.partial(self._done, name, start))
+            GLib.timeout_add(timeout, self._timeout, name)
+
+    def _done(self, name: str, start: float, lines: List[str]):
+        if name in self.__results:
+            # already timed out
+            return
+        if TRACER:
+            TRACER.complete(f"probe {name}", start)
+        self.__results[name] = lines
+        self._notify()
+
+    def _timeout(self, name: str) -> bool:
+        if name not in self.__results:
+            print(f"Probe {name} timed out")
+            self.__results[name] = None
+            self._notify()
+        return False
+
+    def _notify(self):
+        waiters = self.__waiters
+        self.__waiters = []
+        for names, callback in waiters:
+            self.when_ready(names, callback)
+
+    def ready(self, names: Iterable[str]) -> bool:
+        """
+        @brief      Whether the given probes are finished.
+
+        @details    Probes that were never added count as finished, so
+        nobody waits for them forever.
+
+        @param      names   Probe names
+
+        @return     bool
+        """
+        return all(
+            name in self.__results or name not in self.__probes for name in names
+        )
+
+    def result(self, name: str) -> List[str]:
+        """
+        @brief      Output lines of a probe.
+
+        @param      name   Probe name
+
+        @return     List of strings or None if not finished or timed out
+        """
+        return self.__results.get(name)
+
+    def when_ready(self, names: Iterable[str], callback: Callable):
+        """
+        @brief      Call `callback` once the given probes are finished.
+
+        @details    If they already are the callback is called right away.
+
+        @param      names      Probe names
+
+        @param      callback   Callable without arguments
+
+        @return     None
+        """
+        names = list(names)
+        if self.ready(names):
+            callback()
+        else:
+            self.__waiters.append((names, callback))
+
+    @property
+    def is_vm(self) -> bool:
+        """Whether we run in a virtual machine."""
+        return parse_virtual_machine(self.result("virt"))
+
+    @property
+    def display_outputs(self) -> List[DisplayOutput]:
+        """Connected outputs and their display modes."""
+        return get_display_outputs(self.result("xrandr") or [])
+
+
+ENVIRONMENT: Environment = None
+
+
+def start_environment_probes() -> Environment:
+    """
+    @brief      Start all the environment probes concurrently.
+
+    @param      None
+
+    @return     Environment
+    """
+    global ENVIRONMENT
+    ENVIRONMENT = Environment()
+    ENVIRONMENT.add("virt", ShellCommand("systemd-detect-virt", check=False))
+    ENVIRONMENT.add("xrandr", ShellCommand("xrandr", "--query", check=False))
+    ENVIRONMENT.add(
+        "panels",
+        XfceCommand("-c", "xfce4-panel", "-p", "/panels", check=False),
+    )
+    ENVIRONMENT.start()
+    return ENVIRONMENT
+
+
+def resolution_commands(
+    displays: Dict[str, str], res_str: str, outputs: List[DisplayOutput]
+) -> List[BaseCommand]:
+    """
+    @brief      Commands switching all the displays to a resolution.
+
+    @details    The resolution properties of the active profile in the
+    `displays` channel are picked and written in one batch, followed by a
+    single xrandr call for all the outputs.
+
+    @param      displays   Properties of the `displays` xfconf channel
+
+    @param      res_str    Resolution (i.e `1920x1080`)
+
+    @param      outputs    Connected outputs and their modes
+
+    @return     List of BaseCommand
+    """
+    profile = displays.get("/ActiveProfile")
+    values: Dict[str, str] = {}
+    if profile:
+        print(f"Profile: {profile}")
+        prefix = f"/{profile}/"
+        for prop, value in displays.items():
+            if prop.startswith(prefix) and "Resolution" in prop:
+                print(f"Found resolution in {prop}")
+                if value != res_str:
+                    values[prop] = res_str
+    commands: List[BaseCommand] = []
+    if values:
+        commands.append(XfconfBatchCommand("displays", values))
+    # also use xrandr to change current resolution
+    commands.append(XrandrApplyCommand(outputs, res_str))
+    return commands
+
+
+def apply_resolution(widget: Gtk.ComboBoxText, outputs: List[DisplayOutput]):
+    """
+    @brief      Apply selected resolution from the combobox.
+
+    @details    The `displays` channel is read once, the resolution
+    properties of the active profile are picked from it and all of them are
+    written in one batch, so the time taken does not depend on the number of
+    saved profiles and outputs.
+
+    @param      widget     Gtk.ComboBoxText
+
+    @param      outputs    Connected outputs and their modes
+
+    @return     None
+    """
+    # apply resolution for all displays in the xfce settings
+    res_str = widget.get_active_id()
+    if res_str is None:
+        return
+    set_busy(True)
+
+    def on_channel(lines: List[str]):
+        displays = parse_xfconf_listing(lines)
+        STATE_PLANNER.seed(("xfconf", "displays"), displays)
+        commands = resolution_commands(displays, res_str, outputs)
+        run_commands_async(commands, lambda: set_busy(False))
+
+    cmd = XfceCommand("-c", "displays", "-l", "-v", check=False)
+    cmd.execute_async(on_channel)
+
+
+def init_res_app(outputs: List[DisplayOutput] = None) -> Gtk.ApplicationWindow:
+    """
+    @brief      Initialize the resolution settings app.
+
+    @details    Initialize and return the xrandr resolution settings
+    application.
+
+    @param      outputs   Display outputs to offer modes of, queried if
+    not given
+
+    @return     Gtk.ApplicationWindow
+    """
+    window: Gtk.ApplicationWindow = Gtk.ApplicationWindow()
+
+    vbox: Gtk.VBox = Gtk.VBox()
+    vbox.props.border_width = 10
+    vbox.props.spacing = 20
+
+    label: Gtk.Label = Gtk.Label()
+    label.set_markup(
+        "<big>Seems like you are running a virtual machine."
+        + "Would you like to switch display resolution ?</big>"
+    )
+    label.set_justify(Gtk.Justification.CENTER)
+    label.props.wrap = True
+    # vbox.add(label)
+    vbox.pack_start(label, False, False, 0)
+
+    hbox: Gtk.HBox = Gtk.HBox()
+    hbox.props.spacing = 20
+    # vbox.add(hbox)
+    vbox.pack_start(hbox, False, False, 0)
+
+    label2: Gtk.Label = Gtk.Label()
+    label2.set_markup("<big>Select Resolution</big>")
+    label2.set_justify(Gtk.Justification.RIGHT)
+    hbox.pack_start(label2, False, False, 0)
+
+    if outputs is None:
+        outputs = get_display_outputs()
+    resolutions, active = list_resolutions(outputs)
+    combobox: Gtk.ComboBoxText = Gtk.ComboBoxText()
+    for res in resolutions:
+        combobox.append(res, res)
+    combobox.set_entry_text_column(0)
+    if active is not None:
+        combobox.set_active_id(active)
+    elif len(resolutions) > 0:
+        combobox.set_active(0)
+    # combobox.connect(
+    #     "changed",
+    #     lambda w: print(w.get_active_text()),
+    # )
+    hbox.add(combobox)
+
+    hbox2: Gtk.HBox = Gtk.HBox()
+    hbox2.props.spacing = 10
+    # vbox.add(hbox2)
+    vbox.pack_end(hbox2, False, False, 0)
+
+    apply_btn: Gtk.Button = Gtk.Button(label="Apply")
+    apply_icon: Gtk.Image = Gtk.Image.new_from_icon_name(
+        "dialog-ok",
+        Gtk.IconSize.BUTTON,
+    )
+    apply_btn.set_image(apply_icon)
+    apply_btn.connect(
+        "clicked",
+        lambda w: apply_resolution(combobox, outputs),
+    )
+    hbox2.add(apply_btn)
+
+    exit_btn: Gtk.Button = Gtk.Button(label="Exit")
+    exit_icon: Gtk.Image = Gtk.Image.new_from_icon_name(
+        "window-close",
+        Gtk.IconSize.BUTTON,
+    )
+    exit_btn.set_image(exit_icon)
+    exit_btn.connect(
+        "clicked",
+        lambda w: window.close(),
+    )
+    hbox2.add(exit_btn)
+
+    headerbar: Gtk.HeaderBar = Gtk.HeaderBar()
+    headerbar.props.show_close_button = True
+    headerbar.set_title("Set Resolution")
+    window.set_titlebar(headerbar)
+
+    global BUSY_SPINNER
+    BUSY_SPINNER = Gtk.Spinner()
+    BUSY_SPINNER.set_no_show_all(True)
+    headerbar.pack_end(BUSY_SPINNER)
+
+    window_icon: GdkPixbuf.Pixbuf = load_pixbuf_asset(WINDOW_ICON_NAME)
+
+    window.add(vbox)
+    window.props.default_width = 400
+    window.set_title("Set Resolution")
+    window.set_icon(window_icon)
+
+    return window
+
+
+class AssetLoader:
+    """Decodes assets in worker threads.
+
+    Jobs are started right away and run in parallel with each other and with
+    whatever the main thread does meanwhile, like parsing the ui. The results
+    are handed to the callbacks from the main loop.
+    """
+
+    MAX_WORKERS: int = 4
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        """
+        @brief      Create a loader, threads are started on first use.
+
+        @param      max_workers   Number of worker threads
+
+        @return     None
+        """
+        self.__max_workers = max_workers
+        self.__executor: concurrent.futures.ThreadPoolExecutor = None
+
+    def submit(self, name: str, job: Callable, callback: Callable, *args):
+        """
+        @brief      Run a job in a worker thread.
+
+        @details    `callback` is called from the main loop with the return
+        value of `job(*args)`, or with `None` if the job failed.
+
+        @param      name       Asset name, used for reporting
+
+        @param      job        Callable doing the work
+
+        @param      callback   Callable receiving the result
+
+        @param      args       Arguments for the job
+
+        @return     concurrent.futures.Future
+        """
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.__max_workers,
+                thread_name_prefix="asset",
+            )
+
+        def run():
+            with trace_span(f"decode {name}"):
+                return job(*args)
+
+        def deliver(future: concurrent.futures.Future):
+            try:
+                result = future.result()
+            except Exception as ex:
+                print(f"Could not load {name}: {ex}")
+                result = None
+            callback(result)
+            return False
+
+        future = self.__executor.submit(run)
+        future.add_done_callback(lambda f: GLib.idle_add(deliver, f))
+        return future
+
+
+ASSET_LOADER: AssetLoader = AssetLoader()
+
+
+class SvgRenderer:
+    """Rasterises the vector sources with librsvg.
+
+    Every SVG file is parsed once, then rendered straight at the requested
+    size times the scale factor of the monitor, which keeps the images sharp
+    on HiDPI screens. Without librsvg or the source files `render` returns
+    `None` and callers fall back to the prerendered images.
+    """
+
+    def __init__(self):
+        """
+        @brief      Create a renderer with no files loaded.
+
+        @param      None
+
+        @return     None
+        """
+        self.__handles: Dict[str, Rsvg.Handle] = {}
+        self.__pending: set = set()
+
+    @staticmethod
+    def _load(name: str) -> Rsvg.Handle:
+        """
+        @brief      Parse an SVG file, safe to call from any thread.
+
+        @param      name   SVG file name
+
+        @return     Rsvg.Handle or None
+        """
+        gfile = asset_file(name)
+        if Rsvg is None or not gfile:
+            return None
+        try:
+            return Rsvg.Handle.new_from_gfile_sync(
+                gfile,
+                Rsvg.HandleFlags.FLAGS_NONE,
+                None,
+            )
+        except GLib.Error as ex:
+            print(f"Could not load {name}: {ex.message}")
+        return None
+
+    def is_pending(self, name: str) -> bool:
+        """
+        @brief      Whether a file is being parsed in the background.
+
+        @param      name   SVG file name
+
+        @return     bool
+        """
+        return name in self.__pending
+
+    def load_async(self, name: str, callback: Callable = None):
+        """
+        @brief      Parse an SVG file in a worker thread.
+
+        @details    `callback` receives the handle (or `None`) from the main
+        loop. Until then `handle` returns `None` for this file.
+
+        @param      name       SVG file name
+
+        @param      callback   Optional callable receiving the handle
+
+        @return     None
+        """
+        if name in self.__handles or name in self.__pending:
+            return
+        self.__pending.add(name)
+
+        def done(handle: Rsvg.Handle):
+            self.__pending.discard(name)
+            self.__handles[name] = handle
+            if callback:
+                callback(handle)
+
+        ASSET_LOADER.submit(name, self._load, done, name)
+
+    def handle(self, name: str) -> Rsvg.Handle:
+        """
+        @brief      Get the parsed SVG document.
+
+        @details    Files which were not requested before are parsed right
+        away, files still being parsed in the background give `None`.
+
+        @param      name   SVG file name (i.e `image_src/layout-bh.svg`)
+
+        @return     Rsvg.Handle or None
+        """
+        if name in self.__handles:
+            return self.__handles[name]
+        if name in self.__pending:
+            return None
+        handle = self._load(name)
+        self.__handles[name] = handle
+        return handle
+
+    def render(
+        self,
+        name: str,
+        width: int,
+        height: int = -1,
+        scale: int = 1,
+    ) -> cairo.ImageSurface:
+        """
+        @brief      Render an SVG file at the given logical size.
+
+        @details    The image is stretched to fill the size. If `height` is
+        -1 it is calculated from `width` keeping the aspect ratio. The
+        returned surface has `scale` as device scale, so it is painted at
+        the logical size with full resolution.
+
+        @param      name     SVG file name
+
+        @param      width    Logical width
+
+        @param      height   Logical height or -1
+
+        @param      scale    Scale factor of the monitor
+
+        @return     cairo.ImageSurface or None
+        """
+        handle = self.handle(name)
+        if handle is None:
+            return None
+        try:
+            ok, svg_width, svg_height = handle.get_intrinsic_size_in_pixels()
+        except AttributeError:
+            # librsvg older than 2.52
+            dims = handle.get_dimensions()
+            ok, svg_width, svg_height = True, dims.width, dims.height
+        if not ok or svg_width <= 0 or svg_height <= 0:
+            return None
+        if height < 0:
+            height = max(1, round(width * svg_height / svg_width))
+
+        surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32,
+            width * scale,
+            height * scale,
+        )
+        context = cairo.Context(surface)
+        context.scale(width * scale / svg_width, height * scale / svg_height)
+        viewport = Rsvg.Rectangle()
+        viewport.x = 0
+        viewport.y = 0
+        viewport.width = svg_width
+        viewport.height = svg_height
+        try:
+            if hasattr(handle, "render_document"):
+                handle.render_document(context, viewport)
+            else:
+                # librsvg older than 2.46
+                handle.render_cairo(context)
+        except GLib.Error as ex:
+            print(f"Could not render {name}: {ex.message}")
+            return None
+        surface.set_device_scale(scale, scale)
+        return surface
+
+
+SVG_RENDERER: SvgRenderer = SvgRenderer()
+
+
+class ScaledSurfaceCache:
+    """Bounded LRU cache of layout images scaled to their drawing size.
+
+    Surfaces are keyed by layout, logical width and height and the scale
+    factor of the monitor, so resampling happens only when a button actually
+    changes its size. While the size keeps changing, as happens when the
+    window is resized, the last surface of the layout is handed out instead
+    of resampling on every frame.
+    """
+
+    MAX_SIZE: int = 16
+    SETTLE_MS: int = 100
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        """
+        @brief      Create an empty cache.
+
+        @param      max_size   Maximum number of kept surfaces
+
+        @return     None
+        """
+        self.__max_size = max_size
+        self.__surfaces: collections.OrderedDict = collections.OrderedDict()
+        # layout -> (key of the newest surface, creation time)
+        self.__latest: Dict[str, tuple] = {}
+        self.__redraws: Dict[str, int] = {}
+
+    def clear(self):
+        """
+        @brief      Drop all the cached surfaces and pending redraws.
+
+        @param      None
+
+        @return     None
+        """
+        self.__surfaces.clear()
+        self.__latest.clear()
+        for source_id in self.__redraws.values():
+            GLib.source_remove(source_id)
+        self.__redraws.clear()
+
+    def redraw_later(self, layout: str, widget: Gtk.Widget):
+        """
+        @brief      Redraw a widget once its size settled.
+
+        @details    At most one redraw per layout is pending at a time.
+
+        @param      layout   Layout button name
+
+        @param      widget   Gtk.Widget to redraw
+
+        @return     None
+        """
+        if layout in self.__redraws:
+            return
+
+        def redraw():
+            del self.__redraws[layout]
+            widget.queue_draw()
+            return False
+
+        self.__redraws[layout] = GLib.timeout_add(self.SETTLE_MS, redraw)
+
+    def get(
+        self,
+        layout: str,
+        width: int,
+        height: int,
+        scale: int,
+        window: Gdk.Window,
+    ) -> tuple:
+        """
+        @brief      Get the image of a layout scaled to the given size.
+
+        @details    Returns the surface together with the logical size it was
+        made for. That size differs from the requested one while the size
+        is still changing, the caller should then scale the surface when
+        painting and redraw a bit later. The surface is `None` if the image
+        is not loaded.
+
+        @param      layout   Layout button name
+
+        @param      width    Logical width
+
+        @param      height   Logical height
+
+        @param      scale    Scale factor of the monitor
+
+        @param      window   Gdk.Window the surface will be drawn to
+
+        @return     Tuple of cairo.Surface and (width, height)
+        """
+        key = (layout, width, height, scale)
+        surface = self.__surfaces.get(key)
+        if surface is not None:
+            self.__surfaces.move_to_end(key)
+            return surface, (width, height)
+
+        now = time.monotonic()
+        latest = self.__latest.get(layout)
+        if latest and latest[0] in self.__surfaces:
+            if now - latest[1] < self.SETTLE_MS / 1000 and latest[0][3] == scale:
+                return self.__surfaces[latest[0]], latest[0][1:3]
+
+        if width <= 0 or height <= 0:
+            return None, (width, height)
+        surface = SVG_RENDERER.render(LAYOUT_SVG_NAMES[layout], width, height, scale)
+        if surface is None:
+            pixbuf: GdkPixbuf.Pixbuf = LAYOUT_PIXBUFS.get(layout)
+            if pixbuf is None:
+                return None, (width, height)
+            scaled_pixbuf = pixbuf.scale_simple(
+                width * scale,
+                height * scale,
+                GdkPixbuf.InterpType.BILINEAR,
+            )
+            surface = Gdk.cairo_surface_create_from_pixbuf(
+                scaled_pixbuf,
+                scale,
+                window,
+            )
+        self.__surfaces[key] = surface
+        self.__latest[layout] = (key, now)
+        while len(self.__surfaces) > self.__max_size:
+            self.__surfaces.popitem(last=False)
+        return surface, (width, height)
+
+
+LAYOUT_SURFACES: ScaledSurfaceCache = ScaledSurfaceCache()
+
+
+def load_pixbufs():
+    """
+    @brief      Preload some pixel buffers into memory.
+
+    @details    Some images are needed to pre-load before the app starts. This
+    is where that operation takes place. For example the layout button images
+    are loaded in this function. As consequence this function should be called
+    before setting up the app or the ui itself. The images are loaded by
+    `ASSET_LOADER` in parallel while the ui is being built. Layout images which
+    can be rendered from their SVG source are only parsed, not decoded. Each
+    layout button stays blank until its image is ready and is redrawn then.
+
+    @param      None
+
+    @return     None
+    """
+
+    def redraw(layout: str):
+        image: Gtk.Widget = BUILDER.get_object(f"{layout}_img") if BUILDER else None
+        if image is not None:
+            image.queue_draw()
+
+    def on_pixbuf(layout: str, pixbuf: GdkPixbuf.Pixbuf):
+        LAYOUT_PIXBUFS[layout] = pixbuf
+        redraw(layout)
+
+    def on_svg(layout: str, handle: Rsvg.Handle):
+        if handle is not None:
+            # rendered from the vector source at the needed size
+            redraw(layout)
+            return
+        name = LAYOUT_IMAGE_NAMES[layout]
+        ASSET_LOADER.submit(
+            name,
+            load_pixbuf_asset,
+            functools.partial(on_pixbuf, layout),
+            name,
+        )
+
+    for layout in LAYOUT_IMAGE_NAMES:
+        SVG_RENDERER.load_async(
+            LAYOUT_SVG_NAMES[layout],
+            functools.partial(on_svg, layout),
+        )
+
+
+def find_theme_dir(name: str) -> str:
+    """
+    @brief      Find the directory of an installed GTK theme.
+
+    @param      name   Theme name
+
+    @return     str or None if the theme is not installed
+    """
+    for base in THEME_DIRS:
+        path = os.path.join(os.path.expanduser(base), name)
+        if os.path.isdir(os.path.join(path, "gtk-3.0")):
+            return path
+    return None
+
+
+class ThemeIndex:
+    """Index of the installed GTK, xfwm4 and icon themes.
+
+    For every directory in the theme and icon folders the index records
+    whether it has a `gtk-3.0` or `xfwm4` folder, or an `index.theme` file.
+    It is saved between runs together with the modification times of the
+    folders and directories. A refresh lists a folder again only if its
+    modification time changed, and looks into a directory only if its own
+    modification time changed, so refreshing takes a few `stat` calls per
+    installed theme.
+    """
+
+    VERSION: int = 1
+
+    def __init__(self, path: str = THEME_INDEX_PATH):
+        """
+        @brief      Create an empty index.
+
+        @param      path   File the index is saved to
+
+        @return     None
+        """
+        self.__path = os.path.expanduser(path)
+        self.__roots: Dict[str, dict] = {}
+        self.__loaded: bool = False
+        self.__changed: bool = False
+
+    @staticmethod
+    def _mtime(path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _probe(path: str, mtime: int) -> dict:
+        """
+        @brief      Look at what a theme directory provides.
+
+        @param      path    Theme directory
+
+        @param      mtime   Its modification time
+
+        @return     Dictionary describing the directory
+        """
+        return {
+            "mtime": mtime,
+            "gtk": os.path.isdir(os.path.join(path, "gtk-3.0")),
+            "xfwm4": os.path.isdir(os.path.join(path, "xfwm4")),
+            "icons": os.path.isfile(os.path.join(path, "index.theme")),
+        }
+
+    def _load(self):
+        """
+        @brief      Read the saved index, if any.
+
+        @param      None
+
+        @return     None
+        """
+        self.__loaded = True
+        try:
+            with open(self.__path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.VERSION:
+            self.__roots = data.get("roots", {})
+
+    def _refresh_root(self, root: str):
+        """
+        @brief      Bring the entries of one theme or icon folder up to date.
+
+        @param      root   Folder path, `~` expanded
+
+        @return     None
+        """
+        mtime = self._mtime(root)
+        known = self.__roots.get(root)
+        if mtime is None:
+            if known is not None:
+                del self.__roots[root]
+                self.__changed = True
+            return
+
+        entries: Dict[str, dict] = known["entries"] if known else {}
+        if known is None or known["mtime"] != mtime:
+            try:
+                names = os.listdir(root)
+            except OSError:
+                names = []
+            entries = {name: entries[name] for name in names if name in entries}
+            for name in names:
+                if name not in entries:
+                    entries[name] = None
+            self.__changed = True
+
+        for name, entry in list(entries.items()):
+            path = os.path.join(root, name)
+            entry_mtime = self._mtime(path)
+            if entry_mtime is None:
+                del entries[name]
+                self.__changed = True
+            elif entry is None or entry["mtime"] != entry_mtime:
+                entries[name] = self._probe(path, entry_mtime)
+                self.__changed = True
+        self.__roots[root] = {"mtime": mtime, "entries": entries}
+
+    def refresh(self):
+        """
+        @brief      Load the saved index and update it, saving any changes.
+
+        @param      None
+
+        @return     None
+        """
+        with trace_span("ThemeIndex.refresh"):
+            if not self.__loaded:
+                self._load()
+            roots = [os.path.expanduser(path) for path in THEME_DIRS + ICON_DIRS]
+            for root in roots:
+                self._refresh_root(root)
+            for root in list(self.__roots):
+                if root not in roots:
+                    del self.__roots[root]
+                    self.__changed = True
+            if self.__changed:
+                self._save()
+
+    def _save(self):
+        """
+        @brief      Write the index atomically.
+
+        @param      None
+
+        @return     None
+        """
+        data = json.dumps({"version": self.VERSION, "roots": self.__roots})
+        try:
+            write_file_atomic(self.__path, data)
+            self.__changed = False
+        except OSError as ex:
+            print(f"Could not save the theme index: {ex}")
+
+    def provides(self, name: str, feature: str) -> bool:
+        """
+        @brief      Whether an installed theme directory provides a feature.
+
+        @param      name      Theme directory name
+
+        @param      feature   `gtk`, `xfwm4` or `icons`
+
+        @return     bool
+        """
+        for root in self.__roots.values():
+            entry = root["entries"].get(name)
+            if entry and entry[feature]:
+                return True
+        return False
+
+    def missing(self, spec: dict) -> List[str]:
+        """
+        @brief      The parts of a catalog theme variant that are not installed.
+
+        @param      spec   Theme variant of the catalog
+
+        @return     List of descriptions, empty if everything is installed
+        """
+        missing: List[str] = []
+        if not self.provides(spec["gtk_theme"], "gtk"):
+            missing.append(f"GTK theme {spec['gtk_theme']}")
+        if not self.provides(spec["wm_theme"], "xfwm4"):
+            missing.append(f"window manager theme {spec['wm_theme']}")
+        if not self.provides(spec["icon_theme"], "icons"):
+            missing.append(f"icon theme {spec['icon_theme']}")
+        return missing
+
+
+THEME_INDEX: ThemeIndex = ThemeIndex()
+
+
+class ThemeThumbnails:
+    """Previews of GTK themes, rendered offscreen and cached on disk.
+
+    A small sample of widgets is put in a `Gtk.OffscreenWindow` and styled
+    with the `Gtk.CssProvider` of the theme, without touching the theme of
+    the application itself. Renders are queued and run one at a time from
+    low priority idle callbacks. The results are saved as PNG files named
+    after the theme and the modification time of its directory, so later
+    runs just decode the files in a worker thread.
+    """
+
+    SAMPLE_WIDTH: int = 240
+    SAMPLE_HEIGHT: int = 150
+
+    def __init__(self, cache_dir: str = THUMBNAIL_CACHE_DIR):
+        """
+        @brief      Create the thumbnail store, nothing is loaded yet.
+
+        @param      cache_dir   Directory of the cached PNG files
+
+        @return     None
+        """
+        self.__cache_dir = os.path.expanduser(cache_dir)
+        self.__thumbnails: Dict[str, GdkPixbuf.Pixbuf] = {}
+        self.__callbacks: Dict[str, List[Callable]] = {}
+        self.__queue: List[str] = []
+        self.__rendering: bool = False
+
+    def cache_path(self, theme: str) -> str:
+        """
+        @brief      Path of the cached thumbnail of a theme.
+
+        @param      theme   GTK theme name
+
+        @return     str or None if the theme is not installed
+        """
+        theme_dir = find_theme_dir(theme)
+        if theme_dir is None:
+            return None
+        mtime = os.stat(theme_dir).st_mtime_ns
+        return os.path.join(self.__cache_dir, f"{theme}-{mtime}.png")
+
+    def request(self, theme: str, callback: Callable):
+        """
+        @brief      Get the thumbnail of a theme.
+
+        @details    `callback` is called from the main loop with the
+        thumbnail, or with `None` if the theme is not installed or could
+        not be rendered.
+
+        @param      theme      GTK theme name
+
+        @param      callback   Callable receiving a GdkPixbuf.Pixbuf
+
+        @return     None
+        """
+        if theme in self.__thumbnails:
+            callback(self.__thumbnails[theme])
+            return
+        if theme in self.__callbacks:
+            self.__callbacks[theme].append(callback)
+            return
+        self.__callbacks[theme] = [callback]
+
+        path = self.cache_path(theme)
+        if path is None:
+            GLib.idle_add(self._deliver, theme, None)
+        elif os.path.exists(path):
+            ASSET_LOADER.submit(
+                path,
+                GdkPixbuf.Pixbuf.new_from_file,
+                functools.partial(self._deliver, theme),
+                path,
+            )
+        else:
+            self.__queue.append(theme)
+            if not self.__rendering:
+                self.__rendering = True
+                GLib.idle_add(self._render_next, priority=GLib.PRIORITY_LOW)
+
+    def _deliver(self, theme: str, pixbuf: GdkPixbuf.Pixbuf):
+        if pixbuf is not None:
+            self.__thumbnails[theme] = pixbuf
+        for callback in self.__callbacks.pop(theme, []):
+            callback(pixbuf)
+        return False
+
+    @staticmethod
+    def _sample() -> Gtk.Widget:
+        """
+        @brief      Build the widgets shown in a thumbnail.
+
+        @param      None
+
+        @return     Gtk.Widget
+        """
+        headerbar = Gtk.HeaderBar(title="Theme", show_close_button=True)
+        vbox = Gtk.VBox(spacing=6, border_width=8)
+        entry = Gtk.Entry(text="Text")
+        vbox.pack_start(entry, False, False, 0)
+        hbox = Gtk.HBox(spacing=6)
+        hbox.pack_start(Gtk.CheckButton(label="Check", active=True), False, False, 0)
+        hbox.pack_end(Gtk.Button(label="Button"), False, False, 0)
+        vbox.pack_start(hbox, False, False, 0)
+        vbox.pack_start(Gtk.ProgressBar(fraction=0.6), False, False, 0)
+        frame = Gtk.VBox()
+        frame.get_style_context().add_class("background")
+        frame.pack_start(headerbar, False, False, 0)
+        frame.pack_start(vbox, True, True, 0)
+        return frame
+
+    @staticmethod
+    def _style(widget: Gtk.Widget, provider: Gtk.CssProvider):
+        """
+        @brief      Add a style provider to a widget and all its children.
+
+        @param      widget     Gtk.Widget
+
+        @param      provider   Gtk.CssProvider
+
+        @return     None
+        """
+        widget.get_style_context().add_provider(
+            provider,
+            Gtk.STYLE_PROVIDER_PRIORITY_USER,
+        )
+        if isinstance(widget, Gtk.Container):
+            widget.forall(ThemeThumbnails._style, provider)
+
+    def _render_next(self) -> bool:
+        """
+        @brief      Render the next queued theme.
+
+        @details    The offscreen window is captured after it was drawn,
+        then the next render is queued.
+
+        @param      None
+
+        @return     False, to remove the idle callback
+        """
+        if not self.__queue:
+            self.__rendering = False
+            return False
+        theme = self.__queue.pop(0)
+        start = TRACER.now() if TRACER else 0
+
+        provider = Gtk.CssProvider.get_named(theme, None)
+        window = Gtk.OffscreenWindow()
+        window.set_size_request(self.SAMPLE_WIDTH, self.SAMPLE_HEIGHT)
+        window.add(self._sample())
+        self._style(window, provider)
+
+        def capture() -> bool:
+            pixbuf = window.get_pixbuf()
+            window.destroy()
+            if pixbuf is not None:
+                height = round(
+                    pixbuf.get_height() * THUMBNAIL_WIDTH / pixbuf.get_width()
+                )
+                pixbuf = pixbuf.scale_simple(
+                    THUMBNAIL_WIDTH,
+                    height,
+                    GdkPixbuf.InterpType.BILINEAR,
+                )
+                self._save(theme, pixbuf)
+            if TRACER:
+                TRACER.complete(f"render thumbnail {theme}", start)
+            self._deliver(theme, pixbuf)
+            GLib.idle_add(self._render_next, priority=GLib.PRIORITY_LOW)
+            return False
+
+        def on_draw(*args):
+            if not handled:
+                handled.append(True)
+                GLib.idle_add(capture, priority=GLib.PRIORITY_LOW)
+            return False
+
+        handled: List[bool] = []
+        window.connect_after("draw", on_draw)
+        window.show_all()
+        return False
+
+    def _save(self, theme: str, pixbuf: GdkPixbuf.Pixbuf):
+        """
+        @brief      Write a thumbnail to the cache, replacing older ones.
+
+        @param      theme    GTK theme name
+
+        @param      pixbuf   GdkPixbuf.Pixbuf
+
+        @return     None
+        """
+        path = self.cache_path(theme)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            for name in os.listdir(self.__cache_dir):
+                if name.rpartition("-")[0] == theme:
+                    os.unlink(os.path.join(self.__cache_dir, name))
+            _, data = pixbuf.save_to_bufferv("png", [], [])
+            write_file_atomic(path, data)
+        except (OSError, GLib.Error) as ex:
+            print(f"Could not cache the thumbnail of {theme}: {ex}")
+
+
+THEME_THUMBNAILS: ThemeThumbnails = ThemeThumbnails()
+
+
+CATALOG_NAME: str = "catalog.json"
+
+
+class Catalog:
+    """The themes and layouts on offer, described in `catalog.json`.
+
+    The file is read on first use and indexed by name. Commands are built
+    only for the entries that are actually looked up, so the size of the
+    catalog does not matter for building the pages or applying a choice.
+
+    Every theme has a name, a label and `light`/`dark` or `default`
+    variants naming a GTK theme, icon theme, xfwm4 theme and panel size.
+    Every layout gives the panel position and mode.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        @brief      Create a not yet loaded catalog.
+
+        @param      path   Catalog file, looked up with `resolve_path` if
+        not given
+
+        @return     None
+        """
+        self.__path = path
+        self.__themes: Dict[str, dict] = None
+        self.__layouts: Dict[str, dict] = None
+
+    def _load(self):
+        """
+        @brief      Read and index the catalog file.
+
+        @details    A missing or broken catalog results in an empty one.
+
+        @param      None
+
+        @return     None
+        """
+        if self.__themes is not None:
+            return
+        path = self.__path or resolve_path(CATALOG_NAME)
+        data = {}
+        with trace_span("Catalog._load"):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (TypeError, OSError, ValueError) as ex:
+                print(f"Could not read the catalog {path}: {ex}")
+        self.__themes = {entry["name"]: entry for entry in data.get("themes", [])}
+        self.__layouts = dict(data.get("layouts", {}))
+
+    def themes(self) -> Dict[str, dict]:
+        """
+        @brief      Theme entries by name, in catalog order.
+
+        @param      None
+
+        @return     Dictionary of theme name and entry
+        """
+        self._load()
+        return self.__themes
+
+    def layouts(self) -> Dict[str, dict]:
+        """
+        @brief      Layout entries by name, in catalog order.
+
+        @param      None
+
+        @return     Dictionary of layout name and entry
+        """
+        self._load()
+        return self.__layouts
+
+    @staticmethod
+    def theme_commands(entry: dict) -> Dict[str, List[BaseCommand]]:
+        """
+        @brief      Build the setup commands of every variant of a theme.
+
+        @details    Besides xsettings, every variant also writes its theme
+        and icon theme to qt5ct and the GTK 2 and 3 settings files.
+
+        @param      entry   Theme entry
+
+        @return     Dictionary of variant name and list of commands
+        """
+        variants: Dict[str, List[BaseCommand]] = {}
+        for variant, spec in entry["variants"].items():
+            gtk_theme = spec["gtk_theme"]
+            icon_theme = spec["icon_theme"]
+            variants[variant] = [
+                XfceCommand("-c", "xsettings", "-p", "/Net/ThemeName", "-s", gtk_theme),
+                XfceCommand(
+                    "-c", "xsettings", "-p", "/Net/IconThemeName", "-s", icon_theme
+                ),
+                XfceCommand(
+                    "-c", "xfwm4", "-p", "/general/theme", "-s", spec["wm_theme"]
+                ),
+                XfceCommand(
+                    "-c",
+                    "xfce4-panel",
+                    "-p",
+                    "/panels/panel-1/size",
+                    "-s",
+                    str(spec["panel_size"]),
+                ),
+                Qt5IconChangeCommand(icon_theme),
+                *gtk_settings_commands(gtk_theme, icon_theme),
+            ]
+        return variants
+
+    @staticmethod
+    def layout_commands(entry: dict, panel_id: int = None) -> List[BaseCommand]:
+        """
+        @brief      Build the setup commands of a layout.
+
+        @param      entry      Layout entry
+
+        @param      panel_id   Panel to move, the one of the running session
+        if not given
+
+        @return     List of commands
+        """
+        panel = get_panel_id() if panel_id is None else panel_id
+        return [
+            XfceCommand(
+                "-c",
+                "xfce4-panel",
+                "-p",
+                f"/panels/panel-{panel}/position",
+                "-s",
+                entry["position"],
+            ),
+            XfceCommand(
+                "-c",
+                "xfce4-panel",
+                "-p",
+                f"/panels/panel-{panel}/mode",
+                "-s",
+                str(entry["mode"]),
+            ),
+        ]
+
+    def sample_commands(self) -> List[BaseCommand]:
+        """
+        @brief      Commands of the first theme and the first layout.
+
+        @details    The themes all set the same settings, only to different
+        values, and so do the layouts. These commands tell which settings
+        the catalog touches without building the commands of every entry.
+
+        @param      None
+
+        @return     List of BaseCommand
+        """
+        commands: List[BaseCommand] = []
+        theme = next(iter(self.themes().values()), None)
+        if theme:
+            for variant_commands in self.theme_commands(theme).values():
+                commands.extend(variant_commands)
+        layout = next(iter(self.layouts().values()), None)
+        if layout:
+            commands.extend(self.layout_commands(layout))
+        return commands
+
+
+CATALOG: Catalog = Catalog()
+
+
+class CatalogSection(collections.abc.Mapping):
+    """Read-only dictionary of catalog entries, built one entry at a time.
+
+    Looking up a name goes through the index of the catalog and only builds
+    the value of that entry, which is then kept.
+    """
+
+    def __init__(self, entries: Callable[[], Dict], build: Callable[[dict], object]):
+        """
+        @brief      Create the section.
+
+        @param      entries   Callable returning the entries by name
+
+        @param      build     Callable building the value of an entry
+
+        @return     None
+        """
+        self.__entries = entries
+        self.__build = build
+        self.__built: Dict = {}
+
+    def __getitem__(self, key):
+        if key not in self.__built:
+            self.__built[key] = self.__build(self.__entries()[key])
+        return self.__built[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.__entries()
+
+    def __iter__(self):
+        return iter(self.__entries())
+
+    def __len__(self) -> int:
+        return len(self.__entries())
+
+    def reset(self):
+        """
+        @brief      Forget the built values, they are rebuilt on next access.
+
+        @param      None
+
+        @return     None
+        """
+        self.__built.clear()
+
+
+"""
+Layout configurations along with setup commands.
+"""
+LAYOUT_COMMANDS: Mapping[str, List[BaseCommand]] = CatalogSection(
+    CATALOG.layouts, Catalog.layout_commands
+)
+
+"""
+Theme configurations along with variants and setup commands.
+"""
+THEME_COLLECTION: Mapping[str, Dict[str, List[BaseCommand]]] = CatalogSection(
+    CATALOG.themes, Catalog.theme_commands
+)
+
+
+def parse_xfconf_listing(lines: List[str]) -> Dict[str, str]:
+    """
+    @brief      Parse the output of `xfconf-query -l -v`.
+
+    @param      lines    Output lines
+
+    @return     Dictionary of property path and value as string
+    """
+    values: Dict[str, str] = {}
+    for line in lines:
+        parts = line.split(None, 1)
+        if parts and parts[0].startswith("/"):
+            values[parts[0]] = parts[1] if len(parts) > 1 else ""
+    return values
+
+
+def read_xfconf_channel(channel: str) -> Dict[str, str]:
+    """
+    @brief      Read all the properties of an xfconf channel at once.
+
+    @param      channel  Channel name
+
+    @return     Dictionary of property path and value as string
+    """
+    cmd = XfceCommand("-c", channel, "-l", "-v", check=False)
+    return parse_xfconf_listing(cmd.execute())
+
+
+def read_conf_file(path: str) -> Dict[str, str]:
+    """
+    @brief      Read the `key=value` lines of a config file.
+
+    @details    Missing or unreadable files result in an empty dictionary.
+
+    @param      path     File path, `~` is expanded
+
+    @return     Dictionary of key and value
+    """
+    return get_conf_file(path).values()
+
+
+class StatePlanner:
+    """Plans which commands actually need to run.
+
+    The current values of the settings touched by the commands are read once
+    per xfconf channel or config file and remembered afterwards. Commands
+    whose target value is already set are left out of the plan, which saves
+    the write itself and the theme reload of every xsettings client.
+    """
+
+    def __init__(self, dry_run: bool = False):
+        """
+        @brief      Create a planner with nothing read yet.
+
+        @param      dry_run   Only print the plans, nothing will be run
+
+        @return     None
+        """
+        self.dry_run = dry_run
+        self.__values: Dict[tuple, str] = {}
+        self.__loaded: set = set()
+
+    def _load(self, key: tuple):
+        """
+        @brief      Read the channel or file a setting key belongs to.
+
+        @param      key   Setting key as returned by `BaseCommand.target`
+
+        @return     None
+        """
+        source = key[:2]
+        if source in self.__loaded:
+            return
+        if key[0] == "xfconf":
+            values = read_xfconf_channel(key[1])
+        else:
+            values = read_conf_file(key[1])
+        self._store(source, values)
+
+    def _store(self, source: tuple, values: Dict[str, str]):
+        """
+        @brief      Remember the values read from a channel or file.
+
+        @details    Values remembered by `update` meanwhile are kept, they
+        are newer.
+
+        @param      source   `("xfconf", channel)` or `("file", path)`
+
+        @param      values   Dictionary of property or key and value
+
+        @return     None
+        """
+        if source in self.__loaded:
+            return
+        self.__loaded.add(source)
+        for name, value in values.items():
+            self.__values.setdefault((*source, name), value)
+
+    @staticmethod
+    def sources(commands: Iterable[BaseCommand]) -> set:
+        """
+        @brief      The channels and files the commands change settings of.
+
+        @param      commands   BaseCommand objects
+
+        @return     Set of `("xfconf", channel)` and `("file", path)` tuples
+        """
+        return {key[:2] for cmd in commands for key, _ in cmd.targets()}
+
+    def prefetch(self, sources: Iterable[tuple], callback: Callable = None):
+        """
+        @brief      Read channels and files without blocking the main loop.
+
+        @details    Channels are listed with asynchronous commands, files
+        are read by the `ASSET_LOADER` threads. `callback` is called from
+        the main loop once all of them are known, right away if they are
+        already.
+
+        @param      sources    `("xfconf", channel)` or `("file", path)`
+        tuples
+
+        @param      callback   Optional callable without arguments
+
+        @return     None
+        """
+        pending = [source for source in set(sources) if source not in self.__loaded]
+
+        def on_done(source: tuple, values: Dict[str, str]):
+            self._store(source, values or {})
+            pending.remove(source)
+            if not pending and callback:
+                callback()
+
+        if not pending:
+            if callback:
+                callback()
+            return
+        for source in list(pending):
+            if source[0] == "xfconf":
+                cmd = XfceCommand("-c", source[1], "-l", "-v", check=False)
+                cmd.execute_async(
+                    lambda lines, source=source: on_done(
+                        source, parse_xfconf_listing(lines)
+                    )
+                )
+            else:
+                ASSET_LOADER.submit(
+                    source[1],
+                    read_conf_file,
+                    functools.partial(on_done, source),
+                    source[1],
+                )
+
+    def seed(self, source: tuple, values: Dict[str, str]):
+        """
+        @brief      Take the values of a channel or file that were just read.
+
+        @details    Saves reading it again when the values were fetched
+        anyway, i.e. asynchronously.
+
+        @param      source   `("xfconf", channel)` or `("file", path)`
+
+        @param      values   Dictionary of property or key and value
+
+        @return     None
+        """
+        self.__loaded.add(source)
+        for name, value in values.items():
+            self.__values[(*source, name)] = value
+
+    def current(self, key: tuple) -> str:
+        """
+        @brief      Current value of a setting.
+
+        @param      key   Setting key as returned by `BaseCommand.target`
+
+        @return     str or None if the setting does not exist
+        """
+        self._load(key)
+        return self.__values.get(key)
+
+    def plan(self, commands: List[BaseCommand]) -> List[BaseCommand]:
+        """
+        @brief      Filter out the commands which would change nothing.
+
+        @details    If the same setting is set several times only the last
+        command is kept. Edits of the same config file are merged so that it
+        is written once. In dry-run mode the plan is printed.
+
+        @param      commands   List of BaseCommand
+
+        @return     List of BaseCommand to run
+        """
+        last: Dict[tuple, BaseCommand] = {}
+        for cmd in commands:
+            target = cmd.target()
+            if target:
+                last[target[0]] = cmd
+
+        planned: List[BaseCommand] = []
+        lines: List[str] = []
+        for cmd in commands:
+            target = cmd.target()
+            if target is None:
+                planned.append(cmd)
+                lines.append(f"  run   {cmd}")
+                continue
+            key, value = target
+            if last[key] is not cmd:
+                lines.append(f"  skip  {cmd} (overridden)")
+            elif self.current(key) == value:
+                lines.append(f"  skip  {cmd} (already set)")
+            else:
+                planned.append(cmd)
+                lines.append(f"  run   {cmd}")
+
+        print(f"Plan: {len(planned)} of {len(commands)} commands need to run")
+        if self.dry_run:
+            print("\n".join(lines))
+        return ConfFileCommand.merge(planned)
+
+    def plan_async(self, commands: List[BaseCommand], callback: Callable):
+        """
+        @brief      Plan once the current values are read, without blocking.
+
+        @param      commands   List of BaseCommand
+
+        @param      callback   Called from the main loop with the result of
+        `plan`
+
+        @return     None
+        """
+        self.prefetch(self.sources(commands), lambda: callback(self.plan(commands)))
+
+    def update(self, cmd: BaseCommand):
+        """
+        @brief      Remember the value set by a command that was run.
+
+        @details    Nothing is read, values loaded later do not replace the
+        remembered ones.
+
+        @param      cmd   BaseCommand
+
+        @return     None
+        """
+        for key, value in cmd.targets():
+            self.__values[key] = value
+
+
+STATE_PLANNER: StatePlanner = StatePlanner()
+
+
+class SettingsSnapshot:
+    """The settings changed by the themes and layouts, as found at startup.
+
+    Themes are applied as soon as they are chosen, which makes choosing one
+    a preview. The snapshot allows going back to what the user had before,
+    with one write per xfconf channel or config file. Settings which did not
+    exist when the snapshot was taken are left alone.
+    """
+
+    def __init__(self):
+        """
+        @brief      Create an empty snapshot.
+
+        @param      None
+
+        @return     None
+        """
+        self.__values: Dict[tuple, str] = None
+        self.__formats: Dict[tuple, tuple] = {}
+        self.__waiters: List[Callable] = None
+
+    @property
+    def taken(self) -> bool:
+        """Whether the snapshot was taken already."""
+        return self.__values is not None
+
+    def take(self, callback: Callable = None):
+        """
+        @brief      Remember the current value of every setting.
+
+        @details    The settings are those of `Catalog.sample_commands`. Their
+        channels and files are read by `STATE_PLANNER.prefetch`, so the
+        main loop is not blocked. `callback` is called from the main loop
+        once the snapshot is taken, right away if it already is.
+
+        @param      callback   Optional callable without arguments
+
+        @return     None
+        """
+        if self.taken:
+            if callback:
+                callback()
+            return
+        if self.__waiters is not None:
+            # already being taken
+            if callback:
+                self.__waiters.append(callback)
+            return
+        self.__waiters = [callback] if callback else []
+        commands = CATALOG.sample_commands()
+        STATE_PLANNER.prefetch(
+            StatePlanner.sources(commands), lambda: self._record(commands)
+        )
+
+    def _record(self, commands: List[BaseCommand]):
+        """
+        @brief      Take the values of the settings, once they are read.
+
+        @param      commands   Commands telling the settings
+
+        @return     None
+        """
+        with trace_span("SettingsSnapshot.take"):
+            values: Dict[tuple, str] = {}
+            for cmd in commands:
+                if isinstance(cmd, ConfFileCommand):
+                    for section, key, _ in cmd.edits:
+                        self.__formats[("file", cmd.path, key)] = (section, cmd.quote)
+                for key, _ in cmd.targets():
+                    if key not in values:
+                        values[key] = STATE_PLANNER.current(key)
+            self.__values = values
+        print(f"Snapshot of {len(values)} settings taken")
+        waiters = self.__waiters
+        self.__waiters = None
+        for callback in waiters:
+            callback()
+
+    def value(self, key: tuple) -> str:
+        """
+        @brief      Value a setting had when the snapshot was taken.
+
+        @param      key   Setting key as returned by `BaseCommand.target`
+
+        @return     str or None if unknown
+        """
+        return self.__values.get(key) if self.taken else None
+
+    def theme(self) -> tuple:
+        """
+        @brief      The catalog theme that was set when the snapshot was taken.
+
+        @details    The theme is recognized by its GTK theme.
+
+        @param      None
+
+        @return     Tuple of theme and variant name, or `None` if the GTK
+        theme is none of the catalog
+        """
+        gtk_theme = self.value(("xfconf", "xsettings", "/Net/ThemeName"))
+        if gtk_theme is None:
+            return None
+        for name, entry in CATALOG.themes().items():
+            for variant, spec in entry["variants"].items():
+                if spec["gtk_theme"] == gtk_theme:
+                    return name, variant
+        return None
+
+    def restore_commands(self) -> List[BaseCommand]:
+        """
+        @brief      Commands setting back the values that changed since.
+
+        @param      None
+
+        @return     List of BaseCommand, one per xfconf channel or file
+        """
+        if not self.taken:
+            return []
+        channels: Dict[str, Dict[str, str]] = {}
+        files: Dict[str, List[tuple]] = {}
+        quotes: Dict[str, bool] = {}
+        for key, value in self.__values.items():
+            if value is None or STATE_PLANNER.current(key) == value:
+                continue
+            if key[0] == "xfconf":
+                channels.setdefault(key[1], {})[key[2]] = value
+            else:
+                section, quote = self.__formats[key]
+                files.setdefault(key[1], []).append((section, key[2], value))
+                quotes[key[1]] = quote
+
+        commands: List[BaseCommand] = []
+        for channel, values in channels.items():
+            commands.append(XfconfBatchCommand(channel, values))
+        for path, edits in files.items():
+            commands.append(ConfFileCommand(path, edits, quotes[path]))
+        return commands
+
+
+SNAPSHOT: SettingsSnapshot = SettingsSnapshot()
+
+
+class ApplyScheduler:
+    """Coalesces theme and layout changes into as few commands as possible.
+
+    Requests only update the wanted (theme, variant, layout) state and
+    (re)start a short debounce timer. When the timer fires, the commands
+    needed to get from the last applied state to the wanted one are run in
+    the background. If the wanted state changes while they are still
+    running, the remaining commands are dropped and the latest state is
+    applied instead. Commands which were requested but never run are counted
+    in `skipped`.
+    """
+
+    DEBOUNCE_MS: int = 150
+
+    def __init__(self, delay: int = DEBOUNCE_MS):
+        """
+        @brief      Create an idle scheduler.
+
+        @param      delay   Debounce delay in milliseconds
+
+        @return     None
+        """
+        self.__delay = delay
+        self.__wanted: Dict[str, str] = {}
+        self.__applied: Dict[str, str] = {}
+        self.__timeout_id: int = 0
+        self.__generation: int = 0
+        self.__running: bool = False
+        self.__revert: List[BaseCommand] = None
+        self.requested: int = 0
+        self.executed: int = 0
+
+    @property
+    def skipped(self) -> int:
+        """Number of requested commands that did not need to run."""
+        return self.requested - self.executed
+
+    def request(self, theme: str = None, variant: str = None, layout: str = None):
+        """
+        @brief      Ask for a theme and/or layout to be applied.
+
+        @param      theme     Theme name in THEME_COLLECTION
+
+        @param      variant   Variant name of the theme
+
+        @param      layout    Layout name in LAYOUT_COMMANDS
+
+        @return     None
+        """
+        if theme:
+            self.__wanted["theme"] = theme
+            self.__wanted["variant"] = variant
+            self.requested += len(THEME_COLLECTION[theme][variant])
+        if layout:
+            self.__wanted["layout"] = layout
+            self.requested += len(LAYOUT_COMMANDS[layout])
+
+        if self.__timeout_id:
+            GLib.source_remove(self.__timeout_id)
+        self.__timeout_id = GLib.timeout_add(self.__delay, self._flush)
+
+    def revert(self):
+        """
+        @brief      Go back to the settings of the `SNAPSHOT`.
+
+        @details    Pending and running changes are dropped, the snapshot is
+        restored as soon as no command is running anymore.
+
+        @param      None
+
+        @return     None
+        """
+        if self.__timeout_id:
+            GLib.source_remove(self.__timeout_id)
+            self.__timeout_id = 0
+        self.__wanted.clear()
+        self.__revert = SNAPSHOT.restore_commands()
+        # counted like `_run` counts them, one per setting
+        self.requested += sum(max(1, len(cmd.targets())) for cmd in self.__revert)
+        self.__generation += 1
+        if not self.__running:
+            self._start()
+
+    def _commands(self) -> tuple:
+        """
+        @brief      Commands that lead from the applied to the wanted state.
+
+        @param      None
+
+        @return     Tuple of the command list and the changed state keys
+        """
+        commands: List[BaseCommand] = []
+        keys: List[str] = []
+        wanted = self.__wanted
+        applied = self.__applied
+        if "theme" in wanted and (
+            wanted["theme"] != applied.get("theme")
+            or wanted["variant"] != applied.get("variant")
+        ):
+            commands.extend(THEME_COLLECTION[wanted["theme"]][wanted["variant"]])
+            keys.extend(["theme", "variant"])
+        if "layout" in wanted and wanted["layout"] != applied.get("layout"):
+            commands.extend(LAYOUT_COMMANDS[wanted["layout"]])
+            keys.append("layout")
+        return commands, keys
+
+    def _flush(self) -> bool:
+        """
+        @brief      Debounce timer callback.
+
+        @param      None
+
+        @return     False, to remove the timer
+        """
+        self.__timeout_id = 0
+        self.__generation += 1
+        if not self.__running:
+            self._start()
+        return False
+
+    def _start(self):
+        """
+        @brief      Start applying the wanted state.
+
+        @param      None
+
+        @return     None
+        """
+        # nothing else may start while the current values are read
+        self.__running = True
+        SNAPSHOT.take(self._plan)
+
+    def _plan(self):
+        """
+        @brief      Plan the commands leading to the wanted state.
+
+        @details    Called once the snapshot was taken, before anything is
+        changed.
+
+        @param      None
+
+        @return     None
+        """
+        generation = self.__generation
+        state = dict(self.__wanted)
+        if self.__revert is not None:
+            commands, keys = self.__revert, list(self.__applied)
+            self.__revert = None
+        else:
+            commands, keys = self._commands()
+        STATE_PLANNER.plan_async(
+            commands,
+            lambda pending: self._run(generation, state, keys, pending),
+        )
+
+    def _run(self, generation: int, state: Dict, keys: List[str], pending: List):
+        """
+        @brief      Run the planned commands one after another.
+
+        @param      generation   Generation of the wanted state when started
+
+        @param      state        The wanted state when started
+
+        @param      keys         State keys changed by the commands
+
+        @param      pending      Planned commands
+
+        @return     None
+        """
+        if not pending or STATE_PLANNER.dry_run:
+            self.__running = False
+            if generation != self.__generation:
+                self._start()
+                return
+            self._report()
+            return
+
+        # the changed parts are unknown until all their commands ran
+        for key in keys:
+            self.__applied.pop(key, None)
+        set_busy(True)
+
+        current: List[BaseCommand] = []
+
+        def run_next(*args):
+            if current:
+                STATE_PLANNER.update(current.pop())
+            if generation != self.__generation:
+                print(f"Dropping {len(pending)} superseded commands")
+                self.__running = False
+                set_busy(False)
+                self._start()
+                return
+            if not pending:
+                self.__applied.update(state)
+                self.__running = False
+                set_busy(False)
+                self._report()
+                return
+            self.executed += max(1, len(pending[0].targets()))
+            current.append(pending.pop(0))
+            current[0].execute_async(run_next)
+
+        run_next()
+
+    def _report(self):
+        """
+        @brief      Print how many commands were coalesced away.
+
+        @param      None
+
+        @return     None
+        """
+        print(
+            f"Applied {self.__wanted}, ran {self.executed} of "
+            + f"{self.requested} requested commands ({self.skipped} skipped)"
+        )
+
+
+APPLY_SCHEDULER: ApplyScheduler = ApplyScheduler()
 
 
 def on_window_destroy(window: Gtk.Widget, *args):
@@ -786,8 +5121,10 @@ def on_right_nav_btn_clicked(btn: Gtk.Widget, *args):
     """
     name: str = STACK.get_visible_child_name()
     if name == LAYOUT_PAGE_NAME:
+        ensure_page(THEME_PAGE_NAME)
         STACK.set_visible_child_name(THEME_PAGE_NAME)
     elif name == THEME_PAGE_NAME:
+        ensure_page(WELCOME_PAGE_NAME)
         STACK.set_visible_child_name(WELCOME_PAGE_NAME)
 
 
@@ -824,310 +5161,1066 @@ def on_page_map(page: Gtk.Widget, *args):
         headerbar.props.title = "Enjoy Archlinux"
 
 
-def on_layout_bh_btn_img_draw(
+def on_layout_btn_img_draw(
     image: Gtk.DrawingArea,
     context: cairo.Context,
     *args,
 ):
     """
-    @brief      Updates the image size along with the change of button size.
+    @brief      Updates the image size along with the change of button size.
+
+    @details    Whenever the corresponding layout button is resized this
+    function is called to allow us resize and redraw the buttion's image.
+    The drawing area must be named after its button with an `_img` suffix
+    (i.e `layout_bh_btn_img`). Scaled images come from `LAYOUT_SURFACES`,
+    so redrawing at an unchanged size does not resample anything.
+
+    @param      image    Gtk.DrawingArea
+
+    @param      context  Cairo drawing context associated with the button
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    widget_id: str = Gtk.Buildable.get_name(image)
+    if TRACER:
+        TRACER.instant(f"first draw of {widget_id}", once=True)
+    layout: str = widget_id[: -len("_img")]
+    size, _ = image.get_allocated_size()
+    # print(f"w={size.width}, h={size.height}")
+    settled = paint_layout(
+        context,
+        layout,
+        size.width,
+        size.height,
+        image.get_scale_factor(),
+        image.get_window(),
+    )
+    if not settled:
+        LAYOUT_SURFACES.redraw_later(layout, image)
+
+
+def paint_layout(
+    context: cairo.Context,
+    layout: str,
+    width: int,
+    height: int,
+    scale: int = 1,
+    window: Gdk.Window = None,
+) -> bool:
+    """
+    @brief      Paint the image of a layout at the given size.
+
+    @details    While the size is still changing the last image is
+    stretched, the caller should then draw again once the size settled.
+
+    @param      context  Cairo drawing context
+
+    @param      layout   Layout button name
+
+    @param      width    Logical width
+
+    @param      height   Logical height
+
+    @param      scale    Scale factor of the monitor
+
+    @param      window   Gdk.Window drawn to, if any
+
+    @return     False if the image needs to be drawn again
+    """
+    surface, surface_size = LAYOUT_SURFACES.get(layout, width, height, scale, window)
+    if surface is None:
+        return True
+    settled = surface_size == (width, height)
+    if not settled:
+        # still resizing, stretch the last image and draw sharp once the
+        # size settled
+        context.scale(width / surface_size[0], height / surface_size[1])
+    context.set_source_surface(surface, 0, 0)
+    context.paint()
+    return settled
+
+
+def on_layout_btn_clicked(button: Gtk.Button, *args):
+    """
+    @brief      Change desktop layout on layout button click.
+
+    @details    In the layout regarding button must be named
+    after the target layout name int LAYOUT_COMMANDS dictionary.
+
+    @param      button   Gtk.Button button widget that recieved
+    clicked event.
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    name: str = button.get_name()
+    print("Layout Name: ", name)
+    if name not in LAYOUT_COMMANDS:
+        print("Layout not found")
+        return
+    APPLY_SCHEDULER.request(layout=name)
+
+
+def get_theme_variant(theme: str, dark: bool = False) -> str:
+    """
+    @brief      Determine which variant of a theme to apply.
+
+    @details    If the requested variant is available then that variant is
+    returned else the default variant of the theme.
+
+    @param      theme     str   theme name
+
+    @param      dark      bool  theme variant flag
+
+    @return     str  variant name (i.e `light`, `dark` or `default`)
+    """
+    theme_dict: Dict[str, List[BaseCommand]] = THEME_COLLECTION[theme]
+    variant = "dark" if dark else "light"
+    if variant in theme_dict:
+        print(f"{variant.capitalize()} variant is selected")
+        return variant
+    print("Default variant is selected")
+    return "default"
+
+
+def apply_theme(theme: str = None, dark: bool = False):
+    """
+    @brief      Function to apply a global theme.
+
+    @details    This function tries to determine which theme to
+    apply and which variant to apply. If the variant is available
+    then applies that variant else applies the default theme of
+    that name. The change is handed to the `APPLY_SCHEDULER`, so quickly
+    repeated calls result in a single apply of the latest choice.
+
+    @param      theme     str   theme name
+
+    @param      dark      bool  theme variant flag
+
+    @return     None
+    """
+    if not theme:
+        theme = SELECTED_THEME
+    print(f"Theme: {theme}, Dark: {dark}")
+    if theme not in THEME_COLLECTION:
+        print("Theme not found")
+        return
+
+    APPLY_SCHEDULER.request(theme=theme, variant=get_theme_variant(theme, dark))
+
+
+def on_prefer_dark_theme_check_toggled(check: Gtk.CheckButton, *args):
+    """
+    @brief      Handler for theme variant checkbox.
+
+    @details    This is called when the theme variant checkbox is toggled.
+
+    @param      check    Gtk.CheckButton
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    status = check.get_active()
+    # print(f"Toggle status: {status}")
+    update_theme_thumbnails()
+    apply_theme(dark=status)
+
+
+def on_theme_choice_changed(choice: Gtk.RadioButton, *args):
+    """
+    @brief      Handler for theme choice change.
+
+    @details    This is called when status of any theme choice radio button is
+    changed.
+
+    @param      choice   Gtk.RadioButton
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    global SELECTED_THEME
+    name: str = choice.get_name()
+    selected: bool = choice.get_active()
+    choice.set_inconsistent(False)
+    if selected:
+        SELECTED_THEME = name
+        # print(f"Selected theme: {name}")
+        dark_checkbox: Gtk.CheckButton = BUILDER.get_object(
+            THEME_DARK_CHECKBOX,
+        )
+        dark_mode: bool = dark_checkbox.get_active()
+        apply_theme(theme=name, dark=dark_mode)
+
+
+def on_revert_btn_clicked(button: Gtk.Button, *args):
+    """
+    @brief      Handler for the revert button.
+
+    @details    Restores the theme and layout settings found at startup.
+    The theme choices are set to match, or left without a selection if the
+    theme of the snapshot is not in the catalog.
+
+    @param      button   Gtk.Button
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    APPLY_SCHEDULER.revert()
+    theme, variant = SNAPSHOT.theme() or (None, None)
+    select_theme_choice(theme, variant == "dark")
+
+
+def select_theme_choice(theme: str, dark: bool = False):
+    """
+    @brief      Show a theme as chosen without applying it.
+
+    @details    Without a theme the active choice is marked inconsistent and
+    `SELECTED_THEME` is cleared.
+
+    @param      theme    Theme name or None
+
+    @param      dark     Whether the dark variant is chosen
+
+    @return     None
+    """
+    global SELECTED_THEME
+    SELECTED_THEME = theme
+    if not THEME_CHOICES:
+        # the theme page is not built yet
+        return
+    dark_checkbox: Gtk.CheckButton = BUILDER.get_object(THEME_DARK_CHECKBOX)
+    dark_checkbox.handler_block_by_func(on_prefer_dark_theme_check_toggled)
+    dark_checkbox.set_active(dark)
+    dark_checkbox.handler_unblock_by_func(on_prefer_dark_theme_check_toggled)
+    for name, choice in THEME_CHOICES.items():
+        choice.handler_block_by_func(on_theme_choice_changed)
+        if theme is None:
+            choice.set_inconsistent(choice.get_active())
+        elif name == theme:
+            choice.set_inconsistent(False)
+            choice.set_active(True)
+        choice.handler_unblock_by_func(on_theme_choice_changed)
+    update_theme_thumbnails()
+
+
+"""
+Dictionary of all GUI handlers.
+"""
+HANDLERS: Dict[str, Callable] = {
+    "on_window_destroy": on_window_destroy,
+    "on_page_map": on_page_map,
+    "on_left_nav_btn_clicked": on_left_nav_btn_clicked,
+    "on_right_nav_btn_clicked": on_right_nav_btn_clicked,
+    "on_layout_btn_img_draw": on_layout_btn_img_draw,
+    "on_layout_btn_clicked": on_layout_btn_clicked,
+    "on_prefer_dark_theme_check_toggled": on_prefer_dark_theme_check_toggled,
+    "on_theme_choice_changed": on_theme_choice_changed,
+    "on_revert_btn_clicked": on_revert_btn_clicked,
+}
+
+
+def set_archlinux_logo(image: Gtk.Image, *args):
+    """
+    @brief      Show the Archlinux logo in an image widget.
+
+    @details    The logo is rendered from its SVG source for the current
+    scale factor of the widget, falling back to the prerendered image.
+
+    @param      image    Gtk.Image
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    if SVG_RENDERER.is_pending(ARCHLINUX_LOGO_SVG_NAME):
+        # set again once loaded
+        return
+    surface = SVG_RENDERER.render(
+        ARCHLINUX_LOGO_SVG_NAME,
+        ARCHLINUX_LOGO_WIDTH,
+        scale=image.get_scale_factor(),
+    )
+    if surface is not None:
+        image.set_from_surface(surface)
+        return
+    archlogo_pixbuf: GdkPixbuf.Pixbuf = load_pixbuf_asset(
+        ARCHLINUX_LOGO_IMG_NAME,
+        ARCHLINUX_LOGO_WIDTH,
+    )
+    image.set_from_pixbuf(archlogo_pixbuf)
+
+
+def on_archlinux_logo_loaded(*args):
+    """
+    @brief      Show the logo once it is loaded, if its page is built.
+
+    @param      args     place holder list
+
+    @return     None
+    """
+    archlogo_img: Gtk.Image = (
+        BUILDER.get_object(ARCHLINUX_LOGO_IMG) if BUILDER else None
+    )
+    if archlogo_img is not None:
+        set_archlinux_logo(archlogo_img)
+
+
+def set_window_icon(pixbuf: GdkPixbuf.Pixbuf):
+    """
+    @brief      Set the icon of the welcome window once it is decoded.
+
+    @param      pixbuf   GdkPixbuf.Pixbuf or None
+
+    @return     None
+    """
+    if pixbuf is not None and BUILDER is not None:
+        window: Gtk.ApplicationWindow = BUILDER.get_object("window")
+        window.set_icon(pixbuf)
+
+
+def setup_welcome_page():
+    """
+    @brief      Fill in the welcome page after it was built.
+
+    @param      None
+
+    @return     None
+    """
+    # set archlinux logo image in welcome page
+    archlogo_img: Gtk.Image = BUILDER.get_object(ARCHLINUX_LOGO_IMG)
+    set_archlinux_logo(archlogo_img)
+    archlogo_img.connect("notify::scale-factor", set_archlinux_logo)
+
+    # set welcome page texts
+    welcome_label: Gtk.Label = BUILDER.get_object(WELCOME_LABEL)
+    welcome_label.set_label(WELCOME_LABEL_TEXT)
+    welcome_sublabel: Gtk.Label = BUILDER.get_object(WELCOME_SUBLABEL)
+    welcome_sublabel.set_label(WELCOME_SUBLABEL_TEXT)
+
+
+def set_theme_thumbnail(choice: Gtk.RadioButton, theme: str, pixbuf: GdkPixbuf.Pixbuf):
+    """
+    @brief      Show a thumbnail next to a theme choice.
+
+    @details    Thumbnails arriving after the choice switched to another
+    variant are ignored.
+
+    @param      choice   Gtk.RadioButton
+
+    @param      theme    GTK theme name of the thumbnail
+
+    @param      pixbuf   GdkPixbuf.Pixbuf or None
+
+    @return     None
+    """
+    if pixbuf is None or THUMBNAIL_THEMES.get(choice.get_name()) != theme:
+        return
+    choice.set_image(Gtk.Image.new_from_pixbuf(pixbuf))
+    choice.set_always_show_image(True)
+
+
+"""
+GTK theme name of the thumbnail wanted for each theme choice.
+"""
+THUMBNAIL_THEMES: Dict[str, str] = {}
+
+"""
+Variant each theme choice was last updated for.
+"""
+THUMBNAIL_VARIANTS: Dict[str, str] = {}
+
+
+def update_theme_thumbnails():
+    """
+    @brief      Show the thumbnails of the selected variants.
+
+    @details    Choices whose variant is not installed are disabled instead.
+    Only choices whose variant changed since the last call are updated, a
+    thumbnail is requested only if the GTK theme changed too.
+
+    @param      None
+
+    @return     None
+    """
+    dark: bool = BUILDER.get_object(THEME_DARK_CHECKBOX).get_active()
+    themes = CATALOG.themes()
+    for theme, choice in THEME_CHOICES.items():
+        variants = themes[theme]["variants"]
+        variant = "dark" if dark else "light"
+        if variant not in variants:
+            variant = "default"
+        if THUMBNAIL_VARIANTS.get(theme) == variant:
+            continue
+        THUMBNAIL_VARIANTS[theme] = variant
+        missing = THEME_INDEX.missing(variants[variant])
+        choice.set_sensitive(not missing)
+        if missing:
+            choice.set_tooltip_text("Not installed: " + ", ".join(missing))
+            THUMBNAIL_THEMES.pop(theme, None)
+            continue
+        choice.set_tooltip_text(None)
+        gtk_theme = variants[variant]["gtk_theme"]
+        if THUMBNAIL_THEMES.get(theme) == gtk_theme:
+            continue
+        THUMBNAIL_THEMES[theme] = gtk_theme
+        THEME_THUMBNAILS.request(
+            gtk_theme,
+            functools.partial(set_theme_thumbnail, choice, gtk_theme),
+        )
 
-    @details    Whenever the corresponding layout button is resized this
-    function is called to allow us resize and redraw the buttion's image.
 
-    @param      image    Gtk.DrawingArea
+def setup_theme_page():
+    """
+    @brief      Fill in the theme page after it was built.
 
-    @param      context  Cairo drawing context associated with the button
+    @details    A radio button is added for every theme of the catalog and
+    indexed by name in `THEME_CHOICES`. The first one starts selected.
 
-    @param      args     place holder list
+    @param      None
 
     @return     None
     """
-    size, _ = image.get_allocated_size()
-    width: int = size.width
-    height: int = size.height
-    # print(f"w={width}, h={height}")
-    scaled_pixbuf = LAYOUT_PIXBUFS[LAYOUT_BH_BTN].scale_simple(
-        width,
-        height,
-        GdkPixbuf.InterpType.BILINEAR,
-    )
-    Gdk.cairo_set_source_pixbuf(context, scaled_pixbuf, 0, 0)
-    context.paint()
+    global SELECTED_THEME
+    box: Gtk.Box = BUILDER.get_object(THEME_CHOICES_BOX)
+    group: Gtk.RadioButton = None
+    for name, entry in CATALOG.themes().items():
+        choice = Gtk.RadioButton.new_with_label_from_widget(
+            group,
+            entry.get("label", name),
+        )
+        choice.set_name(name)
+        choice.connect("toggled", on_theme_choice_changed)
+        box.pack_start(choice, False, False, 0)
+        THEME_CHOICES[name] = choice
+        group = group or choice
+    SELECTED_THEME = next(iter(THEME_CHOICES), None)
+    THEME_INDEX.refresh()
+    update_theme_thumbnails()
 
 
-def on_layout_th_btn_img_draw(
-    image: Gtk.DrawingArea,
-    context: cairo.Context,
-    *args,
-):
+"""
+Pages built on demand, in stack order, with their ui file and setup function.
+"""
+LAZY_PAGES: Dict[str, tuple] = {
+    THEME_PAGE_NAME: ("ui/ThemePage.glade", setup_theme_page),
+    WELCOME_PAGE_NAME: ("ui/WelcomePage.glade", setup_welcome_page),
+}
+
+
+def ensure_page(name: str) -> Gtk.Widget:
     """
-    @brief      Updates the image size along with the change of button size.
+    @brief      Build a stack page if it was not built yet.
 
-    @details    Whenever the corresponding layout button is resized this
-    function is called to allow us resize and redraw the buttion's image.
+    @details    The page objects are added to `BUILDER` so they can be looked
+    up as usual and their signals are connected through `HANDLERS`. Pages
+    in front of it are built first to keep the order of the stack.
 
-    @param      image    Gtk.DrawingArea
+    @param      name   Page name
 
-    @param      context  Cairo drawing context associated with the button
+    @return     Gtk.Widget
+    """
+    page: Gtk.Widget = STACK.get_child_by_name(name)
+    if page is not None or name not in LAZY_PAGES:
+        return page
+
+    for prev_name in LAZY_PAGES:
+        if prev_name == name:
+            break
+        ensure_page(prev_name)
+
+    ui_file, setup = LAZY_PAGES[name]
+    with trace_span(f"build {name}"):
+        builder_add_asset(BUILDER, ui_file)
+        # only the signals of the newly added objects are connected
+        BUILDER.connect_signals(HANDLERS)
+        page = BUILDER.get_object(name)
+        STACK.add_named(page, name)
+        if setup:
+            setup()
+        page.show_all()
+    return page
+
+
+def build_pages_after_first_paint(window: Gtk.Window):
+    """
+    @brief      Build the remaining pages once the window is on screen.
 
-    @param      args     place holder list
+    @details    One page is built per idle callback, so the main loop stays
+    responsive in between.
+
+    @param      window   Gtk.Window
 
     @return     None
     """
-    size, _ = image.get_allocated_size()
-    width: int = size.width
-    height: int = size.height
-    # print(f"w={width}, h={height}")
-    scaled_pixbuf = LAYOUT_PIXBUFS[LAYOUT_TH_BTN].scale_simple(
-        width,
-        height,
-        GdkPixbuf.InterpType.BILINEAR,
-    )
-    Gdk.cairo_set_source_pixbuf(context, scaled_pixbuf, 0, 0)
-    context.paint()
 
+    def build_next() -> bool:
+        for name in LAZY_PAGES:
+            if STACK.get_child_by_name(name) is None:
+                ensure_page(name)
+                return True
+        return False
 
-def on_layout_lv_btn_img_draw(
-    image: Gtk.DrawingArea,
-    context: cairo.Context,
-    *args,
-):
-    """
-    @brief      Updates the image size along with the change of button size.
+    def on_draw(*args):
+        window.disconnect(handler_id)
+        GLib.idle_add(build_next, priority=GLib.PRIORITY_LOW)
+        return False
 
-    @details    Whenever the corresponding layout button is resized this
-    function is called to allow us resize and redraw the buttion's image.
+    handler_id = window.connect_after("draw", on_draw)
 
-    @param      image    Gtk.DrawingArea
 
-    @param      context  Cairo drawing context associated with the button
+def show_welcome_app(*args):
+    """
+    @brief      Show the welcome application.
 
-    @param      args     place holder list
+    @details    This application should provide with a simple ui to allow user
+    to setup the desktop layout, theme and othere stuffs.
+
+    @param      args   Just placeholder
 
     @return     None
     """
-    size, _ = image.get_allocated_size()
-    width: int = size.width
-    height: int = size.height
-    # print(f"w={width}, h={height}")
-    scaled_pixbuf = LAYOUT_PIXBUFS[LAYOUT_LV_BTN].scale_simple(
-        width,
-        height,
-        GdkPixbuf.InterpType.BILINEAR,
-    )
-    Gdk.cairo_set_source_pixbuf(context, scaled_pixbuf, 0, 0)
-    context.paint()
+    global STACK, BUILDER, BUSY_SPINNER
+
+    # start decoding the images, they are set as they become ready
+    with trace_span("load_pixbufs"):
+        load_pixbufs()
+        ASSET_LOADER.submit(
+            WINDOW_ICON_NAME,
+            load_pixbuf_asset,
+            set_window_icon,
+            WINDOW_ICON_NAME,
+        )
+        SVG_RENDERER.load_async(ARCHLINUX_LOGO_SVG_NAME, on_archlinux_logo_loaded)
 
+    BUILDER = Gtk.Builder()
+    with trace_span("Gtk.Builder.add_from_file"):
+        builder_add_asset(BUILDER, "ui/WelcomeApp.glade")
 
-def on_layout_rv_btn_img_draw(
-    image: Gtk.DrawingArea,
-    context: cairo.Context,
-    *args,
-):
-    """
-    @brief      Updates the image size along with the change of button size.
+    STACK = BUILDER.get_object("stack")
+    BUSY_SPINNER = BUILDER.get_object(HEADERBAR_SPINNER)
+    update_busy_indicator()
 
-    @details    Whenever the corresponding layout button is resized this
-    function is called to allow us resize and redraw the buttion's image.
+    window: Gtk.ApplicationWindow = BUILDER.get_object("window")
 
-    @param      image    Gtk.DrawingArea
+    with trace_span("connect_signals"):
+        BUILDER.connect_signals(HANDLERS)
 
-    @param      context  Cairo drawing context associated with the button
+    if TRACER:
+        window.connect(
+            "map-event",
+            lambda *args: TRACER.instant("first window map", once=True),
+        )
+    window.show_all()
+    build_pages_after_first_paint(window)
+    # take the snapshot before anything gets applied, this reads the current
+    # settings in the background so that the first choice need not wait
+    ENVIRONMENT.when_ready(["panels"], SNAPSHOT.take)
 
-    @param      args     place holder list
 
-    @return     None
+def show_res_app():
     """
-    size, _ = image.get_allocated_size()
-    width: int = size.width
-    height: int = size.height
-    # print(f"w={width}, h={height}")
-    scaled_pixbuf = LAYOUT_PIXBUFS[LAYOUT_RV_BTN].scale_simple(
-        width,
-        height,
-        GdkPixbuf.InterpType.BILINEAR,
-    )
-    Gdk.cairo_set_source_pixbuf(context, scaled_pixbuf, 0, 0)
-    context.paint()
+    @brief      Show the resolution app, followed by the welcome app.
 
+    @param      None
 
-def on_layout_btn_clicked(button: Gtk.Button, *args):
+    @return     None
     """
-    @brief      Change desktop layout on layout button click.
+    res_app = init_res_app(ENVIRONMENT.display_outputs)
+    res_app.connect(
+        "destroy",
+        show_welcome_app,
+    )
+    res_app.show_all()
 
-    @details    In the layout regarding button must be named
-    after the target layout name int LAYOUT_COMMANDS dictionary.
 
-    @param      button   Gtk.Button button widget that recieved
-    clicked event.
+XFCONF_XML_DIR: str = ".config/xfce4/xfconf/xfce-perchannel-xml"
 
-    @param      args     place holder list
+"""
+System wide channel files a channel missing in a home starts from, in order
+of preference. The panel default is the one xfce4-panel itself starts with.
+"""
+XFCONF_DEFAULT_XML: Dict[str, List[str]] = {
+    "xfce4-panel": [
+        "/etc/xdg/xfce4/xfconf/xfce-perchannel-xml/xfce4-panel.xml",
+        "/etc/xdg/xfce4/panel/default.xml",
+    ],
+    "displays": [
+        "/etc/xdg/xfce4/xfconf/xfce-perchannel-xml/displays.xml",
+    ],
+}
 
-    @return     None
-    """
-    name: str = button.get_name()
-    print("Layout Name: ", name)
-    commands = LAYOUT_COMMANDS[name]
-    for cmd in commands:
-        cmd.execute()
 
+class XfconfXmlChannel:
+    """An xfconf channel stored as XML in a home directory.
 
-def apply_theme(theme: str = None, dark: bool = False):
+    This is what xfconfd reads at login, so settings can be written without
+    a running session, i.e. to `/etc/skel` or to the homes of other users.
+    Only `xsettings` and `xfwm4` are created empty when missing, a made up
+    panel or display configuration would replace the defaults of Xfce. The
+    panel and display channels start from the system wide defaults of
+    `XFCONF_DEFAULT_XML` instead, if there are any.
     """
-    @brief      Function to apply a global theme.
 
-    @details    This function tries to determine which theme to
-    apply and which variant to apply. If the variant is available
-    then applies that variant else applies the default theme of
-    that name.
+    CREATE_CHANNELS: tuple = ("xsettings", "xfwm4")
 
-    @param      theme     str   theme name
+    def __init__(self, home: str, channel: str):
+        """
+        @brief      Parse the channel file of a home directory.
 
-    @param      dark      bool  theme variant flag
+        @param      home      Home directory
 
-    @return     None
-    """
-    if not theme:
-        for theme_name in THEME_COLLECTION:
-            widget_id = f"{theme_name}_choice"
-            widget: Gtk.RadioButton = BUILDER.get_object(widget_id)
-            selected: bool = widget.get_active()
-            if selected:
-                theme = theme_name
+        @param      channel   Channel name
+
+        @return     None
+        """
+        self.channel = channel
+        self.path = os.path.join(home, XFCONF_XML_DIR, f"{channel}.xml")
+        self.changed: bool = False
+        self.root: ElementTree.Element = None
+        try:
+            self.root = ElementTree.parse(self.path).getroot()
+        except FileNotFoundError:
+            if channel in self.CREATE_CHANNELS:
+                self.root = ElementTree.Element("channel", name=channel, version="1.0")
+                return
+            for path in XFCONF_DEFAULT_XML.get(channel, []):
+                try:
+                    self.root = ElementTree.parse(path).getroot()
+                except FileNotFoundError:
+                    continue
+                # the whole channel is written to the home once changed
+                self.root.set("name", channel)
                 break
-    print(f"Theme: {theme}, Dark: {dark}")
-    if theme not in THEME_COLLECTION:
-        print("Theme not found")
-        return
 
-    theme_dict: Dict[str, List[BaseCommand]] = THEME_COLLECTION[theme]
-    theme_commands: List[BaseCommand] = None
-    if dark:
-        if "dark" in theme_dict:
-            print("Dark variant is selected")
-            theme_commands = theme_dict["dark"]
-        else:
-            print("Default variant is selected")
-            theme_commands = theme_dict["default"]
-    else:
-        if "light" in theme_dict:
-            print("Light variant is selected")
-            theme_commands = theme_dict["light"]
-        else:
-            print("Default variant is selected")
-            theme_commands = theme_dict["default"]
+    def _find(self, prop: str, create: bool = False) -> ElementTree.Element:
+        """
+        @brief      Find the element of a property.
 
-    for cmd in theme_commands:
-        cmd.execute()
+        @param      prop     Property path
 
+        @param      create   Create the missing elements
 
-def on_prefer_dark_theme_check_toggled(check: Gtk.CheckButton, *args):
-    """
-    @brief      Handler for theme variant checkbox.
+        @return     ElementTree.Element or None
+        """
+        node = self.root
+        for name in prop.strip("/").split("/"):
+            if node is None:
+                return None
+            child = next(
+                (e for e in node.findall("property") if e.get("name") == name),
+                None,
+            )
+            if child is None and create:
+                child = ElementTree.SubElement(
+                    node, "property", name=name, type="empty"
+                )
+            node = child
+        return node
 
-    @details    This is called when the theme variant checkbox is toggled.
+    def values(self) -> Dict[str, str]:
+        """
+        @brief      All the property values of the channel.
 
-    @param      check    Gtk.CheckButton
+        @param      None
 
-    @param      args     place holder list
+        @return     Dictionary of property path and value as string
+        """
+        values: Dict[str, str] = {}
 
-    @return     None
-    """
-    status = check.get_active()
-    # print(f"Toggle status: {status}")
-    apply_theme(dark=status)
+        def walk(node: ElementTree.Element, path: str):
+            for child in node.findall("property"):
+                child_path = f"{path}/{child.get('name')}"
+                if child.get("value") is not None:
+                    values[child_path] = child.get("value")
+                walk(child, child_path)
 
+        if self.root is not None:
+            walk(self.root, "")
+        return values
 
-def on_theme_choice_changed(choice: Gtk.RadioButton, *args):
-    """
-    @brief      Handler for theme choice change.
+    def panel_id(self) -> int:
+        """
+        @brief      The panel id, as `get_panel_number` reports it.
 
-    @details    This is called when status of any theme choice radio button is
-    changed.
+        @param      None
 
-    @param      choice   Gtk.RadioButton
+        @return     int
+        """
+        node = self._find("/panels") if self.root is not None else None
+        if node is None:
+            return 0
+        return parse_panel_number([v.get("value") for v in node.findall("value")])
 
-    @param      args     place holder list
+    def set(self, prop: str, value: str) -> bool:
+        """
+        @brief      Set a property, keeping the type it already has.
 
-    @return     None
-    """
-    name: str = choice.get_name()
-    selected: bool = choice.get_active()
-    if selected:
-        # print(f"Selected theme: {name}")
-        dark_checkbox: Gtk.CheckButton = BUILDER.get_object(
-            THEME_DARK_CHECKBOX,
+        @details    New properties are typed after their value. Outside of
+        the channels that may be created, only properties of existing parents
+        are added.
+
+        @param      prop     Property path
+
+        @param      value    New value as string
+
+        @return     False if the channel or the property can't be written
+        """
+        if self.root is None:
+            return False
+        if self.channel not in self.CREATE_CHANNELS:
+            # i.e do not make up panels that do not exist
+            if self._find(prop.rpartition("/")[0]) is None:
+                return False
+        node = self._find(prop, create=True)
+        type_str = node.get("type")
+        if type_str == "array":
+            return False
+        if type_str == "empty" and len(node) == 0:
+            if value in ("true", "false"):
+                type_str = "bool"
+            elif re.fullmatch(r"-?\d+", value):
+                type_str = "int"
+            else:
+                type_str = "string"
+            node.set("type", type_str)
+        if node.get("value") != value:
+            node.set("value", value)
+            self.changed = True
+        return True
+
+    def save(self) -> bool:
+        """
+        @brief      Write the channel if it changed.
+
+        @param      None
+
+        @return     True if the file was written
+        """
+        if not self.changed:
+            return False
+        if hasattr(ElementTree, "indent"):
+            ElementTree.indent(self.root)
+        data = ElementTree.tostring(self.root, encoding="unicode")
+        write_file_atomic(
+            self.path, '<?xml version="1.0" encoding="UTF-8"?>\n\n' + data + "\n"
         )
-        dark_mode: bool = dark_checkbox.get_active()
-        apply_theme(theme=name, dark=dark_mode)
+        self.changed = False
+        return True
 
 
-"""
-Dictionary of all GUI handlers.
-"""
-HANDLERS: Dict[str, Callable] = {
-    "on_window_destroy": on_window_destroy,
-    "on_page_map": on_page_map,
-    "on_left_nav_btn_clicked": on_left_nav_btn_clicked,
-    "on_right_nav_btn_clicked": on_right_nav_btn_clicked,
-    "on_layout_bh_btn_img_draw": on_layout_bh_btn_img_draw,
-    "on_layout_th_btn_img_draw": on_layout_th_btn_img_draw,
-    "on_layout_lv_btn_img_draw": on_layout_lv_btn_img_draw,
-    "on_layout_rv_btn_img_draw": on_layout_rv_btn_img_draw,
-    "on_layout_btn_clicked": on_layout_btn_clicked,
-    "on_prefer_dark_theme_check_toggled": on_prefer_dark_theme_check_toggled,
-    "on_theme_choice_changed": on_theme_choice_changed,
-}
+def provision_home(
+    home: str,
+    theme: str = None,
+    variant: str = None,
+    layout: str = None,
+    resolution: str = None,
+) -> tuple:
+    """
+    @brief      Apply a selection to the configuration files of a home.
 
+    @details    The commands of the selection are not run. Their xfconf
+    settings are written to the channel XML files and their config file
+    edits to the files below `home`, each file being parsed and written
+    once. Commands of other kinds, like xrandr, are left out. When run as
+    root the written files are given to the owner of the home directory.
+    Settings that could not be written, i.e. of a panel that neither the
+    home nor the system defaults have, make the result an error, after
+    the others were written.
 
-def show_welcome_app(*args):
+    @param      home         Home directory (or skeleton, i.e `/etc/skel`)
+
+    @param      theme        Theme name in THEME_COLLECTION
+
+    @param      variant      Variant name of the theme
+
+    @param      layout       Layout name in LAYOUT_COMMANDS
+
+    @param      resolution   Display resolution (i.e `1920x1080`)
+
+    @return     (home, list of written files, error message or None)
     """
-    @brief      Show the welcome application.
+    written: List[str] = []
+    skipped: List[str] = []
+    try:
+        channels: Dict[str, XfconfXmlChannel] = {}
+
+        def channel(name: str) -> XfconfXmlChannel:
+            if name not in channels:
+                channels[name] = XfconfXmlChannel(home, name)
+            return channels[name]
+
+        commands: List[BaseCommand] = []
+        if theme:
+            commands.extend(THEME_COLLECTION[theme][variant])
+        if layout:
+            panel_id = channel("xfce4-panel").panel_id()
+            entry = CATALOG.layouts()[layout]
+            commands.extend(Catalog.layout_commands(entry, panel_id))
+        if resolution:
+            displays = channel("displays").values()
+            commands.extend(resolution_commands(displays, resolution, []))
+
+        for cmd in ConfFileCommand.merge(commands):
+            if isinstance(cmd, ConfFileCommand):
+                path = cmd.path.replace("~", home, 1)
+                if ConfFile(path).apply(cmd.edits, cmd.quote):
+                    written.append(path)
+                continue
+            for key, value in cmd.targets():
+                if key[0] == "xfconf" and not channel(key[1]).set(key[2], value):
+                    skipped.append(f"{key[1]} {key[2]}")
+        for xml_channel in channels.values():
+            if xml_channel.save():
+                written.append(xml_channel.path)
+
+        home_stat = os.stat(home)
+        if os.geteuid() == 0:
+            for path in written:
+                while path.startswith(home) and path != home:
+                    os.chown(path, home_stat.st_uid, home_stat.st_gid)
+                    path = os.path.dirname(path)
+    except Exception as ex:
+        return home, written, str(ex)
+    if skipped:
+        return home, written, f"could not set {', '.join(skipped)}"
+    return home, written, None
+
+
+def provision_homes(homes: List[str], jobs: int = None, **selection) -> List[tuple]:
+    """
+    @brief      Apply a selection to many homes at once.
 
-    @details    This application should provide with a simple ui to allow user
-    to setup the desktop layout, theme and othere stuffs.
+    @details    The homes are spread over a pool of worker processes. A
+    single home is done in this process.
 
-    @param      args   Just placeholder
+    @param      homes       Home directories
 
-    @return     None
+    @param      jobs        Number of worker processes, the number of CPUs
+    if not given
+
+    @param      selection   Keyword arguments of `provision_home`
+
+    @return     List of results of `provision_home`
     """
-    global STACK, BUILDER
+    task = functools.partial(provision_home, **selection)
+    if len(homes) < 2 or jobs == 1:
+        return [task(home) for home in homes]
+    workers = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(homes) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(task, homes, chunksize=chunksize))
 
-    load_pixbufs()
 
-    BUILDER = Gtk.Builder()
-    BUILDER.add_from_file(resolve_path("ui/WelcomeApp.glade"))
+def run_provision(args: argparse.Namespace) -> int:
+    """
+    @brief      Write a selection to the configuration of home directories.
 
-    STACK = BUILDER.get_object("stack")
+    @param      args   Parsed arguments of the `provision` command
 
-    # set archlinux logo image in welcome page
-    archlogo_pixbuf: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-        resolve_path(ARCHLINUX_LOGO_IMG_NAME),
-        180,
-        -1,
-        True,
+    @return     int  Exit status, 0 on success, 1 if a home failed and 2
+    for unknown names
+    """
+    start = time.perf_counter()
+    variant = None
+    if args.theme:
+        if args.theme not in THEME_COLLECTION:
+            print(
+                f"Unknown theme {args.theme}, available: {', '.join(THEME_COLLECTION)}"
+            )
+            return 2
+        variant = get_theme_variant(args.theme, args.dark)
+    if args.layout and args.layout not in LAYOUT_COMMANDS:
+        print(f"Unknown layout {args.layout}, available: {', '.join(LAYOUT_COMMANDS)}")
+        return 2
+
+    homes = [os.path.abspath(home) for home in args.homes]
+    results = provision_homes(
+        homes,
+        args.jobs,
+        theme=args.theme,
+        variant=variant,
+        layout=args.layout,
+        resolution=args.resolution,
     )
-    archlogo_img: Gtk.Image = BUILDER.get_object(ARCHLINUX_LOGO_IMG)
-    archlogo_img.set_from_pixbuf(archlogo_pixbuf)
+    failed = 0
+    for home, written, error in results:
+        if error:
+            failed += 1
+            print(f"{home}: failed: {error}, {len(written)} files written")
+        else:
+            print(f"{home}: {len(written)} files written")
+    print(
+        f"Provisioned {len(homes) - failed} of {len(homes)} homes in "
+        + f"{(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+    return 1 if failed else 0
 
-    # set welcome page texts
-    welcome_label: Gtk.Label = BUILDER.get_object(WELCOME_LABEL)
-    welcome_label.set_label(WELCOME_LABEL_TEXT)
-    welcome_sublabel: Gtk.Label = BUILDER.get_object(WELCOME_SUBLABEL)
-    welcome_sublabel.set_label(WELCOME_SUBLABEL_TEXT)
 
-    # set window icon
-    window: Gtk.ApplicationWindow = BUILDER.get_object("window")
-    window.set_icon(
-        GdkPixbuf.Pixbuf.new_from_file(
-            resolve_path(WINDOW_ICON_NAME),
-        ),
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """
+    @brief      Parse the command line arguments.
+
+    @param      argv   List of arguments without the program name
+
+    @return     argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        prog="welcome-screen",
+        description="Setup desktop layout and theme of EasyArch.",
+    )
+    parser.add_argument(
+        "--test",
+        action="store_true",
+        help="always show the resolution dialog first",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the commands that would be run instead of running them",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="write startup and command timings to FILE (Chrome trace format)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print the count and latency histogram of every command on exit,"
+        + " also printed on SIGUSR1",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    apply_parser = subparsers.add_parser(
+        "apply",
+        help="apply a theme, layout or resolution without the user interface",
+    )
+    apply_parser.add_argument("--theme", metavar="NAME", help="theme to apply")
+    apply_parser.add_argument(
+        "--dark",
+        action="store_true",
+        help="apply the dark variant of the theme, if available",
     )
+    apply_parser.add_argument("--layout", metavar="NAME", help="layout to apply")
+    apply_parser.add_argument(
+        "--resolution",
+        metavar="WxH",
+        help="display resolution to switch all outputs to",
+    )
+    provision_parser = subparsers.add_parser(
+        "provision",
+        help="write a theme, layout or resolution to the configuration files "
+        + "of home directories, without a running session",
+    )
+    provision_parser.add_argument("--theme", metavar="NAME", help="theme to apply")
+    provision_parser.add_argument(
+        "--dark",
+        action="store_true",
+        help="apply the dark variant of the theme, if available",
+    )
+    provision_parser.add_argument("--layout", metavar="NAME", help="layout to apply")
+    provision_parser.add_argument(
+        "--resolution",
+        metavar="WxH",
+        help="display resolution of the saved display profile",
+    )
+    provision_parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    provision_parser.add_argument(
+        "homes",
+        metavar="HOME",
+        nargs="+",
+        help="home directory, i.e /etc/skel",
+    )
+    args = parser.parse_args(argv)
+    if args.command and not (args.theme or args.layout or args.resolution):
+        parser.error("nothing to apply, use --theme, --layout or --resolution")
+    return args
 
-    BUILDER.connect_signals(HANDLERS)
 
-    window.show_all()
+def run_apply(args: argparse.Namespace) -> int:
+    """
+    @brief      Apply a theme, layout and/or resolution from the command line.
+
+    @details    This uses the same commands as the user interface but runs
+    them one after another without a main loop, and only GLib and Gio are
+    imported. A timing summary is printed at the end.
+
+    @param      args   Parsed arguments of the `apply` command
+
+    @return     int  Exit status, 0 on success, 1 if a command failed and 2
+    for unknown names
+    """
+    start = time.perf_counter()
+    with trace_span("import gi"):
+        import_gi(gtk=False)
+
+    commands: List[BaseCommand] = []
+    if args.theme:
+        if args.theme not in THEME_COLLECTION:
+            print(
+                f"Unknown theme {args.theme}, available: {', '.join(THEME_COLLECTION)}"
+            )
+            return 2
+        variant = get_theme_variant(args.theme, args.dark)
+        THEME_INDEX.refresh()
+        spec = CATALOG.themes()[args.theme]["variants"][variant]
+        for part in THEME_INDEX.missing(spec):
+            print(f"Warning: {part} is not installed")
+        commands.extend(THEME_COLLECTION[args.theme][variant])
+    if args.layout:
+        if args.layout not in LAYOUT_COMMANDS:
+            print(
+                f"Unknown layout {args.layout}, available: {', '.join(LAYOUT_COMMANDS)}"
+            )
+            return 2
+        commands.extend(LAYOUT_COMMANDS[args.layout])
+    if args.resolution:
+        outputs = get_display_outputs()
+        sizes, _ = list_resolutions(outputs)
+        if outputs and args.resolution not in sizes:
+            print(
+                f"Unknown resolution {args.resolution}, available: {', '.join(sizes)}"
+            )
+            return 2
+        displays = read_xfconf_channel("displays")
+        STATE_PLANNER.seed(("xfconf", "displays"), displays)
+        commands.extend(resolution_commands(displays, args.resolution, outputs))
+    prepared = time.perf_counter()
+
+    planned = STATE_PLANNER.plan(commands)
+    if STATE_PLANNER.dry_run:
+        planned = []
+    failed = 0
+    for cmd in planned:
+        cmd_start = time.perf_counter()
+        try:
+            cmd.execute()
+        except (subprocess.CalledProcessError, OSError, GLib.Error) as ex:
+            print(f"Command failed: {cmd}: {ex}")
+            failed += 1
+            continue
+        if isinstance(cmd, XrandrApplyCommand) and cmd.verified is False:
+            failed += 1
+        print(f"  {(time.perf_counter() - cmd_start) * 1000:7.1f} ms  {cmd}")
+    end = time.perf_counter()
+
+    print(
+        f"Ran {len(planned)} of {len(commands)} commands, {failed} failed, "
+        + f"in {(end - start) * 1000:.1f} ms "
+        + f"({(prepared - start) * 1000:.1f} ms preparing, "
+        + f"{(end - prepared) * 1000:.1f} ms applying)"
+    )
+    return 1 if failed else 0
 
 
 def main():
@@ -1138,14 +6231,49 @@ def main():
 
     @return     None
     """
-    if len(sys.argv) > 1 and sys.argv[1] == "--test":
+    global TRACER
+    args = parse_args(sys.argv[1:])
+    signal.signal(signal.SIGUSR1, COMMAND_STATS.dump)
+    if args.trace:
+        TRACER = Tracer(args.trace)
+        add_command_observer(TRACER)
+    if args.command == "provision":
+        sys.exit(run_provision(args))
+    if args.command == "apply":
+        STATE_PLANNER.dry_run = args.dry_run
+        try:
+            status = run_apply(args)
+        finally:
+            stop_command_helper()
+            if TRACER:
+                TRACER.save()
+            if args.stats:
+                COMMAND_STATS.dump()
+        sys.exit(status)
+    # the helper is only of use before Gtk is loaded, the command line
+    # above does without both
+    with trace_span("start_command_helper"):
+        start_command_helper()
+    with trace_span("import gi"):
+        import_gi()
+    # a python signal handler would only run with the next event, the main
+    # loop dispatches this one right away
+    GLib.unix_signal_add(
+        GLib.PRIORITY_DEFAULT,
+        signal.SIGUSR1,
+        lambda *args: COMMAND_STATS.dump() or True,
+    )
+    with trace_span("load_resources"):
+        load_resources()
+    STATE_PLANNER.dry_run = args.dry_run
+    if STATE_PLANNER.dry_run:
+        print("dry run, commands will only be printed")
+
+    start_environment_probes()
+
+    if args.test:
         print("running in test mode")
-        res_app = init_res_app()
-        res_app.connect(
-            "destroy",
-            show_welcome_app,
-        )
-        res_app.show_all()
+        ENVIRONMENT.when_ready(["xrandr"], show_res_app)
     else:
         is_first_run = True
         if os.path.exists(
@@ -1154,7 +6282,6 @@ def main():
             )
         ):
             is_first_run = False
-        is_vm = check_virtual_machine()
 
         if is_first_run:
             print("first time run, creating indicator file")
@@ -1165,18 +6292,27 @@ def main():
                 "w",
             ) as f:
                 f.write("1\n")
-        if is_first_run and is_vm:
-            print("running res app first")
-            res_app = init_res_app()
-            res_app.connect(
-                "destroy",
-                show_welcome_app,
-            )
-            res_app.show_all()
+
+            def on_virt():
+                if ENVIRONMENT.is_vm:
+                    print("running res app first")
+                    ENVIRONMENT.when_ready(["xrandr"], show_res_app)
+                else:
+                    print("running main app directly")
+                    show_welcome_app()
+
+            ENVIRONMENT.when_ready(["virt"], on_virt)
         else:
             print("running main app directly")
             show_welcome_app()
-    Gtk.main()
+    try:
+        Gtk.main()
+    finally:
+        stop_command_helper()
+        if TRACER:
+            TRACER.save()
+        if args.stats:
+            COMMAND_STATS.dump()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,469 @@
+#!/bin/env python3
+
+"""Benchmarks of the welcome screen operations.
+
+The operations run against stand-in `xfconf-query`, `xrandr` and
+`systemd-detect-virt` programs put in front of `PATH`. They answer with
+canned output after a configurable latency and log every start, so the wall
+time and the number of spawned processes of each operation can be measured
+without a display or a running Xfce session. Results can be saved as a
+baseline and later runs compared against it.
+
+Copyright (C) 2020 Asif Mahmud Shimon
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program; if not, write to the Free Software Foundation, Inc., 59 Temple
+Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+from typing import (
+    List,
+    Dict,
+    Callable,
+)
+
+REPO_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+"""
+Size of the canned xrandr listing.
+"""
+OUTPUTS: int = 8
+MODES_PER_OUTPUT: int = 25
+
+"""
+Stand-in programs, `$FAKE_DATA` holds the canned output.
+"""
+FAKE_PROGRAMS: Dict[str, str] = {
+    "xfconf-query": """#!/bin/sh
+echo xfconf-query >> "$FAKE_SPAWN_LOG"
+sleep "$FAKE_LATENCY"
+channel=""
+prop=""
+list=""
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -c) channel="$2"; shift ;;
+        -p) prop="$2"; shift ;;
+        -l) list=1 ;;
+    esac
+    shift
+done
+if [ -n "$list" ]; then
+    cat "$FAKE_DATA/$channel.txt" 2>/dev/null
+elif [ "$prop" = "/panels" ]; then
+    printf 'Value is an array with 1 items:\\n\\n1\\n'
+fi
+""",
+    "xrandr": """#!/bin/sh
+echo xrandr >> "$FAKE_SPAWN_LOG"
+sleep "$FAKE_LATENCY"
+cat "$FAKE_DATA/xrandr.txt"
+""",
+    "systemd-detect-virt": """#!/bin/sh
+echo systemd-detect-virt >> "$FAKE_SPAWN_LOG"
+sleep "$FAKE_LATENCY"
+echo kvm
+""",
+}
+
+
+def xrandr_listing(outputs: int, modes: int) -> str:
+    """
+    @brief      Make up an `xrandr --query` listing.
+
+    @param      outputs   Number of connected outputs
+
+    @param      modes     Number of modes per output
+
+    @return     str
+    """
+    lines = ["Screen 0: minimum 8 x 8, current 1920 x 1080, maximum 32767 x 32767"]
+    for out in range(outputs):
+        lines.append(f"Virtual-{out + 1} connected 1920x1080+0+0 (normal) 0mm x 0mm")
+        for mode in range(modes):
+            width = 3840 - mode * 120
+            height = width * 9 // 16
+            current = "*" if width == 1920 else " "
+            preferred = "+" if mode == 0 else " "
+            lines.append(
+                f"   {width}x{height}     60.00{current}{preferred}  59.94    50.00"
+            )
+    lines.append(f"Virtual-{outputs + 1} disconnected (normal)")
+    return "\n".join(lines) + "\n"
+
+
+def displays_listing(outputs: int, profiles: int = 4) -> str:
+    """
+    @brief      Make up the `displays` channel with a few saved profiles.
+
+    @param      outputs    Number of outputs per profile
+
+    @param      profiles   Number of profiles besides `Default`
+
+    @return     str
+    """
+    lines = ["/ActiveProfile                   Default"]
+    for profile in ["Default"] + [f"profile{idx}" for idx in range(profiles)]:
+        for out in range(outputs):
+            prefix = f"/{profile}/Virtual-{out + 1}"
+            lines.append(f"{prefix}/Active         true")
+            lines.append(f"{prefix}/Resolution     1920x1080")
+            lines.append(f"{prefix}/RefreshRate    60.000000")
+    return "\n".join(lines) + "\n"
+
+
+def setup_environment(workdir: str, latency_ms: float) -> str:
+    """
+    @brief      Install the stand-in programs and their data.
+
+    @details    The environment of this process is changed so that the
+    programs are found first, the xfconf bus is not used and the home
+    directory is a fresh folder.
+
+    @param      workdir      Scratch folder
+
+    @param      latency_ms   Delay of every stand-in program
+
+    @return     str  Path of the spawn log
+    """
+    bin_dir = os.path.join(workdir, "bin")
+    data_dir = os.path.join(workdir, "data")
+    home_dir = os.path.join(workdir, "home")
+    for path in (bin_dir, data_dir, home_dir):
+        os.makedirs(path)
+
+    for name, script in FAKE_PROGRAMS.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+
+    data = {
+        "xrandr.txt": xrandr_listing(OUTPUTS, MODES_PER_OUTPUT),
+        "displays.txt": displays_listing(OUTPUTS),
+        "xsettings.txt": "/Net/ThemeName      Adwaita\n"
+        + "/Net/IconThemeName  Adwaita\n",
+        "xfwm4.txt": "/general/theme  Default\n",
+        "xfce4-panel.txt": "/panels/panel-1/size  30\n"
+        + "/panels/panel-1/position  p=8;x=0;y=0\n"
+        + "/panels/panel-1/mode  0\n",
+    }
+    for name, content in data.items():
+        with open(os.path.join(data_dir, name), "w") as f:
+            f.write(content)
+
+    spawn_log = os.path.join(workdir, "spawns.log")
+    open(spawn_log, "w").close()
+    os.environ.update(
+        {
+            "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+            "FAKE_DATA": data_dir,
+            "FAKE_SPAWN_LOG": spawn_log,
+            "FAKE_LATENCY": f"{latency_ms / 1000:.4f}",
+            "WELCOME_SCREEN_NO_DBUS": "1",
+            "HOME": home_dir,
+        }
+    )
+    return spawn_log
+
+
+def count_lines(path: str) -> int:
+    with open(path, "r") as f:
+        return sum(1 for _ in f)
+
+
+def measure(op: Callable, iterations: int, spawn_log: str) -> dict:
+    """
+    @brief      Time an operation.
+
+    @details    A first warm-up run is left out of the timings and spawn
+    counts, it pays for what is cached afterwards, like the panel id, so
+    the results do not depend on the number of iterations. Everything the
+    operation prints is swallowed.
+
+    @param      op           Callable without arguments
+
+    @param      iterations   Number of runs
+
+    @param      spawn_log    Path of the spawn log
+
+    @return     Dictionary of timings in milliseconds and spawns per run
+    """
+    times: List[float] = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        op()
+    spawns_before = count_lines(spawn_log)
+    for _ in range(iterations):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            op()
+            times.append((time.perf_counter() - start) * 1000)
+    spawns = count_lines(spawn_log) - spawns_before
+    return {
+        "min_ms": min(times),
+        "median_ms": statistics.median(times),
+        "mean_ms": statistics.mean(times),
+        "spawns": spawns / iterations,
+    }
+
+
+def command_operations(ws, workdir: str) -> Dict[str, Callable]:
+    """
+    @brief      The operations that only run commands.
+
+    @details    Each one does what the corresponding handler starts, but
+    synchronously and with a fresh `STATE_PLANNER`, so every run reads the
+    current settings again like a new session would.
+
+    @param      ws        The WelcomeScreen module
+
+    @param      workdir   Scratch folder
+
+    @return     Dictionary of operation name and callable
+    """
+
+    def run(commands: List):
+        ws.STATE_PLANNER = ws.StatePlanner()
+        for cmd in ws.STATE_PLANNER.plan(commands):
+            cmd.execute()
+
+    variants = ["light", "dark"]
+
+    def apply_theme():
+        # alternate, so the config files really change every time
+        variants.reverse()
+        run(ws.THEME_COLLECTION["mac_theme"][variants[0]])
+
+    def layout_click():
+        run(ws.LAYOUT_COMMANDS["left_vertical"])
+
+    def apply_resolution():
+        displays = ws.read_xfconf_channel("displays")
+        outputs = ws.get_display_outputs()
+        run(ws.resolution_commands(displays, "2400x1350", outputs))
+
+    def startup_probes():
+        ws.check_virtual_machine()
+        ws.get_display_outputs()
+        ws.get_panel_number()
+
+    xrandr_lines = ws.BaseCommand._parse_output(
+        xrandr_listing(OUTPUTS, MODES_PER_OUTPUT)
+    )
+    home = os.path.join(workdir, "provision-home")
+    os.makedirs(home)
+
+    def provision():
+        ws.provision_home(home, theme="mac_theme", variant=variants[0])
+        variants.reverse()
+
+    return {
+        "import WelcomeScreen": lambda: import_module(),
+        "startup probes": startup_probes,
+        "get_xresolution": ws.get_xresolution,
+        "parse_xrandr_outputs": lambda: ws.parse_xrandr_outputs(xrandr_lines),
+        "apply_theme": apply_theme,
+        "on_layout_btn_clicked": layout_click,
+        "apply_resolution": apply_resolution,
+        "provision_home": provision,
+    }
+
+
+def draw_operations(ws) -> Dict[str, Callable]:
+    """
+    @brief      Frames of the layout image draw handler.
+
+    @details    `paint_layout` paints into an offscreen cairo surface, once
+    at a steady size and once while the size changes every frame. Needs
+    PyGObject and pycairo, no display.
+
+    @param      ws   The WelcomeScreen module
+
+    @return     Dictionary of operation name and callable, empty if the
+    modules are not available
+    """
+    try:
+        ws.import_gi()
+    except (ImportError, ValueError) as ex:
+        print(f"Skipping the draw benchmarks: {ex}")
+        return {}
+    for layout, name in ws.LAYOUT_IMAGE_NAMES.items():
+        ws.LAYOUT_PIXBUFS[layout] = ws.load_pixbuf_asset(name)
+
+    surface = ws.cairo.ImageSurface(ws.cairo.FORMAT_ARGB32, 400, 300)
+    sizes = [(200 + idx, 150 + idx) for idx in range(50)]
+
+    def steady_frame():
+        for layout in ws.LAYOUT_IMAGE_NAMES:
+            ws.paint_layout(ws.cairo.Context(surface), layout, 200, 150)
+
+    def resize_frame():
+        sizes.append(sizes.pop(0))
+        width, height = sizes[0]
+        for layout in ws.LAYOUT_IMAGE_NAMES:
+            ws.paint_layout(ws.cairo.Context(surface), layout, width, height)
+
+    def sharp_resize_frame():
+        ws.LAYOUT_SURFACES.clear()
+        resize_frame()
+
+    return {
+        "draw frame (steady)": steady_frame,
+        "draw frame (resizing)": resize_frame,
+        "draw frame (settled resize)": sharp_resize_frame,
+    }
+
+
+def import_module():
+    """
+    @brief      Import the WelcomeScreen module from scratch.
+
+    @param      None
+
+    @return     module
+    """
+    sys.modules.pop("WelcomeScreen", None)
+    return importlib.import_module("WelcomeScreen")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float):
+    """
+    @brief      Print the results next to a baseline.
+
+    @param      results     Results of this run
+
+    @param      baseline    Saved results
+
+    @param      tolerance   Allowed slow down, i.e 0.2 for 20%
+
+    @return     List of the names of the operations that got slower
+    """
+    slower: List[str] = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1
+        mark = ""
+        if ratio > 1 + tolerance or result["spawns"] > base["spawns"]:
+            slower.append(name)
+            mark = "  <-- regression"
+        print(
+            f"{name:<30} {base['median_ms']:9.3f} -> {result['median_ms']:9.3f} ms"
+            + f" ({ratio:5.2f}x), spawns {base['spawns']:g} -> "
+            + f"{result['spawns']:g}{mark}"
+        )
+    return slower
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """
+    @brief      Parse the command line arguments.
+
+    @param      argv   List of arguments without the program name
+
+    @return     argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        prog="bench.py",
+        description="Benchmark the welcome screen against stand-in programs.",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=20,
+        help="runs of every operation (default: 20)",
+    )
+    parser.add_argument(
+        "--latency",
+        metavar="MS",
+        type=float,
+        default=2.0,
+        help="delay of the stand-in programs in milliseconds (default: 2)",
+    )
+    parser.add_argument(
+        "--filter",
+        metavar="TEXT",
+        help="only run the operations whose name contains TEXT",
+    )
+    parser.add_argument("--save", metavar="FILE", help="save the results as baseline")
+    parser.add_argument(
+        "--compare",
+        metavar="FILE",
+        help="compare against a saved baseline, exit with 1 on regressions",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slow down when comparing (default: 0.2)",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    @brief      Run the benchmarks.
+
+    @param      None
+
+    @return     None
+    """
+    args = parse_args(sys.argv[1:])
+    sys.path.insert(0, REPO_DIR)
+    os.environ["WELCOME_SCREEN_USE_FILES"] = "1"
+
+    with tempfile.TemporaryDirectory(prefix="welcome-bench.") as workdir:
+        spawn_log = setup_environment(workdir, args.latency)
+        ws = import_module()
+        # no sysfs here, the modes come from xrandr
+        ws.DRM_SYSFS_PATH = os.path.join(workdir, "no-drm")
+
+        operations = command_operations(ws, workdir)
+        operations.update(draw_operations(ws))
+
+        results: Dict[str, dict] = {}
+        for name, op in operations.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = result = measure(op, args.iterations, spawn_log)
+            print(
+                f"{name:<30} median {result['median_ms']:9.3f} ms"
+                + f"  min {result['min_ms']:9.3f} ms"
+                + f"  spawns {result['spawns']:g}"
+            )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved the results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
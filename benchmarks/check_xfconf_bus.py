@@ -0,0 +1,237 @@
+#!/bin/env python3
+
+"""Check the xfconf bus backend against the stand-in service.
+
+Runs itself under `dbus-run-session`, starts `xfconf_service.py` on that
+private bus and then reads, writes, lists and resets properties through
+the commands of the welcome screen. Writes the bus backend can not do are
+expected to fall back to `xfconf-query`, which is replaced by a program
+that only logs its arguments. Exits with 1 if any check failed.
+
+Copyright (C) 2020 Asif Mahmud Shimon
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program; if not, write to the Free Software Foundation, Inc., 59 Temple
+Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from typing import (
+    List,
+    Callable,
+)
+
+BENCH_DIR: str = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR: str = os.path.dirname(BENCH_DIR)
+PRIVATE_BUS_ENV: str = "XFCONF_CHECK_PRIVATE_BUS"
+
+"""
+Stand-in `xfconf-query`, it only logs its arguments.
+"""
+FAKE_XFCONF_QUERY: str = """#!/bin/sh
+echo "$@" >> "$FAKE_XFCONF_LOG"
+"""
+
+
+def start_service() -> subprocess.Popen:
+    """
+    @brief      Start the stand-in xfconf service and wait until it is ready.
+
+    @param      None
+
+    @return     subprocess.Popen
+    """
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "xfconf_service.py")],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    line = proc.stdout.readline()
+    if "ready" not in line:
+        proc.kill()
+        raise RuntimeError(f"xfconf stand-in did not start: {line!r}")
+    return proc
+
+
+def fallbacks(log: str) -> List[str]:
+    """
+    @brief      Argument lines `xfconf-query` was run with so far.
+
+    @param      log   Path of the log
+
+    @return     List of strings
+    """
+    try:
+        with open(log, "r") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def run_checks(ws, log: str) -> int:
+    """
+    @brief      Run every check and print the outcome.
+
+    @param      ws    The WelcomeScreen module
+
+    @param      log   Path of the `xfconf-query` log
+
+    @return     Number of failed checks
+    """
+    GLib = ws.GLib
+
+    def query(*args) -> List[str]:
+        return ws.XfceCommand(*args).execute()
+
+    def run_async(start: Callable) -> List:
+        loop = GLib.MainLoop()
+        result: List = []
+
+        def done(*args):
+            result.extend(args)
+            loop.quit()
+
+        start(done)
+        GLib.timeout_add(5000, loop.quit)
+        loop.run()
+        return result
+
+    def check_bus():
+        assert ws.get_xfconf_bus() is not None, "bus backend not available"
+
+    def check_list():
+        displays = ws.read_xfconf_channel("displays")
+        assert displays == {
+            "/ActiveProfile": "Default",
+            "/Default/Virtual-1/Active": "true",
+            "/Default/Virtual-1/RefreshRate": "60.000000",
+            "/Default/Virtual-1/Resolution": "1024x768",
+        }, displays
+
+    def check_get():
+        assert query("-c", "xsettings", "-p", "/Net/ThemeName") == ["Adwaita"]
+        assert query("-c", "xfce4-panel", "-p", "/panels/panel-1/size") == ["30"]
+        assert ws.get_panel_number() == 1
+
+    def check_set_types():
+        values = [
+            ("xsettings", "/Net/ThemeName", "Sierra-dark", "s"),
+            ("xfce4-panel", "/panels/panel-1/size", "36", "u"),
+            ("displays", "/Default/Virtual-1/Active", "false", "b"),
+            ("displays", "/Default/Virtual-1/RefreshRate", "59.940000", "d"),
+        ]
+        for channel, prop, value, type_str in values:
+            query("-c", channel, "-p", prop, "-s", value)
+            assert query("-c", channel, "-p", prop) == [value], prop
+            variant = ws.get_xfconf_bus().get(channel, prop)
+            assert variant.get_type_string() == type_str, prop
+
+    def check_fallback():
+        before = len(fallbacks(log))
+        # unknown property and array value, the bus can not type them
+        query("-c", "xfwm4", "-p", "/general/new_property", "-s", "x")
+        query("-c", "xfce4-panel", "-p", "/panels", "-s", "2")
+        lines = fallbacks(log)[before:]
+        assert lines == [
+            "-c xfwm4 -p /general/new_property -s x",
+            "-c xfce4-panel -p /panels -s 2",
+        ], lines
+
+    def check_reset():
+        query("-c", "xfwm4", "-p", "/general/theme", "-r")
+        assert "/general/theme" not in ws.read_xfconf_channel("xfwm4")
+
+    def check_async_get():
+        lines = run_async(
+            ws.XfceCommand(
+                "-c", "xfce4-panel", "-p", "/panels/panel-1/mode"
+            ).execute_async
+        )
+        assert lines == [["0"]], lines
+
+    def check_async_batch():
+        before = len(fallbacks(log))
+        values = {
+            "/panels/panel-1/position": "p=6;x=0;y=0",
+            "/panels/panel-1/mode": "2",
+        }
+        run_async(ws.XfconfBatchCommand("xfce4-panel", values).execute_async)
+        for prop, value in values.items():
+            assert query("-c", "xfce4-panel", "-p", prop) == [value], prop
+        assert fallbacks(log)[before:] == [], "batch fell back to xfconf-query"
+
+    checks = [
+        check_bus,
+        check_list,
+        check_get,
+        check_set_types,
+        check_fallback,
+        check_reset,
+        check_async_get,
+        check_async_batch,
+    ]
+    failed = 0
+    for check in checks:
+        try:
+            check()
+        except Exception as ex:
+            failed += 1
+            print(f"FAIL {check.__name__}: {ex!r}")
+        else:
+            print(f"ok   {check.__name__}")
+    return failed
+
+
+def main():
+    """
+    @brief      Run the checks on a private session bus.
+
+    @param      None
+
+    @return     None
+    """
+    if not os.environ.get(PRIVATE_BUS_ENV):
+        os.environ[PRIVATE_BUS_ENV] = "1"
+        os.execvp(
+            "dbus-run-session",
+            ["dbus-run-session", "--", sys.executable, os.path.abspath(__file__)],
+        )
+
+    service = start_service()
+    try:
+        with tempfile.TemporaryDirectory(prefix="xfconf-check.") as workdir:
+            exe = os.path.join(workdir, "xfconf-query")
+            with open(exe, "w") as f:
+                f.write(FAKE_XFCONF_QUERY)
+            os.chmod(exe, 0o755)
+            log = os.path.join(workdir, "xfconf-query.log")
+            os.environ["PATH"] = workdir + os.pathsep + os.environ.get("PATH", "")
+            os.environ["FAKE_XFCONF_LOG"] = log
+            os.environ.pop("WELCOME_SCREEN_NO_DBUS", None)
+
+            sys.path.insert(0, REPO_DIR)
+            import WelcomeScreen as ws
+
+            ws.import_gi(gtk=False)
+            failed = run_checks(ws, log)
+    finally:
+        service.kill()
+        service.wait()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
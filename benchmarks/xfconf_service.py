@@ -0,0 +1,182 @@
+#!/bin/env python3
+
+"""Minimal stand-in for the xfconf daemon on the D-Bus session bus.
+
+It owns `org.xfce.Xfconf` and implements the methods the welcome screen
+calls, that is `GetProperty`, `GetAllProperties`, `SetProperty` and
+`ResetProperty`, on properties kept in memory. Like the real daemon it
+keeps the type a property was created with. Meant to be run on a private
+bus, i.e. under `dbus-run-session`, see `check_xfconf_bus.py`.
+
+Copyright (C) 2020 Asif Mahmud Shimon
+
+This program is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation; either version 2 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program; if not, write to the Free Software Foundation, Inc., 59 Temple
+Place, Suite 330, Boston, MA 02111-1307 USA
+"""
+
+import sys
+
+from typing import Dict
+
+from gi.repository import Gio, GLib
+
+BUS_NAME: str = "org.xfce.Xfconf"
+OBJECT_PATH: str = "/org/xfce/Xfconf"
+INTERFACE_XML: str = """
+<node>
+  <interface name="org.xfce.Xfconf">
+    <method name="SetProperty">
+      <arg direction="in" type="s" name="channel"/>
+      <arg direction="in" type="s" name="property"/>
+      <arg direction="in" type="v" name="value"/>
+    </method>
+    <method name="GetProperty">
+      <arg direction="in" type="s" name="channel"/>
+      <arg direction="in" type="s" name="property"/>
+      <arg direction="out" type="v" name="value"/>
+    </method>
+    <method name="GetAllProperties">
+      <arg direction="in" type="s" name="channel"/>
+      <arg direction="in" type="s" name="property_base"/>
+      <arg direction="out" type="a{sv}" name="properties"/>
+    </method>
+    <method name="ResetProperty">
+      <arg direction="in" type="s" name="channel"/>
+      <arg direction="in" type="s" name="property"/>
+      <arg direction="in" type="b" name="recursive"/>
+    </method>
+  </interface>
+</node>
+"""
+
+"""
+Properties the service starts with, one of every type the welcome screen
+deals with.
+"""
+INITIAL_PROPERTIES: Dict[str, Dict[str, GLib.Variant]] = {
+    "xsettings": {
+        "/Net/ThemeName": GLib.Variant("s", "Adwaita"),
+        "/Net/IconThemeName": GLib.Variant("s", "Adwaita"),
+    },
+    "xfwm4": {
+        "/general/theme": GLib.Variant("s", "Default"),
+    },
+    "xfce4-panel": {
+        "/panels": GLib.Variant("av", [GLib.Variant("i", 1)]),
+        "/panels/panel-1/size": GLib.Variant("u", 30),
+        "/panels/panel-1/mode": GLib.Variant("u", 0),
+        "/panels/panel-1/position": GLib.Variant("s", "p=8;x=0;y=0"),
+    },
+    "displays": {
+        "/ActiveProfile": GLib.Variant("s", "Default"),
+        "/Default/Virtual-1/Active": GLib.Variant("b", True),
+        "/Default/Virtual-1/Resolution": GLib.Variant("s", "1024x768"),
+        "/Default/Virtual-1/RefreshRate": GLib.Variant("d", 60.0),
+    },
+}
+
+
+class XfconfService:
+    """The in-memory properties and the method handlers."""
+
+    def __init__(self):
+        self.channels: Dict[str, Dict[str, GLib.Variant]] = {
+            channel: dict(props) for channel, props in INITIAL_PROPERTIES.items()
+        }
+
+    def _not_found(self, invocation: Gio.DBusMethodInvocation, channel, prop):
+        invocation.return_dbus_error(
+            "org.xfce.Xfconf.Error.PropertyNotFound",
+            f'Property "{prop}" does not exist on channel "{channel}"',
+        )
+
+    def on_call(
+        self,
+        connection: Gio.DBusConnection,
+        sender: str,
+        path: str,
+        interface: str,
+        method: str,
+        params: GLib.Variant,
+        invocation: Gio.DBusMethodInvocation,
+    ):
+        channel = params.get_child_value(0).get_string()
+        prop = params.get_child_value(1).get_string()
+        props = self.channels.setdefault(channel, {})
+        if method == "GetProperty":
+            if prop not in props:
+                self._not_found(invocation, channel, prop)
+                return
+            invocation.return_value(GLib.Variant("(v)", (props[prop],)))
+        elif method == "GetAllProperties":
+            base = "" if prop == "/" else prop
+            found = {
+                name: value
+                for name, value in props.items()
+                if name == base or name.startswith(base + "/")
+            }
+            invocation.return_value(GLib.Variant("(a{sv})", (found,)))
+        elif method == "SetProperty":
+            value = params.get_child_value(2).get_variant()
+            old = props.get(prop)
+            if old is not None and old.get_type_string() != value.get_type_string():
+                invocation.return_dbus_error(
+                    "org.xfce.Xfconf.Error.InvalidProperty",
+                    f"{prop} is of type {old.get_type_string()}",
+                )
+                return
+            props[prop] = value
+            invocation.return_value(None)
+        elif method == "ResetProperty":
+            recursive = params.get_child_value(2).get_boolean()
+            for name in list(props):
+                if name == prop or (recursive and name.startswith(prop + "/")):
+                    del props[name]
+            invocation.return_value(None)
+
+
+def main():
+    """
+    @brief      Register the service and serve until killed.
+
+    @param      None
+
+    @return     None
+    """
+    service = XfconfService()
+    loop = GLib.MainLoop()
+    node = Gio.DBusNodeInfo.new_for_xml(INTERFACE_XML)
+
+    def on_bus(connection: Gio.DBusConnection, name: str):
+        connection.register_object(
+            OBJECT_PATH, node.interfaces[0], service.on_call, None, None
+        )
+
+    def on_name_lost(connection: Gio.DBusConnection, name: str):
+        print(f"Could not own {name}")
+        loop.quit()
+
+    Gio.bus_own_name(
+        Gio.BusType.SESSION,
+        BUS_NAME,
+        Gio.BusNameOwnerFlags.NONE,
+        on_bus,
+        lambda *args: print("xfconf stand-in ready", flush=True),
+        on_name_lost,
+    )
+    loop.run()
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()